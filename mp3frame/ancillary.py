@@ -0,0 +1,130 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""\
+Functions for locating and writing layer 3 ancillary data: the bytes that
+follow a frame's main data but aren't referenced by the next frame.  To read
+ancillary data from a stream, use LogicalFrameSync with
+assembler.collect_ancillary set (see sync.py)."""
+
+from __future__ import division, absolute_import
+from . import errors
+import array
+
+
+def ancillary_spans(frames, at_end=False):
+	"""ancillary_spans(frames, at_end=False) -> list
+
+Return the location of the ancillary data following each frame's main data,
+given a sequence of consecutive MP3Frame objects.  Each item is a
+(start, end) tuple of positions in the concatenated frame bodies; the span
+is empty (start == end) if there's no room, or if the frame's main data
+isn't valid.
+
+The span after the last frame is empty, since the frames following it
+may start their main data in its body; include the next frame to find
+the space available.  If 'at_end' is set, the frames end the stream, and
+the last span extends to the end of the last body."""
+	
+	# the positions where each frame's main data begins and ends; layer 1
+	# and 2 frames are treated as if all data was main data, and invalid
+	# frames as if there was none (at the end of the body)
+	info = []
+	pos = 0
+	for fr in frames:
+		size = len(fr.raw_body)
+		if fr.header.layer_index == 1:  # layer 3
+			si = fr.side_info
+			begin = pos - si.main_data_begin
+			end = begin + si.part2_3_bytes
+			if begin < 0 or end > pos + size:
+				begin = end = pos + size
+		else:
+			(begin, end) = (pos, pos + size)
+		
+		pos += size
+		info.append( (begin, end) )
+	if at_end:
+		info.append( (pos, pos) )
+	else:
+		info.append( (0, 0) )
+	
+	return [ (end, max(end, info[i+1][0]))
+			for (i, (begin, end)) in enumerate(info[:-1]) ]
+
+
+def ancillary_capacity(frames, at_end=False):
+	"""ancillary_capacity(frames, at_end=False) -> list
+
+Return the number of ancillary data bytes that can be stored after each
+frame's main data (see ancillary_spans)."""
+	return [ end - start for (start, end) in ancillary_spans(frames, at_end) ]
+
+
+def write_ancillary(frames, index, data, fill=0, at_end=False):
+	"""write_ancillary(frames, index, data, fill=0, at_end=False) -> None
+
+Store ancillary data after the main data of frames[index], by modifying the
+raw_body arrays of that frame and possibly some of the preceding frames.
+'data' is a string or sequence of byte values.  Any remaining space in the
+span is set to 'fill' (use fill=None to leave it unchanged).
+MP3UsageError is raised if the data doesn't fit; 'at_end' is passed to
+ancillary_spans.
+
+The modified frames have body_modified set, and must be encoded again to
+write the data; since layer 3 CRCs only cover the header and side info,
+they aren't affected."""
+	
+	if isinstance(data, str):
+		data = [ ord(ch) for ch in data ]
+	
+	(start, end) = ancillary_spans(frames, at_end)[index]
+	if len(data) > end - start:
+		raise errors.MP3UsageError('ancillary data too long'
+				' (%d bytes, room for %d)' % (len(data), end - start))
+	
+	if fill is not None:
+		data = list(data) + [fill] * (end - start - len(data))
+	
+	# find the frame containing 'start', searching backwards
+	pos = 0
+	for fr in frames[:index+1]:
+		pos += len(fr.raw_body)
+	i = index
+	while True:
+		pos -= len(frames[i].raw_body)
+		if pos <= start:
+			break
+		i -= 1
+	
+	# copy the data, one frame body at a time
+	offset = start - pos
+	written = 0
+	while written < len(data):
+		body = frames[i].raw_body
+		size = min(len(body) - offset, len(data) - written)
+		body[offset:offset+size] = array.array('B',
+				data[written:written+size])
+		frames[i].body_modified = True
+		written += size
+		offset = 0
+		i += 1
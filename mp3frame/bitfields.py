@@ -19,93 +19,165 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-_high0_mask = tuple([ (0xff >> x) for x in range(9) ])
-_high1_mask = tuple([ ((0xff00 >> x) & 0xff) for x in range(9) ])
-_low0_mask = tuple(reversed(_high1_mask))
-_low1_mask = tuple(reversed(_high0_mask))
+
+import re
+
+# Accessors are generated as Python source code for each field, so every
+# offset and mask is a constant and no loops are needed at runtime.
+
+_attr_path = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+_cache = {}
+
+
+class BitField(property):
+	"""A property created by make_property; the 'bytefield_name', 'offset'
+and 'bits' attributes describe the field."""
+	
+	def __init__(self, fget, fset, bytefield_name, offset, bits):
+		property.__init__(self, fget, fset)
+		self.bytefield_name = bytefield_name
+		self.offset = offset
+		self.bits = bits
+
+
+def _load_expr(start, end):
+	# an expression for bytes start..end (inclusive) of 'd' as one integer
+	parts = []
+	for pos in range(start, end + 1):
+		sh = 8 * (end - pos)
+		if sh:
+			parts.append('(d[%d] << %d)' % (pos, sh))
+		else:
+			parts.append('d[%d]' % pos)
+	return ' | '.join(parts)
+
+
+def _compile(src, name):
+	namespace = {}
+	exec(compile(src, '<bitfields %s>' % name, 'exec'), namespace)
+	return namespace[name]
+
+
+def _make_accessors(bytefield_name, offset, bits):
+	if bits == 0:
+		return (lambda self: 0, lambda self, val: None)
+	
+	start = offset // 8
+	end = (offset + bits - 1) // 8  # the last byte containing the field
+	shift = (end + 1) * 8 - (offset + bits)
+	mask = (1 << bits) - 1
+	nbytes = end - start + 1
+	
+	# getter
+	expr = _load_expr(start, end)
+	if shift:
+		expr = '(%s) >> %d' % (expr, shift)
+	if bits != 8 * nbytes - shift:
+		expr = '(%s) & %d' % (expr, mask)
+	
+	src = ('def getfn(self):\n'
+			'\td = self.%s\n'
+			'\treturn %s\n') % (bytefield_name, expr)
+	getfn = _compile(src, 'getfn')
+	
+	# setter; bits outside the field are preserved
+	lines = ['def setfn(self, val):',
+			'\td = self.%s' % bytefield_name,
+			'\tval = (val & %d) << %d' % (mask, shift)]
+	keep = ((1 << (8 * nbytes)) - 1) & ~(mask << shift)
+	if keep:
+		lines.append('\tval |= (%s) & %d' % (_load_expr(start, end), keep))
+	
+	for pos in range(start, end + 1):
+		sh = 8 * (end - pos)
+		if sh:
+			val = '(val >> %d)' % sh
+		else:
+			val = 'val'
+		if pos != start:
+			val += ' & 0xff'
+		lines.append('\td[%d] = %s' % (pos, val))
+	
+	setfn = _compile('\n'.join(lines) + '\n', 'setfn')
+	return (getfn, setfn)
+
 
 def make_property(bytefield_name, offset, bits):
+	"""make_property(bytefield_name, offset, bits) -> BitField
+
+Return a property for an unsigned integer of 'bits' bits, stored MSB first
+at bit 'offset' of a byte array.  The array is found at the attribute
+'bytefield_name' of the instance, which may be a dotted path such as
+'_side_info.raw_data'.  Values are truncated to 'bits' bits when set."""
+	
 	if offset < 0 or bits < 0:
 		raise ValueError('invalid offset or bit count')
+	if not _attr_path.match(bytefield_name):
+		raise ValueError('invalid bytefield name')
 	
-	max_val = (1 << bits) - 1
+	key = (bytefield_name, offset, bits)
+	fns = _cache.get(key)
+	if fns is None:
+		fns = _cache[key] = _make_accessors(bytefield_name, offset, bits)
 	
-	start = offset // 8
-	start_bits = 8 - (offset % 8)
-	
-	# note: end points 1 byte past the end if end_bits == 0
-	end_offset = offset + bits
-	end = end_offset // 8
-	end_bits = (end_offset % 8)
-	shift = 8 - end_bits
-	
-	if start == end:
-		mask = _high1_mask[bits] >> (offset % 8)
-	else:
-		start_mask = _high0_mask[offset % 8]
-		end_mask = _high1_mask[end_bits]
-		end_shmask = _high1_mask[end_bits] >> shift
-	
-	def get_simple(self):
-		return (getattr(self, bytefield_name)[start] & mask) >> shift
-	
-	def get_multibyte(self):
-		# this function assumes start != end (use get_simple otherwise)
-		data = getattr(self, bytefield_name)
-		
-		val = 0
-		pos = start
-		if start_bits:
-			val = data[start] & start_mask
-			pos += 1
-		
-		while pos < end:
-			val = (val << 8) | data[pos]
-			pos += 1
-		
-		if end_bits:
-			val = (val << end_bits) | (data[end] >> shift)
-		
-		return val
+	return BitField(fns[0], fns[1], bytefield_name, offset, bits)
+
+
+_readers = {}
+
+def read_fields(obj, names):
+	"""read_fields(obj, names) -> tuple
+
+Return the values of several BitField properties of 'obj', which must all
+use the same byte array.  The bytes spanning the fields are loaded into
+one integer, and each value is extracted from it; this is faster than
+reading the properties one by one."""
 	
-	def set_whole(self, val):
-		getattr(self, bytefield_name)[start] = (val & 0xff)
+	names = tuple(names)
+	key = (type(obj), names)
+	reader = _readers.get(key)
+	if reader is None:
+		reader = _readers[key] = _make_reader(type(obj), names)
+	return reader(obj)
+
+
+def _make_reader(cls, names):
+	fields = []
+	for name in names:
+		for klass in cls.__mro__:
+			if name in klass.__dict__:
+				prop = klass.__dict__[name]
+				break
+		else:
+			raise AttributeError(name)
+		
+		if not isinstance(prop, BitField):
+			raise ValueError('%s is not a BitField' % name)
+		fields.append(prop)
 	
-	def set_masked(self, val):
-		data = getattr(self, bytefield_name)
-		data[start] = (data[start] & ~mask) | ((val << shift) & mask)
+	if not fields:
+		return lambda self: ()
 	
-	def set_multibyte(self, val):
-		# this function assumes start != end
-		data = getattr(self, bytefield_name)
-		
-		pos = end
-		if end_bits:
-			data[end] = ( (data[end] & ~end_mask)
-					| ((val & end_shmask) << shift) )
-			val >>= end_bits
-		
-		pos -= 1
-		while pos > start:
-			data[pos] = (val & 0xff)
-			val >>= 8
-			pos -= 1
-		
-		if start_bits:
-			data[start] = ( (data[start] & ~start_mask)
-					| (val & start_mask) )
-		
-		# done
+	bytefield_name = fields[0].bytefield_name
+	for prop in fields:
+		if prop.bytefield_name != bytefield_name:
+			raise ValueError('fields use different byte arrays')
 	
+	start = min([ prop.offset // 8 for prop in fields ])
+	end = max([ (prop.offset + max(prop.bits, 1) - 1) // 8
+			for prop in fields ])
 	
-	if start == end:
-		getfn = get_simple
-		setfn = set_whole if (bits == 8) else set_masked
-	else:
-		getfn = get_multibyte
-		setfn = set_multibyte
+	values = []
+	for prop in fields:
+		shift = (end + 1) * 8 - (prop.offset + prop.bits)
+		values.append('(v >> %d) & %d' % (shift, (1 << prop.bits) - 1))
 	
-	return property(getfn, setfn)
+	src = ('def reader(self):\n'
+			'\td = self.%s\n'
+			'\tv = %s\n'
+			'\treturn (%s,)\n') % (bytefield_name,
+				_load_expr(start, end), ', '.join(values))
+	return _compile(src, 'reader')
 
 
 if __name__=='__main__':
@@ -122,9 +194,21 @@ if __name__=='__main__':
 	q.a=7
 	assert q.a==7
 	assert q.c == (0x399999999 >> 2)
+	assert read_fields(q, ('a', 'c')) == (q.a, q.c)
 	q.c = 0x23587615
 	assert q.c == 0x23587615
 	q.b = (1<<11)-1
 	assert q.b == (1<<11)-1
 	q.b = 123
 	assert q.b == 123
+	assert read_fields(q, ('c', 'b', 'a')) == (q.c, q.b, q.a)
+	
+	class R(object):
+		x=make_property('q.raw', 8, 8)
+		y=make_property('q.raw', 7, 1)
+	r=R()
+	r.q=q
+	r.x=0x1ff
+	assert r.x==0xff and q.raw[1]==0xff and q.b==123|(0xff>>2)
+	r.y=0
+	assert r.y==0 and q.b==127&~0x40
@@ -0,0 +1,200 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Joining the audio frames of many files into one stream.  Each input is
+indexed (see fastscan.find_frames), and its runs of frames are copied
+without parsing them; tags, garbage and VBR header frames are left out.  A
+frame is reserved at the start of the output for a Xing header, which is
+filled in once all the inputs have been written."""
+
+from __future__ import division, absolute_import
+from . import errors, fastscan, vbr, writer
+from .cut import read_frames
+import mmap
+
+
+def stream_params(header):
+	"""stream_params(FrameHeader) -> tuple
+
+Return the header fields that must match for frames to be joined into one
+stream: (version_index, layer_index, samplerate_index, mono).  Stereo and
+joint stereo frames can be mixed, so only the number of channels is
+compared."""
+	return (header.version_index, header.layer_index,
+			header.samplerate_index, header.channel_mode == 3)
+
+
+def _params_key(data, pos):
+	# the stream_params bits of header bytes 1-3, without parsing the header
+	b = data[pos+1:pos+4]
+	return (ord(b[0]) & 0x1e, ord(b[1]) & 0x0c, ord(b[2]) >= 0xc0)
+
+
+class Concatenator(object):
+	"""Concatenator(dest, xing=True) -> object
+
+Return an object that writes the frames of several files to 'dest' (a
+filename, which is replaced atomically when close is called, or a seekable
+file object).  If 'xing' is set, a Xing header frame with a seek table is
+written at the start; it's based on the first input's first frame.
+
+Attributes:
+  params - the stream_params of the inputs (set by the first input)
+  frame_count - the number of frames written
+  files_added - the number of inputs written"""
+	
+	def __init__(self, dest, xing=True):
+		self.writer = writer.FrameWriter(dest,
+				atomic=isinstance(dest, basestring))
+		self.use_xing = xing
+		self.params = None
+		self.frame_count = 0
+		self.files_added = 0
+		self._toc = vbr.TOCBuilder()
+		self._xing = None
+		self._xing_frame = None
+		self._xing_pos = None
+	
+	def add_file(self, filename):
+		"""add_file(filename) -> int
+
+Append the frames of a file, and return the number of frames added.
+MP3UsageError is raised if any of the file's frames are incompatible with
+the earlier inputs or its first frame (see stream_params); in that case
+nothing is written."""
+		
+		f = open(filename, 'rb')
+		try:
+			if not f.read(4):
+				return 0  # mmap doesn't accept empty files
+			data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				return self.add_data(data, f, filename)
+			finally:
+				data.close()
+		finally:
+			f.close()
+	
+	def add_data(self, data, source, name='input'):
+		"""add_data(data, source, name='input') -> int
+
+Like add_file, for a file that's already open: 'data' is its contents (a
+string or mmap object), and 'source' is the file object the frames are
+copied from."""
+		
+		(positions, sizes) = fastscan.find_frames(data)
+		nframes = len(positions)
+		if not nframes:
+			return 0
+		
+		# skip a VBR header frame
+		start = 0
+		first = read_frames(data, positions, sizes, 0, 1)[0]
+		if first.header.layer_index == 1 and first.identify_vbr_header():
+			start = 1
+			if nframes == 1:
+				return 0
+			first = read_frames(data, positions, sizes, 1, 2)[0]
+		
+		params = stream_params(first.header)
+		if self.params is None:
+			self.params = params
+		elif params != self.params:
+			raise errors.MP3UsageError('%s: stream parameters %r don\'t match'
+					' the earlier inputs %r' % (name, params, self.params))
+		
+		# every frame must match the first
+		key = _params_key(data, positions[start])
+		for i in xrange(start + 1, nframes):
+			if _params_key(data, positions[i]) != key:
+				fr = read_frames(data, positions, sizes, i, i+1)[0]
+				raise errors.MP3UsageError('%s: frame %d has stream parameters'
+						' %r, not %r' % (name, i, stream_params(fr.header),
+						params))
+		
+		w = self.writer
+		if self.use_xing and self._xing_frame is None:
+			self._reserve_xing(first.header)
+		
+		# copy each run of adjacent frames
+		run = start
+		for i in xrange(start + 1, nframes + 1):
+			if i < nframes and positions[i] == positions[i-1] + sizes[i-1]:
+				continue
+			
+			src = positions[run]
+			count = positions[i-1] + sizes[i-1] - src
+			self._toc.add_frames(positions, run, i, w.position - src)
+			w.copy_from(source, src, count)
+			run = i
+		
+		added = nframes - start
+		self.frame_count += added
+		self.files_added += 1
+		return added
+	
+	def _reserve_xing(self, template_header):
+		# write a placeholder Xing frame; its size can't change later, so
+		# its bitrate is based on the first input's first frame
+		self._xing = vbr.new_xing_header()
+		self._xing_frame = vbr.make_xing_frame(template_header, self._xing,
+				template_header.bitrate)
+		self._xing_pos = self.writer.write_frame(self._xing_frame)
+	
+	def close(self):
+		"""close() -> int
+
+Fill in the Xing header, close the output, and return its size."""
+		
+		w = self.writer
+		if self._xing_frame is not None and self.frame_count:
+			xing = self._xing
+			xing.frame_count = self.frame_count
+			xing.byte_count = w.position
+			xing.seek_table = self._toc.toc(w.position)
+			xing.encode(self._xing_frame)
+			w.overwrite(self._xing_pos, self._xing_frame.encode())
+		
+		w.close()
+		return w.position
+	
+	def abort(self):
+		"""abort() -> None
+
+Discard the output (see FrameWriter.abort)."""
+		self.writer.abort()
+
+
+def concat_files(filenames, dest, xing=True):
+	"""concat_files(filenames, dest, xing=True) -> int
+
+Join the frames of several files (see Concatenator), and return the size of
+the output."""
+	
+	c = Concatenator(dest, xing)
+	try:
+		for name in filenames:
+			c.add_file(name)
+	except:
+		c.abort()
+		raise
+	return c.close()
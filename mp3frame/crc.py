@@ -0,0 +1,237 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+CRC-16 functions (polynomial 0x8005, as used for MPEG audio frames).
+crc16 processes two bytes per step using a table indexed by 16-bit words,
+and crc16_many checks many blocks at once, with NumPy if it's installed."""
+
+from __future__ import division, absolute_import
+import array
+import sys
+
+# NumPy is only imported when crc16_many first needs it, since loading it
+# takes much longer than loading this package (None means it's unavailable)
+_not_loaded = object()
+numpy = _not_loaded
+
+def _load_numpy():
+	global numpy
+	if numpy is _not_loaded:
+		try:
+			import numpy
+		except ImportError:
+			numpy = None
+	return numpy
+
+
+_crc_poly = 0x8005
+def crc16_bits(val, bits, start=0xffff):
+	"""crc16_bits(val, bits, start=0xffff) -> int
+
+Return the crc of 'val' (an integer), MSB first.
+The specified number of bits are used, and higher bits are ignored.
+crc16 is more efficient but only works on whole bytes."""
+	
+	crc = start
+	mask = 1 << bits
+	while bits > 0:
+		bits -= 1
+		mask >>= 1
+		
+		if ((val & mask) >> bits) ^ (crc >> 15):
+			crc = ((crc & 0x7fff) << 1) ^ _crc_poly
+		else:
+			crc = (crc & 0x7fff) << 1
+	
+	return crc
+
+_crc_table = tuple([ crc16_bits(x, 8, 0) for x in range(256) ])
+
+
+# _word_table[x] is the crc of the 16-bit word x (high byte first), with a
+# starting value of 0.  Since the crc register is also 16 bits, the crc of a
+# word w from any starting value is _word_table[start ^ w].  The table is
+# only built when it's first needed.
+_word_table = None
+_np_tables = None
+
+def _get_word_table():
+	global _word_table
+	if _word_table is None:
+		t = _crc_table
+		hi = [ ((c & 0xff) << 8) ^ t[c >> 8] for c in t ]
+		_word_table = array.array('H',
+				[ hi[x >> 8] ^ t[x & 0xff] for x in range(1 << 16) ])
+	return _word_table
+
+
+def _tostring(data):
+	if isinstance(data, str):
+		return data
+	elif isinstance(data, array.array) and data.typecode == 'B':
+		return data.tostring()
+	elif isinstance(data, bytearray):
+		return str(data)
+	else:
+		return array.array('B', data).tostring()
+
+
+def _words(s):
+	# the whole 16-bit words in a string, as integers
+	words = array.array('H', s[:len(s) & ~1])
+	if sys.byteorder == 'little':
+		words.byteswap()
+	return words
+
+
+def crc16(data, start=0xffff):
+	"""crc16(data, start=0xffff) -> int
+
+Return the crc of 'data' (a string, or a sequence of unsigned 8-bit
+integers).  This is a faster version of crc16_bits that only works on
+whole bytes."""
+	
+	if len(data) < 8:
+		crc = start
+		if isinstance(data, str):
+			data = bytearray(data)
+		for ch in data:
+			crc = ((crc & 0xff) << 8) ^ _crc_table[(crc >> 8) ^ ch]
+		return crc
+	
+	s = _tostring(data)
+	table = _word_table or _get_word_table()
+	crc = start
+	for w in _words(s):
+		crc = table[crc ^ w]
+	
+	if len(s) & 1:
+		crc = ((crc & 0xff) << 8) ^ _crc_table[(crc >> 8) ^ ord(s[-1])]
+	return crc
+
+
+def crc16_many(blocks, start=0xffff):
+	"""crc16_many(blocks, start=0xffff) -> list
+
+Return the crc of each block in a sequence (see crc16).  If NumPy is
+installed, blocks of equal length are processed together as a matrix, one
+16-bit column at a time."""
+	
+	if len(blocks) < 16 or _load_numpy() is None:
+		return [ crc16(b, start) for b in blocks ]
+	
+	global _np_tables
+	if _np_tables is None:
+		_np_tables = (
+			numpy.array(_crc_table, dtype=numpy.uint16),
+			numpy.frombuffer(_get_word_table(), dtype=numpy.uint16),
+		)
+	(byte_table, word_table) = _np_tables
+	
+	strs = [ _tostring(b) for b in blocks ]
+	groups = {}
+	for (i, s) in enumerate(strs):
+		groups.setdefault(len(s), []).append(i)
+	
+	ret = [None] * len(strs)
+	for (length, indexes) in groups.items():
+		mat = numpy.frombuffer(''.join([ strs[i] for i in indexes ]),
+				dtype=numpy.uint8).reshape((len(indexes), length))
+		mat = mat.astype(numpy.uint16)
+		
+		crc = numpy.empty(len(indexes), dtype=numpy.uint16)
+		crc.fill(start)
+		for col in range(0, length - 1, 2):
+			crc = word_table[crc ^ ((mat[:,col] << 8) | mat[:,col+1])]
+		if length & 1:
+			crc = ((crc & 0xff) << 8) ^ byte_table[(crc >> 8) ^ mat[:,-1]]
+		
+		for (i, val) in zip(indexes, crc.tolist()):
+			ret[i] = val
+	
+	return ret
+
+
+### frame CRCs
+
+def protected_data(frame):
+	"""protected_data(MP3Frame) -> (str, int, int)
+
+Return the data covered by a frame's CRC, as (data, tail, tail_bits).  The
+crc is crc16(data), followed by crc16_bits(tail, tail_bits) if tail_bits
+is nonzero (for layer 2, where the protected bits needn't end on a byte
+boundary).  The frame's current raw data is used, so this should be called
+after encoding the header."""
+	
+	head = frame.header
+	parts = [ head.raw_data[2:4].tostring() ]
+	tail = tail_bits = 0
+	
+	layer_index = head.layer_index
+	if layer_index == 1:  # layer 3
+		parts.append(_tostring(frame.side_info.raw_data))
+	elif layer_index == 3:  # layer 1
+		nbytes = head.protected_byte_count
+		parts.append(_tostring(frame.raw_body[:nbytes]))
+	elif layer_index == 2:  # layer 2
+		bits = head.protected_bit_count
+		last_byte = bits // 8
+		tail_bits = bits % 8
+		
+		parts.append(_tostring(frame.raw_body[:last_byte]))
+		if tail_bits:
+			tail = frame.raw_body[last_byte] >> (8 - tail_bits)
+	
+	return (''.join(parts), tail, tail_bits)
+
+
+def check_frames(frames):
+	"""check_frames(frames) -> list
+
+Verify the CRC of each frame in a sequence against its crc16 field.  The
+result has True or False for each protected frame, and None for each
+unprotected frame (or frame whose protected data size is unknown)."""
+	
+	ret = [None] * len(frames)
+	indexes = []
+	blocks = []
+	tails = []
+	for (i, fr) in enumerate(frames):
+		if fr.crc16 is None:
+			continue
+		
+		try:
+			(data, tail, tail_bits) = protected_data(fr)
+		except NotImplementedError:
+			continue
+		
+		indexes.append(i)
+		blocks.append(data)
+		tails.append( (tail, tail_bits) )
+	
+	crcs = crc16_many(blocks)
+	for (i, crc, (tail, tail_bits)) in zip(indexes, crcs, tails):
+		if tail_bits:
+			crc = crc16_bits(tail, tail_bits, crc)
+		ret[i] = (crc == frames[i].crc16)
+	
+	return ret
@@ -0,0 +1,301 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Lossless cutting of MPEG audio files at frame boundaries.
+
+A layer 3 frame's main data can start in the preceding frames (the bit
+reservoir), so the first frame of a cut usually can't be decoded.  cut_file
+fixes this by rebuilding that frame with main_data_begin set to 0: its body
+becomes its complete main data, followed by the reservoir bytes the later
+frames need, in a frame with a bitrate high enough to hold both.  If no
+bitrate is high enough, the frames that feed the reservoir are included in
+the output instead.  All other frames are copied unchanged (see
+rewrite.py), and a new Xing header is written."""
+
+from __future__ import division, absolute_import
+from . import errors, fastscan, frames, mp3bits, mp3ext, rewrite, side_info
+from . import sync, vbr
+from .side_info_batch import _byte
+import array
+import bisect
+import mmap
+
+
+def read_frames(data, positions, sizes, start, stop):
+	"""read_frames(data, positions, sizes, start, stop) -> list
+
+Parse frames 'start' up to 'stop' from an index of 'data' (see
+fastscan.find_frames), and return them as MP3Frame objects.  Anything
+between the frames is skipped.  The frames' byte_position attributes refer
+to 'data'."""
+	
+	s = sync.PhysicalFrameSync()
+	ret = []
+	for i in range(start, stop):
+		pos = positions[i]
+		b2 = _byte(data, pos + 2)
+		if b2 < 0x10:
+			# a free-format frame; the sync would look for the next header
+			# to find its end, so tell it the size
+			slot = mp3bits.sample_size((_byte(data, pos + 1) >> 1) & 3)
+			s.base_framesize = sizes[i] - ((b2 >> 1) & 1) * slot
+		s.fromstring(data[pos:pos+sizes[i]])
+		rv = s.readitem()
+		if rv is None or rv[0] != 'frame':
+			raise errors.MP3DataError('no frame at position %d' % pos)
+		
+		fr = rv[1]
+		fr.frame_number = i
+		fr.byte_position = pos
+		ret.append(fr)
+	return ret
+
+
+def _rebuild_first_frame(frs):
+	# Returns a replacement for the last frame in 'frs' with
+	# main_data_begin set to 0, or None if that's impossible.  The earlier
+	# frames provide the bit reservoir.
+	asm = sync.LogicalFrameAssembler()
+	for fr in frs:
+		main_data = asm.frame_in(fr)
+	if main_data is None:
+		return None
+	
+	# the reservoir bytes following this frame's main data, which later
+	# frames may refer to (last_end is negative if the main data ended
+	# before the last 511 bytes, which are all that can be referred to)
+	tail = asm.reservoir[max(0, asm.last_end):]
+	
+	fr = frs[-1]
+	head = frames.FrameHeader(fr.header.raw_data)
+	headsz = head.body_offset
+	need = headsz + len(main_data) + len(tail)
+	rv = mp3bits.min_bitrate_index(head.version_index, head.layer_index,
+			head.samplerate_index, need)
+	if rv is None:
+		return None
+	(head.bitrate_index, head.padded, size, br) = rv
+	head.padded = int(head.padded)
+	
+	new = frames.MP3Frame()
+	new.header = head
+	new.side_info = side_info.SideInfo(head.version_index, head.channel_mode,
+			fr.side_info.raw_data[:])
+	new.side_info.main_data_begin = 0
+	
+	body = array.array('B', main_data)
+	body.fromstring('\0' * (size - need))
+	body.extend(tail)
+	new.raw_body = body
+	new.crc16 = None
+	return new
+
+
+class _OutputPositions(object):
+	# Maps output frame numbers to output byte positions, for make_toc.
+	# Each segment is either (position,) for a single frame, or (positions,
+	# first, offset) for a run of frames copied from an index; 'base' is
+	# added to every position.
+	
+	def __init__(self):
+		self.base = 0
+		self.starts = []
+		self.segments = []
+	
+	def add_frame(self, frame_number, pos):
+		self.starts.append(frame_number)
+		self.segments.append( (pos,) )
+	
+	def add_span(self, frame_number, positions, first, offset):
+		self.starts.append(frame_number)
+		self.segments.append( (positions, first, offset) )
+	
+	def __getitem__(self, n):
+		i = bisect.bisect_right(self.starts, n) - 1
+		seg = self.segments[i]
+		if len(seg) == 1:
+			return self.base + seg[0]
+		(positions, first, offset) = seg
+		return self.base + positions[first + n - self.starts[i]] + offset
+
+
+def plan_cut(data, ranges, reservoir='rebuild', keep_tags=True,
+		positions=None, sizes=None):
+	"""plan_cut(data, ranges, reservoir='rebuild', keep_tags=True,
+         positions=None, sizes=None) -> (EditList, int)
+
+Create an EditList that cuts the given time ranges out of 'data' (a string
+or mmap object) and joins them, and return it with the output size.  Each
+range is (start, end) in seconds; end may be None for the end of the file.
+The ranges are rounded to the nearest frame boundaries, and must be in
+order and not overlap.
+
+'reservoir' is 'rebuild' to rebuild the first frame of each range (falling
+back to 'include' when that's impossible), 'include' to start each range
+with the frames that feed its bit reservoir, or 'ignore' to leave the first
+frames as they are.  If 'keep_tags' is set, an ID3v2 tag at the start of
+the file and an ID3v1 tag at the end are kept.  A frame index (see
+fastscan.find_frames) can be passed as 'positions' and 'sizes' if it's
+already known."""
+	
+	if reservoir not in ('rebuild', 'include', 'ignore'):
+		raise errors.MP3UsageError('invalid reservoir mode %r' % (reservoir,))
+	
+	if positions is None:
+		(positions, sizes) = fastscan.find_frames(data)
+	nframes = len(positions)
+	if not nframes:
+		raise errors.MP3DataError('no frames found')
+	
+	# skip an existing VBR header frame
+	first = read_frames(data, positions, sizes, 0, 1)[0]
+	audio_start = 0
+	if first.header.layer_index == 1 and first.identify_vbr_header():
+		audio_start = 1
+		if nframes == 1:
+			raise errors.MP3DataError('no music frames found')
+		first = read_frames(data, positions, sizes, 1, 2)[0]
+	
+	head = first.header
+	layer3 = (head.layer_index == 1)
+	frame_rate = head.samplerate / head.samples_per_frame
+	
+	edits = rewrite.EditList(positions, sizes)
+	
+	# the output is: [ID3v2 tag] [Xing frame] [music] [ID3v1 tag]
+	tagsz = 0
+	if keep_tags:
+		tagsz = mp3ext.id3v2_size(array.array('B', data[:10]), True)
+		if not (0 < tagsz <= positions[0]):
+			tagsz = 0
+	
+	# positions within the music are counted from its start, since the size
+	# of the Xing frame isn't known yet
+	out_positions = _OutputPositions()
+	music_size = 0
+	out_frames = 0
+	copied_to = tagsz  # the source position up to which data was handled
+	
+	last_stop = audio_start
+	for (start_time, end_time) in ranges:
+		start = audio_start + int(round(start_time * frame_rate))
+		if end_time is None:
+			stop = nframes
+		else:
+			stop = audio_start + int(round(end_time * frame_rate))
+		start = max(start, last_stop)
+		stop = min(stop, nframes)
+		if start >= stop:
+			continue
+		
+		replacement = None
+		if layer3 and reservoir != 'ignore' and \
+				not (out_frames and start == last_stop):
+			# parse enough preceding frames to fill the reservoir
+			back = start
+			feed = 0
+			while back > audio_start and feed < 511:
+				back -= 1
+				feed += sizes[back]
+			frs = read_frames(data, positions, sizes, back, start + 1)
+			begin = frs[-1].side_info.main_data_begin
+			
+			if begin and reservoir == 'rebuild':
+				replacement = _rebuild_first_frame(frs)
+			if begin and replacement is None:
+				# include the frames holding the reservoir data (but not
+				# any that were already written)
+				while start > max(back, last_stop) and begin > 0:
+					start -= 1
+					begin -= len(frs[start - back].raw_body)
+		
+		# delete everything since the last range
+		if positions[start] > copied_to:
+			edits.delete_bytes(copied_to, positions[start])
+		
+		first_copied = start
+		if replacement is not None:
+			edits.replace(start, replacement)
+			out_positions.add_frame(out_frames, music_size)
+			music_size += len(replacement.encode())
+			out_frames += 1
+			first_copied += 1
+		
+		if first_copied < stop:
+			src_start = positions[first_copied]
+			src_end = positions[stop - 1] + sizes[stop - 1]
+			out_positions.add_span(out_frames, positions, first_copied,
+					music_size - src_start)
+			music_size += src_end - src_start
+			out_frames += stop - first_copied
+		
+		copied_to = positions[stop - 1] + sizes[stop - 1]
+		last_stop = stop
+	
+	if not out_frames:
+		raise errors.MP3UsageError('the ranges contain no frames')
+	
+	# delete the rest, except an ID3v1 tag
+	end = len(data)
+	v1size = 0
+	if keep_tags and end - copied_to >= 128 and \
+			mp3ext.id3v1_size(array.array('B', data[end-128:end]), True) > 0:
+		v1size = 128
+	if end - v1size > copied_to:
+		edits.delete_bytes(copied_to, end - v1size)
+	
+	# create the Xing frame, with a bitrate near the average
+	xing = vbr.new_xing_header()
+	duration = out_frames / frame_rate
+	xing_frame = vbr.make_xing_frame(head, xing, music_size * 8 / duration)
+	out_positions.base = tagsz + len(xing_frame)
+	out_size = out_positions.base + music_size + v1size
+	
+	xing.frame_count = out_frames
+	xing.byte_count = out_size
+	xing.seek_table = vbr.make_toc(out_positions, out_frames, out_size)
+	xing.encode(xing_frame)
+	edits.insert_at(tagsz, xing_frame)
+	
+	return (edits, out_size)
+
+
+def cut_file(source, dest, ranges, reservoir='rebuild', keep_tags=True):
+	"""cut_file(source, dest, ranges, reservoir='rebuild', keep_tags=True)
+ -> int
+
+Cut time ranges out of a source file (see plan_cut), write them to 'dest'
+(a filename, replaced atomically, or a file object), and return the size of
+the output.  The source file is memory-mapped, and only the frames at the
+start of each range are parsed."""
+	
+	f = open(source, 'rb')
+	try:
+		data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			(edits, size) = plan_cut(data, ranges, reservoir, keep_tags)
+			rewrite.rewrite(f, dest, edits)
+		finally:
+			data.close()
+	finally:
+		f.close()
+	return size
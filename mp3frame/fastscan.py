@@ -0,0 +1,207 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Fast location of the frames in an MPEG audio file that's entirely in memory
+(a string, byte array, or mmap object).  When NumPy is installed, every
+possible syncword is found and its header decoded in a few vectorized
+operations; otherwise the data is simply passed through PhysicalFrameSync.
+In both cases the result is identical to what PhysicalFrameSync would return,
+but free-format streams always use the PhysicalFrameSync path."""
+
+from __future__ import division, absolute_import
+import array
+import bisect
+from . import mp3bits, mp3ext, sync
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+_np_size_table = None
+
+
+def find_frames(data, use_numpy=True):
+	"""find_frames(data, use_numpy=True) -> (array, array)
+
+Return the byte position and size of every frame in 'data', as two arrays
+of equal length.  The frames are the ones PhysicalFrameSync would return
+for the same data.  NumPy is used if it's installed, unless 'use_numpy'
+is False."""
+	
+	if use_numpy and numpy is not None:
+		rv = _find_frames_numpy(data)
+		if rv is not None:
+			return rv
+	
+	return _find_frames_sync(data)
+
+
+def find_first_frames(data, count, use_numpy=True):
+	"""find_first_frames(data, count, use_numpy=True) -> (array, array)
+
+Like find_frames, but only return the first 'count' frames (or fewer, if
+there aren't that many).  Only as much data as necessary is scanned."""
+	
+	window = (count + 1) * 2048
+	while 1:
+		(positions, sizes) = find_frames(data[:window], use_numpy)
+		if len(positions) >= count or window >= len(data):
+			return (positions[:count], sizes[:count])
+		window *= 2
+
+
+def find_last_frames(data, count, use_numpy=True, margin=8):
+	"""find_last_frames(data, count, use_numpy=True, margin=8)
+ -> (array, array)
+
+Like find_frames, but only return the last 'count' frames (or fewer, if
+there aren't that many), scanning backwards from the end of the data in
+increasing steps.  Since a scan that starts in the middle of a frame can
+mistake some of its data for frames, 'margin' more frames than necessary
+must be found before the scan stops."""
+	
+	window = (count + margin) * 2048
+	while 1:
+		start = max(0, len(data) - window)
+		(positions, sizes) = find_frames(data[start:], use_numpy)
+		first = max(0, len(positions) - count)
+		if start == 0:
+			return (positions[first:], sizes[first:])
+		elif len(positions) >= count + margin:
+			positions = array.array('l',
+					[ pos + start for pos in positions[first:] ])
+			return (positions, sizes[first:])
+		window *= 2
+
+
+def _find_frames_sync(data, chunk_size=65536):
+	positions = array.array('l')
+	sizes = array.array('l')
+	
+	s = sync.PhysicalFrameSync()
+	pos = 0
+	while not s.done:
+		rv = s.readitem()
+		if rv is None:
+			if pos < len(data):
+				s.fromstring(data[pos:pos+chunk_size])
+				pos += chunk_size
+			elif s.read_eof:
+				break  # nothing more can be returned
+			else:
+				s.set_eof()
+		elif rv[0] == 'frame':
+			fr = rv[1]
+			positions.append(fr.byte_position)
+			sizes.append(len(fr))
+	
+	return (positions, sizes)
+
+
+def _find_frames_numpy(data):
+	# Returns None if a free-format frame is found.
+	global _np_size_table
+	if _np_size_table is None:
+		_np_size_table = numpy.array(
+				mp3bits.header_size_table(), dtype=numpy.int64)
+	
+	buf = numpy.frombuffer(data, dtype=numpy.uint8)
+	n = len(buf)
+	positions = array.array('l')
+	sizes = array.array('l')
+	if n < 4:
+		return (positions, sizes)
+	
+	# every position where the 11 sync bits are set
+	cand = numpy.flatnonzero((buf[:n-3] == 0xff) & (buf[1:n-2] >= 0xe0))
+	b1 = buf[cand + 1].astype(numpy.int64)
+	b2 = buf[cand + 2].astype(numpy.int64)
+	cand_sizes = _np_size_table[(((b1 >> 1) & 0xf) << 7) | (b2 >> 1)]
+	
+	# link each candidate to the candidate at pos + size, if there is one
+	target = cand + cand_sizes
+	nxt = numpy.searchsorted(cand, target)
+	nxt_clip = numpy.minimum(nxt, max(0, len(cand) - 1))
+	linked = ((cand_sizes > 0) & (nxt < len(cand))
+			& (cand[nxt_clip] == target))
+	nxt = numpy.where(linked, nxt, -1)
+	
+	cand = cand.tolist()
+	cand_sizes = cand_sizes.tolist()
+	nxt = nxt.tolist()
+	
+	# Walk through the data the way PhysicalFrameSync would; runs of
+	# linked frames are followed without any searching.
+	pos = 0
+	while n - pos >= 4:
+		i = bisect.bisect_left(cand, pos)
+		if i < len(cand) and cand[i] == pos:
+			while i >= 0:
+				size = cand_sizes[i]
+				if size < 0:
+					return None  # free-format frame
+				elif size == 0:
+					pos += 1  # invalid header; resync
+					break
+				elif pos + size > n:
+					pos = n  # truncated frame; garbage until EOF
+					break
+				
+				positions.append(pos)
+				sizes.append(size)
+				pos += size
+				i = nxt[i]
+			continue
+		
+		# not a syncword; it could be a tag
+		tagsize = _tag_size(buf, pos)
+		if tagsize > 0:
+			pos += tagsize
+			continue
+		
+		# garbage, up to the next syncword
+		if i >= len(cand):
+			break
+		pos = cand[i]
+	
+	return (positions, sizes)
+
+
+def _tag_size(buf, pos):
+	# identify_tag, given only as much data as it needs
+	window = 8192
+	while 1:
+		end = pos + window
+		eof = (end >= len(buf))
+		data = array.array('B', buf[pos:end].tostring())
+		(tagtype, tagsize) = mp3ext.identify_tag(data, eof)
+		if tagsize >= 0 or eof:
+			break
+		window *= 4
+	
+	if pos + tagsize > len(buf):
+		# a truncated tag; the rest of the file can't contain any frames
+		return len(buf) - pos
+	
+	return tagsize
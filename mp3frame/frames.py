@@ -23,6 +23,8 @@ from __future__ import division, absolute_import
 import array
 import struct
 from . import mp3bits, errors, side_info
+from . import crc
+from .crc import crc16, crc16_bits
 
 
 
@@ -40,12 +42,19 @@ Standard fields:
   side_info - set for layer 3 only (see side_info.py)
   raw_body - a byte array
   crc16 - an integer, or None
+  crc_ok - True or False if the CRC was verified while reading the frame
+           (see PhysicalFrameSync.verify_crc); otherwise None
+  body_modified - should be set to True after changing raw_body
+                  (see encode_into)
   resynced - True if sync was lost before reading this frame,
              False if the frame was found as expected
   frame_number - a generated sequence number for the frame (0-based)
   byte_position - the number of bytes that preceded the header
 """
 	
+	# frames built by hand are assumed to be modified; the sync clears this
+	body_modified = True
+	
 	def __len__(self):
 		return self.header.body_offset + len(self.raw_body)
 	
@@ -66,7 +75,8 @@ Standard fields:
 		"""encode(validate=True) -> byte array
 
 Encode the frame and return the raw data as a byte array.
-This will automatically encode and checksum the header and side info."""
+This will automatically encode and checksum the header and side info
+(crc16 is updated)."""
 		
 		head = self.header
 		head.encode()
@@ -99,12 +109,78 @@ This will automatically encode and checksum the header and side info."""
 					raise errors.MP3UsageError("raw_body is the wrong length")
 		
 		if need_crc:
-			crc = self.calc_crc()
+			crc = self.crc16 = self.calc_crc()
 			data[4] = crc >> 8
 			data[5] = crc & 0xff
 		
 		return data
 	
+	def encode_into(self, buf, offset=0, validate=True):
+		"""encode_into(buf, offset=0, validate=True) -> int
+
+Encode the frame into a bytearray or writable memoryview at the given
+offset, and return the number of bytes written.  Unlike encode, no copy of
+the frame is made: the header is only encoded if its fields were changed,
+and the CRC is only recalculated (and crc16 updated) if the header, side
+info or a layer 1/2 body was modified.  The side info is only validated
+against the body if one of them was modified.  The modification flags are
+cleared."""
+		
+		head = self.header
+		head_changed = head.modified
+		if head_changed:
+			head.encode()
+		
+		need_crc = (head.protection_bit == 0)
+		pos = offset + (6 if need_crc else 4)
+		body = self.raw_body
+		
+		layer3 = (head.layer_index == 1)
+		if layer3:
+			si = self.side_info
+			raw_si = si.raw_data
+			if validate:
+				if len(raw_si) != head.side_info_size:
+					raise errors.MP3UsageError("side info is the wrong length")
+				# (an unmodified frame was already consistent)
+				if (si.modified or self.body_modified) \
+						and si.part2_3_end > len(body):
+					raise errors.MP3UsageError("logical body extends past frame")
+			end = pos + len(raw_si) + len(body)
+		else:
+			end = pos + len(body)
+		
+		size = validate and head.frame_size
+		if size:
+			if end - offset > size:
+				raise errors.MP3UsageError("raw_body is the wrong length")
+		else:
+			size = end - offset
+		if offset + size > len(buf):
+			raise errors.MP3UsageError("buffer is too small")
+		
+		buf[offset:offset+4] = buffer(head.raw_data)
+		if layer3:
+			buf[pos:pos+len(raw_si)] = buffer(raw_si)
+			pos += len(raw_si)
+		buf[pos:end] = buffer(body)
+		if end < offset + size:
+			buf[end:offset+size] = _zeros(offset + size - end)
+		
+		if need_crc:
+			if layer3:
+				changed = si.modified
+			else:
+				changed = self.body_modified
+			if head_changed or changed or self.crc16 is None:
+				self.crc16 = self.calc_crc()
+			_crc_struct.pack_into(buf, offset + 4, self.crc16)
+		
+		if layer3:
+			si.modified = False
+		self.body_modified = False
+		return size
+	
 	def tofile(self, file):
 		"""tofile(file) -> None
 
@@ -117,25 +193,10 @@ Encode the frame and write it to the given file."""
 Calculate and return the CRC of the raw data fields; this doesn't
 automatically update/encode anything."""
 		
-		head = self.header
-		val = crc16(head.raw_data[2:4])
-		
-		layer_index = head.layer_index
-		if layer_index == 1:  # layer 3
-			val = crc16(self.side_info.raw_data, val)
-		elif layer_index == 3:  # layer 1
-			bytes = head.protected_byte_count
-			val = crc16(self.raw_body[:bytes], val)
-		elif layer_index == 2:  # layer 2
-			#TODO: test this
-			bits = head.protected_bit_count
-			last_byte = bits // 8
-			bits %= 8
-			
-			val = crc16(self.raw_body[:last_byte], val)
-			if bits:
-				last_part = self.raw_body[last_byte] >> (8-bits)
-				val = crc16_bits(last_part, bits, val)
+		(data, tail, tail_bits) = crc.protected_data(self)
+		val = crc16(data)
+		if tail_bits:
+			val = crc16_bits(tail, tail_bits, val)
 		
 		return val
 	
@@ -221,6 +282,17 @@ the side info)."""
 		self.raw_body[:] = data[-offset:]
 
 
+_crc_struct = struct.Struct('>H')
+
+# a buffer of zero bytes for padding frames in encode_into (grown as needed)
+_zero_str = '\0' * 2048
+def _zeros(n):
+	global _zero_str
+	if n > len(_zero_str):
+		_zero_str = '\0' * n
+	return buffer(_zero_str, 0, n)
+
+
 class FrameHeader(object):
 	__slots__ = ('version_index', 'layer_index', 'protection_bit',
 			'bitrate_index', 'samplerate_index', 'padded', 'private',
@@ -295,6 +367,21 @@ class FrameHeader(object):
 				| (mask('original', 1) << 2)
 				| mask('emphasis', 3) )
 	
+	def _get_modified(self):
+		# compares the fields with raw_data, without encoding anything
+		d = self.raw_data
+		return ( d[1] != (0xe0 | (self.version_index << 3)
+				| (self.layer_index << 1) | self.protection_bit)
+			or d[2] != ((self.bitrate_index << 4)
+				| (self.samplerate_index << 2) | (self.padded << 1)
+				| self.private)
+			or d[3] != ((self.channel_mode << 6)
+				| (self.mode_extension << 4) | (self.copy_control << 3)
+				| (self.original << 2) | self.emphasis) )
+	modified = property(_get_modified, doc="""\
+True if the fields have been changed since raw_data was decoded or
+encoded.""")
+	
 	def get_body_offset(self):
 		offset = 4
 		if self.protection_bit == 0:
@@ -474,39 +561,3 @@ class CommentTag(object):
 
 Writes the tag to the given file."""
 		self.raw_data.tofile(file)
-
-
-# CRC functions
-
-_crc_poly = 0x8005
-def crc16_bits(val, bits, start=0xffff):
-	"""crc16_bits(val, bits, start=0xffff) -> int
-
-Return the crc of 'val' (an integer), MSB first.
-The specified number of bits are used, and higher bits are ignored.
-crc16 is more efficient but only works on whole bytes."""
-	
-	crc = start
-	mask = 1 << bits
-	while bits > 0:
-		bits -= 1
-		mask >>= 1
-		
-		if ((val & mask) >> bits) ^ (crc >> 15):
-			crc = ((crc & 0x7fff) << 1) ^ _crc_poly
-		else:
-			crc = (crc & 0x7fff) << 1
-	
-	return crc
-
-_crc_table = tuple([ crc16_bits(x, 8, 0) for x in range(256) ])
-def crc16(data, start=0xffff):
-	"""crc16(data, start=0xffff) -> int
-
-Return the crc of 'data' (a sequence of unsigned 8-bit integers).
-This is a faster version of crc16_bits that only works on whole bytes."""
-	
-	crc = start
-	for ch in data:
-		crc = ((crc & 0xff) << 8) ^ _crc_table[(crc >> 8) ^ ch]
-	return crc
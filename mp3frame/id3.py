@@ -0,0 +1,237 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""\
+Reading and writing ID3v2.3 and ID3v2.4 tags at the start of a file.  A tag
+is represented as a list of (frame_id, data) pairs, where 'data' is the raw
+frame contents; text_frame and frame_text convert text frames.
+
+write_tag reuses the space of an existing tag (including its padding)
+whenever the new tag fits, so only the tag region is written; otherwise the
+file is rewritten with the audio data copied in spans (see rewrite.py)."""
+
+from __future__ import division, absolute_import
+from . import errors, mp3ext, rewrite
+import array
+import struct
+
+
+_frame_head = struct.Struct('>4sIH')
+
+
+def _syncsafe(n):
+	if n >= 1 << 28:
+		raise errors.MP3UsageError('ID3v2 size too large: %d' % n)
+	return ((n & 0x7f) | (n >> 7 & 0x7f) << 8 | (n >> 14 & 0x7f) << 16 |
+			(n >> 21 & 0x7f) << 24)
+
+
+def _unsyncsafe(n):
+	return ((n & 0x7f) | (n >> 8 & 0x7f) << 7 | (n >> 16 & 0x7f) << 14 |
+			(n >> 24 & 0x7f) << 21)
+
+
+def tag_size(head):
+	"""tag_size(head) -> int
+
+Return the total size of the ID3v2 tag starting with the given 10-byte
+header (a string), including any footer, or 0 if it isn't a tag header."""
+	
+	if len(head) < 10 or \
+			mp3ext.id3v2_size(array.array('B', head[:10]), True) <= 0:
+		return 0
+	size = 10 + _unsyncsafe(struct.unpack('>I', head[6:10])[0])
+	if ord(head[3]) == 4 and ord(head[5]) & 0x10:
+		size += 10  # a footer
+	return size
+
+
+def text_frame(frame_id, text, version=4):
+	"""text_frame(frame_id, text, version=4) -> tuple
+
+Return a (frame_id, data) pair for a text frame such as 'TIT2'.  The text
+is stored as ISO-8859-1 if possible, and otherwise as UTF-8 (for version
+4) or UTF-16 (for version 3)."""
+	
+	text = unicode(text)
+	try:
+		return (frame_id, '\0' + text.encode('latin-1'))
+	except UnicodeEncodeError:
+		if version == 4:
+			return (frame_id, '\3' + text.encode('utf-8'))
+		return (frame_id, '\1' + text.encode('utf-16'))
+
+
+def frame_text(data):
+	"""frame_text(data) -> unicode
+
+Decode the contents of a text frame (see text_frame).  Multiple values
+(allowed in version 4) are separated by null characters.  Empty data is
+decoded as an empty string; MP3DataError is raised for an unknown text
+encoding."""
+	
+	if not data:
+		return u''
+	
+	encodings = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+	if ord(data[0]) >= len(encodings):
+		raise errors.MP3DataError('unknown text encoding %d' % ord(data[0]))
+	return data[1:].decode(encodings[ord(data[0])]).rstrip(u'\0')
+
+
+def encode_tag(frames, version=4, size=None, padding=1024):
+	"""encode_tag(frames, version=4, size=None, padding=1024) -> str
+
+Return an ID3v2 tag containing the given (frame_id, data) pairs, followed
+by 'padding' null bytes, or by enough padding to make the tag exactly
+'size' bytes long.  MP3UsageError is raised if the frames don't fit in
+'size' bytes."""
+	
+	if version not in (3, 4):
+		raise errors.MP3UsageError('unsupported ID3v2 version %r' % version)
+	
+	parts = []
+	for (frame_id, data) in frames:
+		if len(frame_id) != 4 or not frame_id.isalnum():
+			raise errors.MP3UsageError('invalid frame ID %r' % frame_id)
+		
+		fsize = len(data)
+		if version == 4:
+			fsize = _syncsafe(fsize)
+		parts.append(_frame_head.pack(frame_id, fsize, 0))
+		parts.append(data)
+	body = ''.join(parts)
+	
+	if size is not None:
+		padding = size - 10 - len(body)
+		if padding < 0:
+			raise errors.MP3UsageError('the tag needs %d bytes, but only %d'
+					' are available' % (len(body) + 10, size))
+	
+	head = 'ID3' + struct.pack('>BBBI', version, 0, 0,
+			_syncsafe(len(body) + padding))
+	return head + body + '\0' * padding
+
+
+def decode_tag(data):
+	"""decode_tag(data) -> (int, list)
+
+Parse the ID3v2 tag at the start of 'data' (a string), and return its
+version and its list of (frame_id, data) pairs.  Returns None if there's
+no tag.  Padding and frame status flags are discarded.
+MP3ImplementationLimit is raised for versions other than 3 and 4, and for
+unsynchronized, compressed or encrypted data."""
+	
+	if not tag_size(data[:10]):
+		return None
+	
+	version = ord(data[3])
+	flags = ord(data[5])
+	if version not in (3, 4):
+		raise errors.MP3ImplementationLimit(
+				'unsupported ID3v2 version %d' % version)
+	elif flags & 0x80:
+		raise errors.MP3ImplementationLimit('unsynchronized ID3v2 tags'
+				' are not supported')
+	
+	end = 10 + _unsyncsafe(struct.unpack('>I', data[6:10])[0])
+	if end > len(data):
+		raise errors.MP3DataError('truncated ID3v2 tag')
+	
+	pos = 10
+	if flags & 0x40:
+		# skip the extended header
+		(extsize,) = struct.unpack('>I', data[10:14])
+		if version == 4:
+			pos += _unsyncsafe(extsize)
+		else:
+			pos += 4 + extsize
+	
+	frames = []
+	while pos + 10 <= end and data[pos] != '\0':
+		(frame_id, fsize, fflags) = _frame_head.unpack(data[pos:pos+10])
+		if version == 4:
+			fsize = _unsyncsafe(fsize)
+		
+		# the low byte holds the format flags (compression, etc.)
+		if fflags & 0xff:
+			raise errors.MP3ImplementationLimit('%s frame has unsupported'
+					' format flags %#x' % (frame_id, fflags & 0xff))
+		elif pos + 10 + fsize > end:
+			raise errors.MP3DataError('%s frame extends past the end of'
+					' the ID3v2 tag' % frame_id)
+		
+		frames.append( (frame_id, data[pos+10:pos+10+fsize]) )
+		pos += 10 + fsize
+	
+	return (version, frames)
+
+
+def read_tag(filename):
+	"""read_tag(filename) -> (int, list)
+
+Read the ID3v2 tag at the start of a file (see decode_tag)."""
+	
+	f = open(filename, 'rb')
+	try:
+		head = f.read(10)
+		tagsize = tag_size(head)
+		if not tagsize:
+			return None
+		return decode_tag(head + f.read(tagsize - 10))
+	finally:
+		f.close()
+
+
+def write_tag(filename, frames, version=4, padding=1024):
+	"""write_tag(filename, frames, version=4, padding=1024) -> bool
+
+Replace the ID3v2 tag at the start of a file (or add one), and return True
+if it was written in place.  If the file already has a tag at least as
+large as the new one, the new tag is padded to the same size and written
+over it.  Otherwise the file is rewritten with a tag that has 'padding'
+bytes of padding, so later changes can be made in place; the file is
+replaced atomically (see rewrite.rewrite)."""
+	
+	f = open(filename, 'r+b')
+	try:
+		f.seek(0, 2)
+		file_size = f.tell()
+		f.seek(0)
+		old_size = min(tag_size(f.read(10)), file_size)
+		
+		needed = len(encode_tag(frames, version, padding=0))
+		if old_size and needed <= old_size:
+			f.seek(0)
+			f.write(encode_tag(frames, version, size=old_size))
+			return True
+		
+		tag = encode_tag(frames, version, padding=padding)
+		edits = rewrite.EditList([], [])
+		if old_size:
+			edits.replace_bytes(0, old_size, tag)
+		else:
+			edits.insert_at(0, tag)
+		rewrite.rewrite(f, filename, edits)
+		return False
+	finally:
+		f.close()
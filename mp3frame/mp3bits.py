@@ -166,6 +166,34 @@ Return the size of a frame, in bytes; or None for a freeform frame."""
 	return ( (spf // (ss * 8)) * br // sr ) + ((padding != 0) * ss)
 
 
+_header_size_table = None
+def header_size_table():
+	"""header_size_table() -> tuple
+
+Return a table of frame sizes, indexed by the 11 header bits that determine
+the size (version, layer, bitrate, samplerate and padding).  For header
+bytes h1 and h2 (the second and third bytes of the frame), the index is
+  (((h1 >> 1) & 0xf) << 7) | (h2 >> 1)
+Each value is the frame size in bytes, 0 if the header is invalid, or -1
+for a free-format frame."""
+	
+	global _header_size_table
+	if _header_size_table is None:
+		table = []
+		for i in range(1 << 11):
+			try:
+				size = frame_size(i >> 9, (i >> 7) & 3,
+						(i >> 3) & 0xf, (i >> 1) & 3, i & 1)
+			except errors.MP3DataError:
+				size = 0
+			
+			if size is None:
+				size = -1
+			table.append(size)
+		_header_size_table = tuple(table)
+	
+	return _header_size_table
+
 def min_bitrate_index(version_index, layer_index, samplerate_index, bytes):
 	"""min_bitrate_index(version_index, layer_index, samplerate_index, bytes)
  -> (int, bool, int, int) or None
@@ -246,7 +274,7 @@ _l2_alloc_table_sel = (
 	(    0, 2, 2, 0,  0, 0, 0,  0,   0,  0,  0), # 48000/24000/12000 Hz
 	(    1, 3, 3, 0,  0, 0, 1,  1,   1,  1,  1), # 32000/16000/ 8000 Hz
 )
-_protected_bits = (
+_protected_bits = (  # indexed by layer_index, lsf, mono
 	None,
 	((256, 136), (136, 72)), # layer 3
 	
@@ -270,8 +298,9 @@ def protected_bit_count(version_index, layer_index, bitrate_index,
 Return the number of audio_data bits that would be protected by a CRC.
 protected_byte_count is a simpler interface if layer 2 support isn't needed."""
 	
+	lsf = (version_index != 3)
 	mono = (channel_mode == 3)
-	bits = _protected_bits[layer_index][mono]
+	bits = _protected_bits[layer_index][lsf][mono]
 	
 	if layer_index == 2:
 		i = _l2_alloc_table_sel[samplerate_index][bitrate_index]
@@ -297,8 +326,9 @@ For layer 3, no audio data outside the side_info structure is protected."""
 		raise errors.MP3UsageError(
 				"can't use protected_byte_count for layer 2")
 	
+	lsf = (version_index != 3)
 	mono = (channel_mode == 3)
-	bits = _protected_bits[lsf][layer_index][mono]
+	bits = _protected_bits[layer_index][lsf][mono]
 	if bits is None:
 		raise NotImplementedError(
 				"protected byte count unknown for L1/L2 lsf modes")
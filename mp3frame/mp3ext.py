@@ -23,6 +23,7 @@ Constants and utility functions for dealing with non-standard data fields
 like comment tags that appear in MPEG audio files.  Like mp3bits, the
 functions in this module work with raw data."""
 
+import struct
 from . import errors
 
 def identify_tag(data, eof):
@@ -0,0 +1,278 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Patching frame headers and side info in place.  Changes that don't affect
+frame sizes (global_gain, the copyright and original flags, private bits,
+etc.) only need the changed bytes of each frame to be written, and a CRC
+update for protected frames.
+
+diff_frames computes the changes without writing anything; patch_file
+writes them, using a journal so an interrupted patch can be undone by
+recover, and patch_copy writes a patched copy of a file."""
+
+from __future__ import division, absolute_import
+from . import errors, fastscan, rewrite
+from .cut import read_frames
+import struct
+import mmap
+import os
+
+
+_journal_magic = 'MP3PATCH1\n'
+_entry = struct.Struct('>QH')
+
+
+def journal_name(filename):
+	"""journal_name(filename) -> str
+
+Return the name of the journal file used when patching a file."""
+	return filename + '.mp3patch'
+
+
+def diff_frames(data, mutate, frames=None, positions=None, sizes=None):
+	"""diff_frames(data, mutate, frames=None, positions=None, sizes=None)
+ -> generator
+
+Call mutate(frame) for each selected frame of 'data' (a string or mmap
+object), and generate the resulting changes as (offset, old, new) tuples,
+where 'old' and 'new' are strings of equal length.  'frames' is a sequence
+of frame numbers in the index (see fastscan.find_frames), or None for all
+frames except a VBR header frame.  The callback may change any header or
+side info field that doesn't affect the frame size; the CRC of a protected
+frame is updated automatically.  MP3UsageError is raised if the frame size
+changes."""
+	
+	if positions is None:
+		(positions, sizes) = fastscan.find_frames(data)
+	
+	if frames is None:
+		frames = xrange(len(positions))
+		if len(positions):
+			fr = read_frames(data, positions, sizes, 0, 1)[0]
+			if fr.header.layer_index == 1 and fr.identify_vbr_header():
+				frames = xrange(1, len(positions))
+	
+	for i in frames:
+		fr = read_frames(data, positions, sizes, i, i+1)[0]
+		head = fr.header
+		offset = head.body_offset
+		
+		mutate(fr)
+		
+		# the data up to the body must stay the same size, since the body
+		# isn't touched
+		if head.modified:
+			head.encode()
+		if head.body_offset != offset or (head.frame_size or sizes[i]) \
+				!= sizes[i]:
+			raise errors.MP3UsageError('frame %d changed size' % i)
+		
+		new = head.raw_data.tostring()
+		if head.protection_bit == 0:
+			fr.crc16 = fr.calc_crc()
+			new += struct.pack('>H', fr.crc16)
+		if head.layer_index == 1:
+			new += fr.side_info.raw_data.tostring()
+		
+		pos = positions[i]
+		old = data[pos:pos+len(new)]
+		if old == new:
+			continue
+		
+		# only the changed bytes are returned
+		start = 0
+		while old[start] == new[start]:
+			start += 1
+		end = len(new)
+		while old[end-1] == new[end-1]:
+			end -= 1
+		yield (pos + start, old[start:end], new[start:end])
+
+
+def _pwrite(fd, data, offset):
+	pwrite = getattr(os, 'pwrite', None)
+	if pwrite is not None:
+		return pwrite(fd, data, offset)
+	
+	os.lseek(fd, offset, 0)
+	return os.write(fd, data)
+
+
+def _fsync_dir(filename):
+	# Sync the directory containing a file, so that creating or removing
+	# the file is on disk (fsync on the file itself doesn't do that).
+	fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+
+def _read_journal(f):
+	# Returns a list of (offset, old, new) from a journal file, or None if
+	# the journal is incomplete.
+	if f.read(len(_journal_magic)) != _journal_magic:
+		return None
+	
+	ret = []
+	while 1:
+		head = f.read(_entry.size)
+		if len(head) < _entry.size:
+			return None
+		
+		(offset, size) = _entry.unpack(head)
+		if size == 0:
+			# the trailer holds the number of entries
+			if offset != len(ret) or f.read(3) != 'END':
+				return None
+			return ret
+		
+		old = f.read(size)
+		new = f.read(size)
+		if len(new) < size:
+			return None
+		ret.append( (offset, old, new) )
+
+
+def patch_file(filename, mutate, frames=None, journal=True, positions=None,
+		sizes=None):
+	"""patch_file(filename, mutate, frames=None, journal=True, positions=None,
+           sizes=None) -> (int, int)
+
+Apply mutate(frame) to the selected frames of a file in place (see
+diff_frames), and return the number of changes and the number of bytes
+written.  A frame index can be passed as 'positions' and 'sizes' if it's
+already known; it may cover only part of the file (see
+fastscan.find_last_frames).
+
+If 'journal' is set, the original bytes are first saved to a journal file
+(see journal_name) and synced to disk along with its directory, and the
+journal is removed once the file has been synced.  If the patch is
+interrupted, recover restores the original bytes.  MP3UsageError is raised
+if a journal already exists."""
+	
+	jname = journal_name(filename)
+	if journal and os.path.exists(jname):
+		raise errors.MP3UsageError('%s exists; run recover first' % jname)
+	
+	fd = os.open(filename, os.O_RDWR)
+	try:
+		size = os.fstat(fd).st_size
+		if not size:
+			return (0, 0)
+		data = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+		try:
+			changes = list(diff_frames(data, mutate, frames, positions,
+					sizes))
+		finally:
+			data.close()
+		if not changes:
+			return (0, 0)
+		
+		if journal:
+			jf = open(jname, 'wb')
+			try:
+				jf.write(_journal_magic)
+				for (offset, old, new) in changes:
+					jf.write(_entry.pack(offset, len(old)))
+					jf.write(old)
+					jf.write(new)
+				jf.write(_entry.pack(len(changes), 0) + 'END')
+				jf.flush()
+				os.fsync(jf.fileno())
+			finally:
+				jf.close()
+			_fsync_dir(jname)
+		
+		total = 0
+		for (offset, old, new) in changes:
+			total += _pwrite(fd, new, offset)
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+	
+	if journal:
+		os.remove(jname)
+		_fsync_dir(jname)
+	return (len(changes), total)
+
+
+def patch_copy(source, dest, mutate, frames=None, positions=None,
+		sizes=None):
+	"""patch_copy(source, dest, mutate, frames=None, positions=None,
+           sizes=None) -> (int, int)
+
+Like patch_file, but write a patched copy of the source file to 'dest' (a
+filename, which is replaced atomically, or a file object).  The file is
+copied in spans (see rewrite.rewrite), with the changed bytes in between.
+Returns the number of changes and the size of the output."""
+	
+	f = open(source, 'rb')
+	try:
+		if not f.read(4):
+			data = ''  # mmap doesn't accept empty files
+		else:
+			data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			edits = rewrite.EditList([], [])
+			count = 0
+			for (offset, old, new) in diff_frames(data, mutate, frames,
+					positions, sizes):
+				edits.replace_bytes(offset, offset + len(old), new)
+				count += 1
+			return (count, rewrite.rewrite(f, dest, edits))
+		finally:
+			if data:
+				data.close()
+	finally:
+		f.close()
+
+
+def recover(filename):
+	"""recover(filename) -> bool
+
+Undo an interrupted patch_file, using its journal if there is one, and
+remove the journal.  Returns True if any data was restored.  An incomplete
+journal means the file wasn't changed yet, so it's simply removed."""
+	
+	jname = journal_name(filename)
+	if not os.path.exists(jname):
+		return False
+	
+	jf = open(jname, 'rb')
+	try:
+		changes = _read_journal(jf)
+	finally:
+		jf.close()
+	
+	if changes:
+		fd = os.open(filename, os.O_RDWR)
+		try:
+			for (offset, old, new) in changes:
+				_pwrite(fd, old, offset)
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+	
+	os.remove(jname)
+	_fsync_dir(jname)
+	return bool(changes)
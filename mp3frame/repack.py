@@ -0,0 +1,334 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""\
+Lossless repacking of layer 3 files at the smallest possible bitrates.
+
+Each frame's main data (its logical body) is placed as early as the bit
+reservoir allows, and the frame is given the lowest bitrate that leaves
+enough reservoir space for the frames that follow.  The reservoir needed
+by the following frames is worked out from a bounded number of frames of
+lookahead; beyond that, a frame's original main_data_begin is a safe
+estimate, since the original file managed with it.  The headers and side
+info are unchanged apart from the bitrate, padding and main_data_begin, so
+the audio decodes identically; ancillary data and padding are dropped.
+Garbage between frames is kept unless the caller asks to drop it."""
+
+from __future__ import division, absolute_import
+from . import errors, frames, mp3bits, side_info, sync, vbr, writer
+from .concat import stream_params
+import array
+import collections
+
+
+def _max_begin(header):
+	# the largest main_data_begin value (the field is 9 bits, or 8 bits
+	# for MPEG 2 and 2.5)
+	return 511 if header.version_index == 3 else 255
+
+
+class _Packer(object):
+	# Turns frames with logical bodies into new physical frames, calling
+	# emit(frame) for each one in order.  Frames are packed once 'lookahead'
+	# later frames have been seen (or at the end of the stream).
+	
+	def __init__(self, emit, lookahead=32, verify=True):
+		self.emit = emit
+		self.lookahead = max(1, lookahead)
+		self.frames_out = 0
+		self._ahead = collections.deque()
+		self._max_body = {}
+		
+		# free bytes available to the next frame's main_data_begin
+		self._reservoir = 0
+		
+		# output frames whose bodies can still receive main data, and the
+		# bodies themselves, concatenated
+		self._pending = collections.deque()
+		self._stream = bytearray()
+		
+		self._check = None
+		if verify:
+			self._check = sync.LogicalFrameAssembler()
+			self._expected = collections.deque()
+	
+	def _body_limit(self, header):
+		# the largest body a frame with this header can have
+		key = (header.version_index, header.samplerate_index,
+				header.channel_mode == 3, header.protection_bit)
+		limit = self._max_body.get(key)
+		if limit is None:
+			head = frames.FrameHeader(header.raw_data)
+			head.bitrate_index = 14
+			head.padded = 1
+			limit = self._max_body[key] = head.frame_size - head.body_offset
+		return limit
+	
+	def frame_in(self, fr):
+		self._ahead.append(fr)
+		if len(self._ahead) > self.lookahead:
+			fr = self._ahead.popleft()
+			self._pack(fr, self._need(False))
+	
+	def finish(self):
+		while self._ahead:
+			fr = self._ahead.popleft()
+			self._pack(fr, self._need(True))
+		while self._pending:
+			self._emit_first()
+	
+	def _need(self, final):
+		# Returns the reservoir the next frame must start with so that all
+		# the frames after it fit.  Frame j needs
+		#   max(0, len(main data) + need(j+1) - largest body)
+		# which is 0 whenever the main data is small enough, whatever
+		# follows.
+		ahead = self._ahead
+		n = len(ahead)
+		if not n:
+			return 0
+		
+		stop = n
+		need = 0
+		for j in xrange(n):
+			fr = ahead[j]
+			if len(fr.logical_body) + _max_begin(fr.header) <= \
+					self._body_limit(fr.header):
+				stop = j
+				break
+		else:
+			if not final:
+				# the need of the last frame is at most its original
+				# main_data_begin
+				stop = n - 1
+				need = ahead[stop].side_info.main_data_begin
+		
+		for j in xrange(stop - 1, -1, -1):
+			fr = ahead[j]
+			need = max(0, len(fr.logical_body) + need -
+					self._body_limit(fr.header))
+		return need
+	
+	def _pack(self, fr, need):
+		head = fr.header
+		main_data = fr.logical_body
+		size = len(main_data)
+		begin = self._reservoir
+		
+		# the smallest frame holding this frame's main data, and leaving
+		# 'need' bytes of reservoir
+		body_needed = max(0, size + need - begin)
+		rv = mp3bits.min_bitrate_index(head.version_index, head.layer_index,
+				head.samplerate_index, head.body_offset + body_needed)
+		if rv is None:
+			raise errors.MP3DataError('frame %s doesn\'t fit in the bit'
+					' reservoir' % getattr(fr, 'frame_number', '?'))
+		(bitrate_index, padded, frame_size, bitrate) = rv
+		
+		newhead = frames.FrameHeader(head.raw_data)
+		newhead.bitrate_index = bitrate_index
+		newhead.padded = int(padded)
+		newhead.encode()
+		
+		new = frames.MP3Frame()
+		new.header = newhead
+		new.side_info = side_info.SideInfo(head.version_index,
+				head.channel_mode, fr.side_info.raw_data[:])
+		new.side_info.main_data_begin = begin
+		new.crc16 = None
+		
+		# place the main data, starting in the free space of earlier frames
+		stream = self._stream
+		body_size = frame_size - newhead.body_offset
+		stream.extend('\0' * body_size)
+		start = len(stream) - body_size - begin
+		stream[start:start+size] = buffer(main_data)
+		self._pending.append( (new, body_size) )
+		self._reservoir = min(_max_begin(head), len(stream) - (start + size))
+		if self._check is not None:
+			self._expected.append(main_data)
+		
+		# write out the frames the reservoir no longer reaches
+		while self._pending and \
+				len(stream) - self._pending[0][1] >= self._reservoir:
+			self._emit_first()
+	
+	def _emit_first(self):
+		(fr, body_size) = self._pending.popleft()
+		body = array.array('B')
+		body.fromstring(buffer(self._stream, 0, body_size))
+		del self._stream[:body_size]
+		fr.raw_body = body
+		
+		if self._check is not None:
+			expected = self._expected.popleft()
+			if self._check.frame_in(fr) != expected:
+				raise errors.MP3DataError('repacked frame %d doesn\'t match'
+						' the original' % self.frames_out)
+		
+		self.frames_out += 1
+		self.emit(fr)
+
+
+def repack_file(source, dest, lookahead=32, xing=True, verify=True,
+		keep_garbage=True):
+	"""repack_file(source, dest, lookahead=32, xing=True, verify=True,
+            keep_garbage=True) -> int
+
+Repack the frames of a layer 3 file at the smallest bitrates possible,
+write them to 'dest' (a filename, which is replaced atomically, or a file
+object), and return the size of the output.  'dest' may be the same as
+'source'.  ID3v2 and ID3v1 tags at the start and end of the file are kept,
+and other tags are moved to the end; an existing VBR header frame is
+replaced with a new Xing frame if 'xing' is set.  'lookahead' is the
+maximum number of frames held in memory.  If 'keep_garbage' is set, any
+other data (garbage) is written after the same frame as in the source;
+otherwise it's dropped.
+
+If 'verify' is set, each output frame's logical body is reassembled and
+compared with the original; MP3DataError is raised (and the output
+discarded) if they differ.  MP3DataError is also raised if a frame's main
+data isn't available (see LogicalFrameAssembler), since it can't be
+copied."""
+	
+	src = open(source, 'rb')
+	w = writer.FrameWriter(dest, atomic=isinstance(dest, basestring))
+	try:
+		toc = vbr.TOCBuilder()
+		# garbage waiting for the given number of frames to be written
+		garbage = collections.deque()
+		def emit(fr):
+			toc.add(w.position)
+			w.write_frame(fr)
+			# (frames_out already counts this frame)
+			while garbage and garbage[0][0] <= packer.frames_out:
+				w.write(garbage.popleft()[1])
+		
+		packer = _Packer(emit, lookahead, verify)
+		s = sync.FileSyncWrapper(sync.LogicalFrameSync(), src)
+		params = None
+		xing_header = xing_frame = xing_pos = None
+		frames_in = 0
+		trailing = []
+		for (typ, item) in s.items():
+			if typ == 'tag':
+				if params is None:
+					w.write_tag(item)
+				else:
+					trailing.append(item)
+				continue
+			elif typ not in ('frame', 'badframe'):
+				if keep_garbage and frames_in:
+					garbage.append( (frames_in, item) )
+				elif keep_garbage:
+					w.write(item)
+				continue
+			
+			if params is None:
+				if item.header.layer_index != 1:
+					raise errors.MP3UsageError('not a layer 3 file')
+				params = stream_params(item.header)
+				if item.identify_vbr_header():
+					continue
+			elif stream_params(item.header) != params:
+				raise errors.MP3UsageError('frame %d: stream parameters'
+						' changed' % item.frame_number)
+			
+			if xing and xing_frame is None:
+				# reserve space for the Xing frame, which is filled in
+				# at the end
+				xing_header = vbr.new_xing_header()
+				xing_frame = vbr.make_xing_frame(item.header, xing_header)
+				xing_pos = w.write_frame(xing_frame)
+			
+			if item.logical_body is None:
+				raise errors.MP3DataError('frame %d: main data not'
+						' available' % item.frame_number)
+			packer.frame_in(item)
+			frames_in += 1
+		
+		packer.finish()
+		for tag in trailing:
+			w.write_tag(tag)
+		
+		if xing_frame is not None and packer.frames_out:
+			xing_header.frame_count = packer.frames_out
+			xing_header.byte_count = w.position
+			xing_header.seek_table = toc.toc(w.position)
+			xing_header.encode(xing_frame)
+			w.overwrite(xing_pos, xing_frame.encode())
+	except:
+		w.abort()
+		raise
+	finally:
+		src.close()
+	
+	w.close()
+	return w.position
+
+
+def _logical_frames(f):
+	# Generates (header, side info with main_data_begin cleared, logical
+	# body) for the music frames of a file.
+	s = sync.FileSyncWrapper(sync.LogicalFrameSync(), f)
+	first = True
+	for fr in s.frames():
+		if first:
+			first = False
+			if fr.header.layer_index == 1 and fr.identify_vbr_header():
+				continue
+		
+		head = fr.header
+		si = fr.side_info
+		if head.layer_index == 1:
+			si = side_info.SideInfo(head.version_index, head.channel_mode,
+					si.raw_data[:])
+			si.main_data_begin = 0
+		yield (stream_params(head) + (head.mode_extension, head.emphasis),
+				si.raw_data, fr.logical_body)
+
+
+def compare_files(name1, name2):
+	"""compare_files(name1, name2) -> int or None
+
+Compare the logical frames of two files (ignoring VBR header frames,
+bitrates and the placement of main data), and return the number of the
+first music frame that would decode differently, or None if the audio is
+identical."""
+	
+	f1 = open(name1, 'rb')
+	f2 = open(name2, 'rb')
+	try:
+		frames1 = _logical_frames(f1)
+		frames2 = _logical_frames(f2)
+		n = 0
+		while 1:
+			a = next(frames1, None)
+			b = next(frames2, None)
+			if a is None and b is None:
+				return None
+			elif a != b:
+				return n
+			n += 1
+	finally:
+		f1.close()
+		f2.close()
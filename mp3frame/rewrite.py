@@ -0,0 +1,190 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Rewriting a file from an edit list.  The edits (insertions, deletions and
+replacements) refer to frame numbers in an index of the source file, such
+as the one returned by fastscan.find_frames, or to byte positions.  Only
+the inserted items are encoded; everything else is copied from the source
+file in large spans (see FrameWriter.copy_from)."""
+
+from __future__ import division, absolute_import
+from . import errors, frames, writer
+
+
+class EditList(object):
+	"""EditList(positions, sizes) -> object
+
+Return an empty edit list for a file whose frames start at the given byte
+positions and have the given sizes (two sequences of equal length).
+Inserted and replacement items may be MP3Frame or CommentTag objects,
+strings, or byte arrays.  Edits can be added in any order, but deleted and
+replaced spans must not overlap; items inserted at the same position are
+written in the order they were added."""
+	
+	def __init__(self, positions, sizes):
+		if len(positions) != len(sizes):
+			raise ValueError('positions and sizes must have equal length')
+		self.positions = positions
+		self.sizes = sizes
+		
+		# (start, end, sequence number, item or None)
+		self._edits = []
+	
+	def __len__(self):
+		return len(self._edits)
+	
+	def _add(self, start, end, item):
+		self._edits.append( (start, end, len(self._edits), item) )
+	
+	def _frame_end(self, index):
+		return self.positions[index] + self.sizes[index]
+	
+	### edits by byte position
+	
+	def insert_at(self, pos, item):
+		"""insert_at(pos, item) -> None
+
+Insert an item before the source byte at 'pos'."""
+		self._add(pos, pos, item)
+	
+	def delete_bytes(self, start, end):
+		"""delete_bytes(start, end) -> None
+
+Delete the source bytes from 'start' up to (not including) 'end'."""
+		if end <= start:
+			raise errors.MP3UsageError('empty span')
+		self._add(start, end, None)
+	
+	def replace_bytes(self, start, end, item):
+		"""replace_bytes(start, end, item) -> None
+
+Replace the source bytes from 'start' up to 'end' with an item."""
+		if end <= start:
+			raise errors.MP3UsageError('empty span')
+		self._add(start, end, item)
+	
+	### edits by frame number
+	
+	def insert(self, index, item):
+		"""insert(index, item) -> None
+
+Insert an item before the given frame, or after the last frame if 'index'
+is the number of frames."""
+		if index == len(self.positions):
+			self.insert_at(self._frame_end(index - 1), item)
+		else:
+			self.insert_at(self.positions[index], item)
+	
+	def delete(self, start, stop=None):
+		"""delete(start, stop=None) -> None
+
+Delete frames 'start' up to (not including) 'stop', or just frame 'start'
+if 'stop' is None.  Anything between the frames, such as garbage, is also
+deleted."""
+		if stop is None:
+			stop = start + 1
+		self.delete_bytes(self.positions[start], self._frame_end(stop - 1))
+	
+	def replace(self, index, item):
+		"""replace(index, item) -> None
+
+Replace a frame with an item."""
+		self.replace_bytes(self.positions[index], self._frame_end(index),
+				item)
+	
+	### output
+	
+	def plan(self, file_size):
+		"""plan(file_size) -> list
+
+Return the steps needed to write the edited file, given the size of the
+source file.  Each step is ('copy', start, end) for a span of source bytes,
+or ('item', item) for an inserted or replacement item."""
+		
+		steps = []
+		pos = 0
+		for (start, end, seq, item) in sorted(self._edits):
+			if start < pos:
+				raise errors.MP3UsageError(
+						'edit at %d overlaps a deleted span' % start)
+			elif end > file_size:
+				raise errors.MP3UsageError(
+						'edit at %d extends past the end of the file' % start)
+			
+			if start > pos:
+				steps.append( ('copy', pos, start) )
+			if item is not None:
+				steps.append( ('item', item) )
+			pos = end
+		
+		if pos < file_size:
+			steps.append( ('copy', pos, file_size) )
+		return steps
+
+
+def write_item(w, item):
+	"""write_item(FrameWriter, item) -> int
+
+Write an MP3Frame, CommentTag, string or byte array, and return its
+position in the output."""
+	if isinstance(item, frames.MP3Frame):
+		return w.write_frame(item)
+	elif isinstance(item, frames.CommentTag):
+		return w.write_tag(item)
+	else:
+		return w.write(item)
+
+
+def rewrite(source, dest, edits, atomic=True):
+	"""rewrite(source, dest, edits, atomic=True) -> int
+
+Write a copy of the source file with an EditList applied, and return the
+size of the output.  'source' and 'dest' may be filenames or file objects
+(the source must be seekable).  If 'dest' is a filename, it's replaced
+atomically unless 'atomic' is False (see FrameWriter); it may be the same
+as the source filename in that case."""
+	
+	if isinstance(source, basestring):
+		src = open(source, 'rb')
+	else:
+		src = source
+	
+	try:
+		src.seek(0, 2)
+		steps = edits.plan(src.tell())
+		
+		w = writer.FrameWriter(dest,
+				atomic=(atomic and isinstance(dest, basestring)))
+		try:
+			for step in steps:
+				if step[0] == 'copy':
+					w.copy_from(src, step[1], step[2] - step[1])
+				else:
+					write_item(w, step[1])
+		except:
+			w.abort()
+			raise
+		w.close()
+		return w.position
+	finally:
+		if src is not source:
+			src.close()
@@ -20,20 +20,39 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from __future__ import division, absolute_import
-from . import mp3bits, bitfields
+from . import mp3bits, bitfields, errors
 import array
-import weakref
+
+
+# The channel and granule objects are lightweight views: they hold nothing
+# but a reference to the side info's raw_data array (and to the SideInfo
+# itself, so that assignments can set its 'modified' flag), and all fields
+# are properties (shared by every instance of a layout) that read or write
+# bits in that array.  The views are only created when SideInfo.channels is
+# first used.
+
+def _tracked(prop):
+	# Returns a BitField like 'prop' whose setter also sets the 'modified'
+	# flag of the SideInfo that owns the view (or the SideInfo itself).
+	fset = prop.fset
+	def set_tracked(obj, val):
+		fset(obj, val)
+		obj._owner.modified = True
+	
+	return bitfields.BitField(prop.fget, set_tracked,
+			prop.bytefield_name, prop.offset, prop.bits)
 
 
 ### Channel structures
 
 class ChannelBase(object):
-	__slots__ = ('_side_info', 'granules')
-	def __init__(self, side_info, granules):
-		self._side_info = side_info
+	__slots__ = ('_raw', '_owner', 'granules')
+	def __init__(self, raw_data, granules, owner=None):
+		self._raw = raw_data
+		self._owner = owner
 		self.granules = granules
 	
-	_raw_side_info = property(lambda s: s._side_info.raw_data)
+	_raw_side_info = property(lambda s: s._raw)
 
 class MPEG1Channel(ChannelBase):  # abstract class (doesn't provide _scfsi)
 	__slots__ = ()
@@ -57,15 +76,15 @@ class MPEG1Channel(ChannelBase):  # abstract class (doesn't provide _scfsi)
 
 class MPEG1MonoChannel(MPEG1Channel):
 	__slots__ = ()
-	_scfsi = bitfields.make_property('_raw_side_info', 14, 4)
+	_scfsi = _tracked(bitfields.make_property('_raw', 14, 4))
 
 class MPEG1StereoChannel_C0(MPEG1Channel):
 	__slots__ = ()
-	_scfsi = bitfields.make_property('_raw_side_info', 12, 4)
+	_scfsi = _tracked(bitfields.make_property('_raw', 12, 4))
 
 class MPEG1StereoChannel_C1(MPEG1Channel):
 	__slots__ = ()
-	_scfsi = bitfields.make_property('_raw_side_info', 16, 4)
+	_scfsi = _tracked(bitfields.make_property('_raw', 16, 4))
 
 
 ### Granule structures
@@ -74,12 +93,61 @@ class MPEG1StereoChannel_C1(MPEG1Channel):
 # different between MPEG1 and MPEG2/2.5.
 
 class GranuleBase(object):
-	__slots__ = ('_side_info',)
+	__slots__ = ('_raw', '_owner')
+	
+	def __init__(self, raw_data, owner=None):
+		self._raw = raw_data
+		self._owner = owner
 	
-	def __init__(self, side_info):
-		self._side_info = side_info
+	_raw_side_info = property(lambda s: s._raw)
+
+
+def granule_fields(lsf):
+	"""granule_fields(lsf) -> tuple
+
+Describe the layout of a layer 3 granule.  Each item of the returned tuple
+is (name, offset, bits, count, blocksplit_flag):
+  name - the field name
+  offset - the bit offset relative to the start of the granule
+  bits - the size of each value, in bits
+  count - the number of values (1 for a plain integer field; otherwise
+          the field is a tuple of 'count' values)
+  blocksplit_flag - the value blocksplit_flag must have for the field to be
+                    present; or None if it's always present
+Granules start at the offsets given by mp3bits.side_info_bit_offsets."""
+	
+	scalefac_bits = 9 if lsf else 4
+	fields = [
+		('part2_3_length', 0, 12, 1, None),
+		('big_values', 12, 9, 1, None),
+		('global_gain', 21, 8, 1, None),
+		('scalefac_compress', 29, scalefac_bits, 1, None),
+	]
+	pos = 29 + scalefac_bits
+	fields += [
+		('blocksplit_flag', pos, 1, 1, None),
+		
+		# when blocksplit_flag is cleared
+		('table_select', pos + 1, 5, 3, 0),
+		('region_address1', pos + 16, 4, 1, 0),
+		('region_address2', pos + 20, 3, 1, 0),
+		
+		# when blocksplit_flag is set
+		('block_type', pos + 1, 2, 1, 1),
+		('switch_point', pos + 3, 1, 1, 1),
+		('table_select', pos + 4, 5, 2, 1),
+		('subblock_gain', pos + 14, 3, 3, 1),
+	]
+	pos += 23
+	if not lsf:
+		fields.append( ('preflag', pos, 1, 1, None) )
+		pos += 1
 	
-	_raw_side_info = property(lambda s: s._side_info.raw_data)
+	fields += [
+		('scalefac_scale', pos, 1, 1, None),
+		('count1table_select', pos + 1, 1, 1, None),
+	]
+	return tuple(fields)
 
 
 def _make_bdprop(flag0=None, flag1=None):
@@ -101,99 +169,117 @@ def _make_bdprop(flag0=None, flag1=None):
 	
 	def err(gran):
 		state = "set" if gran.blocksplit_flag else "cleared"
-		raise mp3bits.MP3UsageError( "field not present"
+		raise errors.MP3UsageError( "field not present"
 				" when blocksplit_flag " + state )
 	
 	return property(get_blockdata_field, set_blockdata_field)
 
 
-def _add_blockdata_fields(offset, cls):
-	def bf(pos, bits):
-		return bitfields.make_property('_raw_side_info', offset + pos, bits)
+def _make_field_property(offset, bits, count):
+	prop = _tracked(bitfields.make_property('_raw', offset, count * bits))
+	if count == 1:
+		return prop
 	
-	def arr(pos, bits, count):
-		prop = bf(pos, count * bits)
-		(fget, fset) = (prop.fget, prop.fset)
-		
-		mask = (1 << bits) - 1
-		shifts = range(bits*(count-1), -1, -bits)
-		
-		def get_tuple(gran):
-			val = fget(gran)
-			return tuple([ ((val >> sh) & mask) for sh in shifts ])
-		
-		def set_tuple(gran, val):
-			if len(val) != count:
-				raise ValueError('value must have length %d' % count)
-			
-			num = 0
-			for x in val:
-				num = (num << bits) | (x & mask)
-			fset(gran, num)
-		
-		return property(get_tuple, set_tuple)
+	# an array field; the values are packed into one integer
+	(fget, fset) = (prop.fget, prop.fset)
 	
-	# fields (with sizes) when blocksplit_flag cleared:
-	#   table_select, 15
-	#   region_address1, 4
-	#   region_address2, 3
-	# when blocksplit_flag set:
-	#   block_type, 2
-	#   switch_point, 1
-	#   table_select, 10
-	#   subblock_gain, 9
+	mask = (1 << bits) - 1
+	shifts = range(bits*(count-1), -1, -bits)
 	
-	cls.table_select = _make_bdprop(flag0=arr(0, 5, 3), flag1=arr(3, 5, 2))
-	cls.region_address1 = _make_bdprop(flag0=bf(15, 4))
-	cls.region_address2 = _make_bdprop(flag0=bf(19, 3))
-	cls.block_type = _make_bdprop(flag1=bf(0, 2))
-	cls.switch_point = _make_bdprop(flag1=bf(2, 1))
-	cls.subblock_gain = _make_bdprop(flag1=arr(13, 3, 3))
+	def get_tuple(gran):
+		val = fget(gran)
+		return tuple([ ((val >> sh) & mask) for sh in shifts ])
 	
-	return 22
+	def set_tuple(gran, val):
+		if len(val) != count:
+			raise ValueError('value must have length %d' % count)
+		
+		num = 0
+		for x in val:
+			num = (num << bits) | (x & mask)
+		fset(gran, num)
+	
+	return property(get_tuple, set_tuple)
 
 
 def _make_gran_class(lsf, offset, classname):
 	d = { '__slots__': () }
 	cls = type(classname, (GranuleBase,), d)
 	
-	fields = (
-		('part2_3_length', 12),
-		('big_values', 9),
-		('global_gain', 8),
-		('scalefac_compress', 9 if lsf else 4),
-		('blocksplit_flag', 1),
-		(_add_blockdata_fields,),
-		None if lsf else ('preflag', 1),
-		('scalefac_scale', 1),
-		('count1table_select', 1)
-	)
-	
-	for item in fields:
-		if not item:
-			pass
-		elif callable(item[0]):
-			offset += item[0](offset, cls, *item[1:])
+	blockdata = {}
+	for (name, pos, bits, count, flag) in granule_fields(lsf):
+		prop = _make_field_property(offset + pos, bits, count)
+		if flag is None:
+			setattr(cls, name, prop)
 		else:
-			(name, bits) = item
-			setattr(cls, name, bitfields.make_property(
-					'_raw_side_info', offset, bits))
-			offset += bits
+			blockdata.setdefault(name, [None, None])[flag] = prop
+	
+	for (name, props) in blockdata.items():
+		setattr(cls, name, _make_bdprop(*props))
 	
 	return cls
 
 
 ### SideInfo classes
 
-def _calc_part2_3_bytes(side_info):
-	total = 0
-	for chan in side_info.channels:
-		for gran in chan.granules:
-			total += gran.part2_3_length
-	return (total + 7) // 8
-
 class SideInfoBase(object):
-	__slots__ = ()
+	__slots__ = ('_raw', '_channels', 'modified', '__weakref__')
+	
+	# set by _make_si_class for each layout:
+	#   _channel_classes - (channel class, granule classes) per channel
+	#   _part2_3_getters - a getter for each part2_3_length field
+	#   _blank - an all-zero raw_data array of the correct size
+	
+	def __init__(self, raw_data=None):
+		if raw_data:
+			self._raw = raw_data
+			self.modified = False
+		else:
+			self._raw = self._blank[:]
+			self.modified = True
+		self._channels = None
+	
+	# lets the SideInfo-level fields share _tracked with the views
+	_owner = property(lambda s: s)
+	
+	def _get_raw_data(self):
+		return self._raw
+	
+	def _set_raw_data(self, raw_data):
+		self._raw = raw_data
+		self.modified = False
+		if self._channels is not None:
+			for chan in self._channels:
+				chan._raw = raw_data
+				for gran in chan.granules:
+					gran._raw = raw_data
+	
+	raw_data = property(_get_raw_data, _set_raw_data, doc="""\
+The raw side info bytes.  Assigning a new array rebinds this object and
+its channel and granule objects, which allows one SideInfo to be reused
+for many frames.
+
+The 'modified' attribute is set when a field is assigned, and cleared when
+raw_data is assigned (or the frame is encoded with encode_into); callers
+that change the raw bytes directly should set it themselves.""")
+	
+	def _get_channels(self):
+		chans = self._channels
+		if chans is None:
+			raw = self._raw
+			chans = self._channels = tuple([
+					chcls(raw, tuple([ grcls(raw, self) for grcls in grclasses ]),
+						self)
+					for (chcls, grclasses) in self._channel_classes ])
+		return chans
+	
+	channels = property(_get_channels)
+	
+	def _calc_part2_3_bytes(self):
+		total = 0
+		for getter in self._part2_3_getters:
+			total += getter(self)
+		return (total + 7) // 8
 	
 	part2_3_bytes = property(_calc_part2_3_bytes)
 	part2_3_end = property(
@@ -239,41 +325,31 @@ def _make_si_class(lsf, mono):
 	### build the main SideInfo class
 	
 	si_size = mp3bits.side_info_size(version_index, channel_mode)
-	blank_si = array.array('B', '\0'*si_size)
-	
-	def init_side_info(self, raw_data=None):
-		selfref = weakref.proxy(self)
-		chanlist = []
-		for c in range(chancount):
-			grans = tuple([ grclasses[c][g](selfref)
-					for g in range(grancount) ])
-			chanlist.append( chclasses[c](selfref, grans) )
-		
-		self.channels = tuple(chanlist)
-		if raw_data:
-			self.raw_data = raw_data
-		else:
-			self.raw_data = blank_si[:]
 	
 	clsname = clsprefix + 'SideInfo'
 	si_cls = SideInfoBase.__class__(clsname, (SideInfoBase,), {
-		'__slots__': ('channels', 'raw_data', '__weakref__'),
-		'__init__': init_side_info,
+		'__slots__': (),
+		'_channel_classes': tuple([ (chclasses[c], tuple(grclasses[c]))
+				for c in range(chancount) ]),
+		'_part2_3_getters': tuple([
+				bitfields.make_property('_raw', offset, 12).fget
+				for offset in offsets ]),
+		'_blank': array.array('B', '\0'*si_size),
 	})
 	
-	si_cls.main_data_begin = bitfields.make_property(
-			'raw_data', 0, 8 if lsf else 9)
+	si_cls.main_data_begin = _tracked(bitfields.make_property(
+			'_raw', 0, 8 if lsf else 9))
 	if lsf:
-		si_cls.private_bits = bitfields.make_property(
-				'raw_data', 8, 1 if mono else 2)
+		si_cls.private_bits = _tracked(bitfields.make_property(
+				'_raw', 8, 1 if mono else 2))
 	else:
-		si_cls.private_bits = bitfields.make_property(
-				'raw_data', 9, 5 if mono else 3)
+		si_cls.private_bits = _tracked(bitfields.make_property(
+				'_raw', 9, 5 if mono else 3))
 	
 	return si_cls
 
-_si_classes = ( (_make_si_class(0,0), _make_si_class(0,1)),
-		(_make_si_class(1,0), _make_si_class(1,1)) )
+# the classes are only built when first used, keyed by (lsf, mono)
+_si_classes = {}
 
 
 def SideInfo(version_index, channel_mode, raw_data=None):
@@ -283,6 +359,8 @@ Return an object representing MPEG layer 3 side info, based on the given
 parameters. The class of the object varies based on the MPEG version and
 channel mode (only applicable fields are present, and field sizes vary)."""
 	
-	lsf = (version_index != 3)
-	mono = (channel_mode == 3)
-	return _si_classes[lsf][mono](raw_data)
+	key = ((version_index != 3), (channel_mode == 3))
+	cls = _si_classes.get(key)
+	if cls is None:
+		cls = _si_classes[key] = _make_si_class(*key)
+	return cls(raw_data)
@@ -0,0 +1,335 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Decoding of many layer 3 side info blocks at once.  Rather than creating a
+SideInfo object for each frame and reading each field through a property,
+every field of every block is extracted into arrays in a single pass; with
+vectorized operations if NumPy is installed.  Field positions are taken from
+side_info.granule_fields and mp3bits.side_info_bit_offsets, so they always
+match the SideInfo classes."""
+
+from __future__ import division, absolute_import
+import array
+import binascii
+from . import mp3bits, side_info, errors
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+# per-frame fields, and the number of values for each per-granule field
+frame_fields = ('main_data_begin', 'private_bits')
+granule_fields = (
+	('part2_3_length', 1),
+	('big_values', 1),
+	('global_gain', 1),
+	('scalefac_compress', 1),
+	('blocksplit_flag', 1),
+	('table_select', 3),
+	('region_address1', 1),
+	('region_address2', 1),
+	('block_type', 1),
+	('switch_point', 1),
+	('subblock_gain', 3),
+	('preflag', 1),
+	('scalefac_scale', 1),
+	('count1table_select', 1),
+)
+
+
+class _Layout(object):
+	# Absolute bit positions of every field, for one side info layout.
+	
+	def __init__(self, version_index, channel_mode):
+		lsf = (version_index != 3)
+		mono = (channel_mode == 3)
+		self.size = mp3bits.side_info_size(version_index, channel_mode)
+		self.granules = 1 if lsf else 2
+		self.channels = 1 if mono else 2
+		
+		mdb_bits = 8 if lsf else 9
+		if lsf:
+			private_bits = 1 if mono else 2
+		else:
+			private_bits = 5 if mono else 3
+		self.frame_fields = (
+			('main_data_begin', 0, mdb_bits),
+			('private_bits', mdb_bits, private_bits),
+		)
+		
+		# one entry per granule/channel pair, in (granule, channel) order:
+		#   (blocksplit_flag offset, fields)
+		# where fields has (name, offset, bits, count, flag) items
+		fields = side_info.granule_fields(lsf)
+		self.blocks = []
+		for gran_offset in mp3bits.side_info_bit_offsets(
+				version_index, channel_mode):
+			gfields = [ (name, gran_offset + pos, bits, count, flag)
+					for (name, pos, bits, count, flag) in fields ]
+			bs_offset = [ pos for (name, pos, bits, count, flag)
+					in gfields if name == 'blocksplit_flag' ][0]
+			self.blocks.append( (bs_offset, gfields) )
+
+_layouts = {}
+def _get_layout(version_index, channel_mode):
+	key = ((version_index != 3), (channel_mode == 3))
+	layout = _layouts.get(key)
+	if layout is None:
+		layout = _layouts[key] = _Layout(version_index, channel_mode)
+	return layout
+
+
+def decode(version_index, channel_mode, blocks):
+	"""decode(version_index, channel_mode, blocks) -> dict
+
+Decode a sequence of raw side info blocks (byte arrays or strings), which
+must all have the layout given by version_index and channel_mode.
+
+Return a dictionary mapping each name in frame_fields and granule_fields to
+an array.  If NumPy is installed, these are NumPy arrays with the shape
+(frames,) for frame fields, or (frames, granules, channels[, count]) for
+granule fields.  Otherwise they're flat array.array objects with the values
+in the same order.  Fields that aren't present for a granule's
+blocksplit_flag value (or preflag, for MPEG 2/2.5) are 0; table_select has
+a third value of 0 when blocksplit_flag is set."""
+	
+	layout = _get_layout(version_index, channel_mode)
+	blocks = [ _tostring(b) for b in blocks ]
+	for b in blocks:
+		if len(b) != layout.size:
+			raise errors.MP3UsageError("side info is the wrong length")
+	
+	if numpy is not None:
+		mat = numpy.frombuffer(''.join(blocks), dtype=numpy.uint8)
+		return _decode_numpy(layout, mat.reshape((len(blocks), layout.size)))
+	else:
+		return _decode_python(layout, blocks)
+
+
+def decode_frames(data, positions):
+	"""decode_frames(data, positions) -> dict
+
+Decode the side info of the frames at the given byte positions in 'data'
+(a string, byte array, or mmap holding an MPEG audio file), such as the
+positions returned by fastscan.find_frames.  All frames must be layer 3
+frames with the same MPEG version and mono/stereo layout.  The return value
+is the same as for decode()."""
+	
+	if numpy is not None:
+		buf = numpy.frombuffer(data, dtype=numpy.uint8)
+		pos = numpy.asarray(positions, dtype=numpy.int64)
+		b1 = buf[pos + 1]
+		b3 = buf[pos + 3]
+		if len(pos):
+			(version_index, channel_mode) = _check_headers(
+					numpy.unique(b1 & 0x1e).tolist(),
+					numpy.unique(b3 >> 6).tolist())
+		else:
+			(version_index, channel_mode) = (3, 0)
+		
+		layout = _get_layout(version_index, channel_mode)
+		start = pos + 4 + 2 * (1 - (b1 & 1))
+		index = start[:,None] + numpy.arange(layout.size)
+		return _decode_numpy(layout, buf[index])
+	
+	blocks = []
+	b1_values = set()
+	b3_values = set()
+	for pos in positions:
+		b1 = _byte(data, pos + 1)
+		b1_values.add(b1 & 0x1e)
+		b3_values.add(_byte(data, pos + 3) >> 6)
+		
+		start = pos + 4 + 2 * (1 - (b1 & 1))
+		blocks.append( data[start:start+32] )
+	
+	if blocks:
+		(version_index, channel_mode) = _check_headers(b1_values, b3_values)
+	else:
+		(version_index, channel_mode) = (3, 0)
+	
+	layout = _get_layout(version_index, channel_mode)
+	blocks = [ _tostring(b)[:layout.size] for b in blocks ]
+	return _decode_python(layout, blocks)
+
+
+def _check_headers(b1_values, channel_modes):
+	# b1_values has the version and layer bits of header byte 1
+	b1_values = list(b1_values)
+	if len(b1_values) != 1:
+		raise errors.MP3UsageError("frames have different MPEG versions"
+				" or layers")
+	
+	version_index = (b1_values[0] >> 3) & 3
+	layer_index = (b1_values[0] >> 1) & 3
+	if layer_index != 1:
+		raise errors.MP3UsageError("side info is only present in layer 3")
+	
+	mono = [ (mode == 3) for mode in channel_modes ]
+	if len(set(mono)) != 1:
+		raise errors.MP3UsageError("frames mix mono and stereo modes")
+	
+	return (version_index, 3 if mono[0] else 0)
+
+
+def _byte(data, pos):
+	val = data[pos]
+	return ord(val) if isinstance(val, str) else val
+
+
+def _tostring(block):
+	if isinstance(block, str):
+		return block
+	elif isinstance(block, array.array):
+		return block.tostring()
+	else:
+		return str(block)
+
+
+def _decode_python(layout, blocks):
+	total_bits = layout.size * 8
+	
+	def extract(offset, bits):
+		return (total_bits - offset - bits, (1 << bits) - 1)
+	
+	frame_ops = [ (name,) + extract(offset, bits)
+			for (name, offset, bits) in layout.frame_fields ]
+	
+	# for each granule: (blocksplit shift, ops for flag 0, ops for flag 1)
+	# where each op is (name, shift, mask, bits, count, fill)
+	gran_ops = []
+	for (bs_offset, fields) in layout.blocks:
+		ops = ([], [])
+		present = (set(), set())
+		for (name, offset, bits, count, flag) in fields:
+			(shift, mask) = extract(offset, bits * count)
+			for f in (0, 1):
+				if flag is None or flag == f:
+					ops[f].append( (name, shift, mask, bits, count) )
+					present[f].add(name)
+		
+		# zero-fill the missing fields and values
+		for f in (0, 1):
+			new_ops = []
+			for (name, shift, mask, bits, count) in ops[f]:
+				fill = dict(granule_fields)[name] - count
+				new_ops.append( (name, shift, mask, bits, count, fill) )
+			for (name, count) in granule_fields:
+				if name not in present[f]:
+					new_ops.append( (name, 0, 0, 0, 0, count) )
+			ops[f][:] = new_ops
+		
+		gran_ops.append( (total_bits - bs_offset - 1,) + ops )
+	
+	out = {}
+	for name in frame_fields:
+		out[name] = array.array('H')
+	for (name, count) in granule_fields:
+		out[name] = array.array('H')
+	
+	frame_ops = [ (out[name].append, shift, mask)
+			for (name, shift, mask) in frame_ops ]
+	gran_ops = [ (bs_shift,
+				[ (out[name], shift, mask, bits, count, fill)
+					for (name, shift, mask, bits, count, fill) in ops0 ],
+				[ (out[name], shift, mask, bits, count, fill)
+					for (name, shift, mask, bits, count, fill) in ops1 ])
+			for (bs_shift, ops0, ops1) in gran_ops ]
+	
+	hexlify = binascii.hexlify
+	for block in blocks:
+		val = int(hexlify(block), 16)
+		for (append, shift, mask) in frame_ops:
+			append((val >> shift) & mask)
+		
+		for (bs_shift, ops0, ops1) in gran_ops:
+			ops = ops1 if ((val >> bs_shift) & 1) else ops0
+			for (arr, shift, mask, bits, count, fill) in ops:
+				if count == 1:
+					arr.append((val >> shift) & mask)
+				elif count:
+					field = (val >> shift) & mask
+					vmask = (1 << bits) - 1
+					for sh in range(bits * (count - 1), -1, -bits):
+						arr.append((field >> sh) & vmask)
+				
+				if fill:
+					arr.extend([0] * fill)
+	
+	return out
+
+
+def _np_bits(mat, offset, bits):
+	# extract a field of up to 25 bits from each row
+	first = offset // 8
+	last = (offset + bits - 1) // 8
+	val = numpy.zeros(len(mat), dtype=numpy.uint32)
+	for b in range(first, last + 1):
+		val = (val << 8) | mat[:, b]
+	
+	shift = (last + 1) * 8 - (offset + bits)
+	return (val >> shift) & ((1 << bits) - 1)
+
+
+def _decode_numpy(layout, mat):
+	n = len(mat)
+	ngr = layout.granules
+	nch = layout.channels
+	
+	out = {}
+	for (name, offset, bits) in layout.frame_fields:
+		out[name] = _np_bits(mat, offset, bits).astype(numpy.uint16)
+	
+	for (name, count) in granule_fields:
+		shape = (n, ngr, nch) if (count == 1) else (n, ngr, nch, count)
+		out[name] = numpy.zeros(shape, dtype=numpy.uint16)
+	
+	i = 0
+	for g in range(ngr):
+		for c in range(nch):
+			(bs_offset, fields) = layout.blocks[i]
+			i += 1
+			
+			blocksplit = _np_bits(mat, bs_offset, 1)
+			for (name, offset, bits, count, flag) in fields:
+				if flag is None:
+					present = None
+				else:
+					present = (blocksplit == flag)
+				
+				dest = out[name]
+				for k in range(count):
+					val = _np_bits(mat, offset + k * bits, bits)
+					if count == 1:
+						target = (slice(None), g, c)
+					else:
+						target = (slice(None), g, c, k)
+					
+					if present is None:
+						dest[target] = val
+					else:
+						dest[target] = numpy.where(present, val,
+								dest[target])
+	
+	return out
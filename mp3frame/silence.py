@@ -0,0 +1,151 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""\
+Detection of silent or near-silent passages in layer 3 files, using only the
+side info.  A granule that needs very few main data bits and has few
+non-zero spectral values can't contain much sound, so no decoding is needed;
+with NumPy, a whole file is classified with a few array operations."""
+
+from __future__ import division, absolute_import
+from . import mp3bits, side_info_batch, fastscan
+from .cut import read_frames
+from .side_info_batch import _byte
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+def silent_granules(fields, channels, max_part2_3_length=200,
+		max_big_values=16, max_global_gain=None):
+	"""silent_granules(fields, channels, max_part2_3_length=200,
+                max_big_values=16, max_global_gain=None) -> array
+
+Classify the granules described by 'fields' (as returned by
+side_info_batch.decode or decode_frames, for frames with the given number
+of channels) as silent or active.  A granule is silent if, in every
+channel, part2_3_length, big_values and global_gain are no greater than the
+given maximums; a maximum of None disables that test.  The defaults are
+meant for typical encoders (digital silence has part2_3_length and
+big_values of 0).
+
+Returns a flat boolean array with one value per granule, in stream order:
+a NumPy array if NumPy is installed, otherwise a list."""
+	
+	tests = [ (name, limit) for (name, limit) in (
+			('part2_3_length', max_part2_3_length),
+			('big_values', max_big_values),
+			('global_gain', max_global_gain)) if limit is not None ]
+	
+	if numpy is not None:
+		shape = fields['part2_3_length'].shape
+		silent = numpy.ones(shape[0] * shape[1], dtype=bool)
+		for (name, limit) in tests:
+			values = fields[name].reshape((-1, shape[2]))
+			silent &= (values <= limit).all(axis=1)
+		return silent
+	
+	# the flat arrays are in (frame, granule, channel) order
+	silent = [True] * len(fields['part2_3_length'])
+	for (name, limit) in tests:
+		values = fields[name]
+		for i in xrange(len(values)):
+			if values[i] > limit:
+				silent[i] = False
+	
+	if channels == 2:
+		silent = [ (a and b) for (a, b) in zip(silent[0::2], silent[1::2]) ]
+	return silent
+
+
+def silent_ranges(silent, granule_duration, min_duration=0.5):
+	"""silent_ranges(silent, granule_duration, min_duration=0.5) -> list
+
+Return the runs of silent granules (from silent_granules) that last at
+least 'min_duration' seconds, as a list of (start, end) times in seconds
+from the first granule."""
+	
+	# find the granule indexes where the silent flag changes
+	if numpy is not None:
+		flags = numpy.concatenate(([False], numpy.asarray(silent, dtype=bool),
+				[False])).astype(numpy.int8)
+		edges = numpy.flatnonzero(numpy.diff(flags)).tolist()
+	else:
+		edges = []
+		prev = False
+		for (i, flag) in enumerate(silent):
+			if flag != prev:
+				edges.append(i)
+				prev = flag
+		if prev:
+			edges.append(len(silent))
+	
+	min_granules = min_duration / granule_duration
+	ret = []
+	for (start, end) in zip(edges[0::2], edges[1::2]):
+		if end - start >= min_granules:
+			ret.append( (start * granule_duration, end * granule_duration) )
+	return ret
+
+
+def find_silence(data, positions=None, min_duration=0.5, **thresholds):
+	"""find_silence(data, positions=None, min_duration=0.5, ...) -> list
+
+Return the silent passages of at least 'min_duration' seconds in a layer 3
+file held in memory (a string, byte array or mmap), as a list of (start,
+end) times in seconds.  'positions' lists the frame positions; if it's not
+given, fastscan.find_frames is used.  A VBR header frame at the start is
+skipped, and times are measured from the first audio frame.  Any other
+keyword arguments are thresholds for silent_granules.
+
+All frames must have the same MPEG version and number of channels (see
+side_info_batch.decode_frames)."""
+	
+	if positions is None:
+		positions = fastscan.find_frames(data)[0]
+	if not len(positions):
+		return []
+	
+	# the first frame ends by the start of the next one (or the end of the
+	# data), which is all read_frames needs to know
+	end = positions[1] if len(positions) > 1 else len(data)
+	first = read_frames(data, positions, [end - positions[0]], 0, 1)[0]
+	if first.header.layer_index == 1 and first.identify_vbr_header():
+		positions = positions[1:]
+		if not len(positions):
+			return []
+	
+	h1 = _byte(data, positions[0] + 1)
+	h2 = _byte(data, positions[0] + 2)
+	h3 = _byte(data, positions[0] + 3)
+	version_index = (h1 >> 3) & 3
+	samplerate = mp3bits.samplerate(version_index, (h2 >> 2) & 3)
+	channels = 1 if ((h3 >> 6) == 3) else 2
+	
+	fields = side_info_batch.decode_frames(data, positions)
+	silent = silent_granules(fields, channels, **thresholds)
+	
+	# every layer 3 granule has 576 samples
+	return silent_ranges(silent, 576 / samplerate, min_duration)
+
@@ -20,11 +20,19 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 from __future__ import division, absolute_import
-import struct
 import array
+import re
 from . import mp3bits, mp3ext, frames, side_info, errors
 
 
+# An empty buffer shared by all idle syncs.  It must never be modified;
+# fromfile and fromstring replace it with a private array before adding data.
+_empty_data = array.array('B')
+
+# The values accepted for PhysicalFrameSync.crc_policy.
+crc_policies = ('flag', 'drop', 'quarantine')
+
+
 class BaseSync(object):
 	"""BaseSync() -> object
 
@@ -32,8 +40,11 @@ Return an object that can store raw data from an MPEG audio file, identify
 syncwords and tags within this data, and search for syncwords.
 PhysicalFrameSync would normally be used instead."""
 	
+	__slots__ = ('data', 'bytes_returned', 'read_eof', 'sync_skip',
+			'sync_header', 'sync_mask')
+	
 	def __init__(self):
-		self.data = array.array('B')
+		self.data = _empty_data
 		self.bytes_returned = 0
 		
 		# set to True when we see the EOF
@@ -64,12 +75,41 @@ Reads some data from the given file into the internal buffer."""
 		if self.read_eof:
 			raise errors.MP3UsageError('tried to write data after EOF')
 		
+		if self.data is _empty_data:
+			self.data = array.array('B')
+		
 		try:
 			self.data.fromfile(file, bytes)
 		except EOFError:
 			# any data read before EOF will have been added
 			self.read_eof = True
 	
+	def fromstring(self, data):
+		"""fromstring(data) -> None
+
+Appends the given string or byte array to the internal buffer.  This is the
+counterpart of fromfile for data that arrives from a non-blocking source."""
+		
+		if self.read_eof:
+			raise errors.MP3UsageError('tried to write data after EOF')
+		
+		if self.data is _empty_data:
+			self.data = array.array('B')
+		
+		if isinstance(data, array.array):
+			self.data.extend(data)
+		elif isinstance(data, bytearray):
+			self.data.fromstring(str(data))
+		else:
+			self.data.fromstring(data)
+	
+	def set_eof(self):
+		"""set_eof() -> None
+
+Indicates that no more data will be added to the buffer.  fromfile calls
+this automatically; it's needed when data is added via fromstring."""
+		self.read_eof = True
+	
 	def _is_sync(self, pos=0, sync_header=None, sync_mask=None):
 		d = self.data
 		head = ( (d[pos] << 24) | (d[pos+1] << 16)
@@ -77,7 +117,7 @@ Reads some data from the given file into the internal buffer."""
 		
 		masked_head = (head & (sync_mask or self.sync_mask))
 		return masked_head == (sync_header or self.sync_header)
-		
+	
 	def resync(self, offset=0, header=None, mask=None):
 		"""resync(offset=0[, header, mask]) -> int
 
@@ -103,13 +143,13 @@ Returns the sync position (as a buffer offset), or -1."""
 			
 			if pos + 4 > len(d):
 				# too close to the end to check for sync
-				self.sync_skip += pos
+				self.sync_skip = pos
 				return -1
 			elif self._is_sync(pos, header, mask):
-				self.sync_skip += pos
+				self.sync_skip = pos
 				return self.sync_skip
 			
-			self.sync_skip += pos + 1
+			self.sync_skip = pos + 1
 			offset = self.sync_skip
 	
 	def identify(self):
@@ -163,8 +203,21 @@ Discards the specified number of bytes from the front of the buffer."""
 			raise errors.MP3UsageError("invalid byte count")
 		
 		self.bytes_returned += bytes
-		self.data = self.data[bytes:]
+		if bytes == len(self.data):
+			self.data = _empty_data
+		else:
+			self.data = self.data[bytes:]
 		self.sync_skip = max(0, self.sync_skip - bytes)
+	
+	def release(self):
+		"""release() -> None
+
+Free the internal buffer if it's empty.  A buffer that held data is only
+released when the data is consumed by advance(), so this is only useful
+after the buffer has been replaced or cleared by other means."""
+		
+		if not len(self.data):
+			self.data = _empty_data
 
 
 
@@ -174,6 +227,13 @@ class PhysicalFrameSync(BaseSync):
 Return an object that will interpret the various types of data found in an
 MPEG audio file and construct objects for examining them."""
 	
+	__slots__ = ('synced', 'frames_returned', 'base_framesize',
+			'reuse_side_info', '_side_info_views', 'verify_crc',
+			'_crc_policy', 'crc_valid', 'crc_invalid', 'crc_unchecked',
+			'max_free_size', 'free_confirm', '_free_sizes', '_free_learned',
+			'_free_search', '_free_check', 'confirm_frames', '_locked',
+			'_confirmed')
+	
 	def __init__(self):
 		BaseSync.__init__(self)
 		self.synced = True
@@ -184,7 +244,52 @@ MPEG audio file and construct objects for examining them."""
 		# means this will be autodetected; a value of 0 will disable this
 		# behaviour (and force frame sizes to be calculated by searching for
 		# the next syncword).
+		#
+		# Autodetection searches for the next syncword until free_confirm
+		# consecutive frames have the same size.  After that, frames are
+		# returned as soon as their data is available, and the size is
+		# learned again if a frame is followed by garbage.  A search gives
+		# up (treating the frame as garbage) if no syncword is found within
+		# max_free_size bytes.
 		self.base_framesize = -1
+		self.max_free_size = 16384
+		self.free_confirm = 3
+		self._free_sizes = []
+		self._free_learned = False
+		self._free_search = 0
+		self._free_check = False
+		
+		# If reuse_side_info is True, a single SideInfo object (per layout)
+		# is rebound to the side info of each frame, instead of creating a
+		# new one; a frame's side_info is then only valid until the next
+		# frame is read.
+		self.reuse_side_info = False
+		self._side_info_views = None
+		
+		# If verify_crc is True, the CRC of each protected frame is checked
+		# as it's read, and frame.crc_ok is set to the result. crc_policy
+		# determines what happens to frames that fail the check:
+		#   'flag' - return them normally (as 'frame' items)
+		#   'drop' - return their data as 'garbage'
+		#   'quarantine' - return them as 'badframe' items
+		# Setting any other value raises MP3UsageError.
+		# The counters are updated for every frame while verify_crc is set.
+		# Checking costs a few microseconds per frame (see bench/crcverify).
+		self.verify_crc = False
+		self.crc_policy = 'flag'
+		self.crc_valid = 0
+		self.crc_invalid = 0
+		self.crc_unchecked = 0  # unprotected, or protected data size unknown
+		
+		# If confirm_frames is nonzero, a syncword found at the start of the
+		# stream or after garbage is only accepted if the following
+		# confirm_frames headers are where its frame size says they should
+		# be, and have the same MPEG version, layer and samplerate (a tag
+		# or the end of the file also ends the check).  This avoids
+		# returning bogus frames from album art or damaged data.
+		self.confirm_frames = 0
+		self._locked = False
+		self._confirmed = -1  # a stream position that passed the check
 	
 	def readitem(self):
 		"""readitem() -> None or 2-tuple
@@ -194,10 +299,15 @@ Return value:
    None - need more data
    ('frame', MP3Frame)
    ('tag', CommentTag)
-   ('garbage', array) - unidentifiable bytes"""
+   ('garbage', array) - unidentifiable bytes
+   ('badframe', MP3Frame) - a frame that failed the CRC check (only returned
+                            if verify_crc is set and crc_policy is
+                            'quarantine')"""
 		
 		d = self.data
-		if len(d) < 4:
+		if len(d) < 4 and not (self.read_eof and d):
+			# (at the end of the stream, identify reports the last few
+			# bytes as garbage)
 			return None
 		
 		ident = self.identify()
@@ -205,6 +315,25 @@ Return value:
 			return None
 		
 		dtype = ident[0]
+		if self._free_check:
+			# the last frame was a free-format frame whose size was assumed
+			self._free_check = False
+			if dtype == 'garbage':
+				self._relearn_free()
+		
+		if dtype == 'sync':
+			if self.confirm_frames and not self._locked \
+					and self._confirmed != self.bytes_returned:
+				ok = self._check_sync(0, self.confirm_frames)
+				if ok is None:
+					return None
+				elif not ok:
+					(dtype, ident) = ('garbage', ('garbage', 1))
+		
+		if dtype == 'garbage':
+			# include everything up to the next usable syncword
+			ident = ('garbage', self._garbage_size(ident[1]))
+		
 		if dtype != 'sync':
 			self.synced = (dtype != 'garbage')
 			
@@ -212,6 +341,9 @@ Return value:
 			if len(d) < size:
 				return None
 			
+			if dtype == 'garbage':
+				self._locked = False
+			
 			data = d[:size]
 			self.advance(size)
 			
@@ -232,14 +364,197 @@ Return value:
 				size = len(d)
 			else:
 				assert fr == 'resync'
-				size = 1
+				size = self._garbage_size(1)
 			
 			self.synced = False
+			self._locked = False
 			ret = d[:size]
 			self.advance(size)
 			return ('garbage', ret)
+		
+		if self.verify_crc and not self._check_crc(fr):
+			policy = self.crc_policy
+			if policy == 'drop':
+				# 'd' still refers to the data preceding the frame
+				self.frames_returned -= 1
+				return ('garbage', d[:len(fr)])
+			elif policy == 'quarantine':
+				return ('badframe', fr)
+		
+		self._locked = True
+		return ('frame', fr)
+	
+	def _set_crc_policy(self, policy):
+		if policy not in crc_policies:
+			raise errors.MP3UsageError('invalid crc_policy %r' % (policy,))
+		self._crc_policy = policy
+	crc_policy = property(lambda s: s._crc_policy, _set_crc_policy)
+	
+	def _check_sync(self, pos, count):
+		# Check whether the syncword at 'pos' could start a frame, and
+		# whether the next 'count' headers are consistent with it. Returns
+		# True, False, or None if more data is needed.
+		d = self.data
+		sizes = mp3bits.header_size_table()
+		
+		h1 = d[pos+1]
+		h2 = d[pos+2]
+		size = sizes[(((h1 >> 1) & 0xf) << 7) | (h2 >> 1)]
+		if size < 0:
+			if count:
+				return self._check_free_sync(pos, count)
+			return True  # checked by _create_frame
+		
+		for i in range(count):
+			if not size:
+				return False
+			
+			pos += size
+			if pos + 4 > len(d):
+				return True if self.read_eof else None
+			
+			if d[pos] != 0xff:
+				return d[pos:pos+3].tostring() in ('TAG', 'ID3', 'APE', 'LYR')
+			elif (d[pos+1] & 0xfe) != (h1 & 0xfe) \
+					or (d[pos+2] & 0x0c) != (h2 & 0x0c):
+				return False
+			size = max(0, sizes[(((h1 >> 1) & 0xf) << 7) | (d[pos+2] >> 1)])
+		
+		return (size != 0)
+	
+	def _check_free_sync(self, pos, count):
+		# Like _check_sync, for a free-format frame: the next 'count' frames
+		# with the same format must all have the same (unpadded) size.
+		d = self.data
+		pattern = self._free_pattern(pos)
+		slot = mp3bits.sample_size((d[pos+1] >> 1) & 3)
+		
+		base = None
+		for i in range(count):
+			# frames can't be larger than max_free_size
+			m = pattern.search(d, pos + 4, pos + self.max_free_size + 3)
+			if not m:
+				if len(d) - pos >= self.max_free_size + 4:
+					return False
+				elif self.read_eof:
+					return True
+				return None
+			
+			size = m.start() - pos - ((d[pos+2] >> 1) & 1) * slot
+			if base is None:
+				base = size
+			elif size != base:
+				return False
+			pos = m.start()
+		
+		return True
+	
+	def _garbage_size(self, start):
+		# Return the number of garbage bytes at the start of the buffer
+		# (at least 'start'), by searching for a syncword that passes
+		# _check_sync.  Garbage is returned as one item rather than stopping
+		# at every false syncword.
+		d = self.data
+		count = self.confirm_frames
+		pos = start
+		while 1:
+			pos = self.resync(pos)
+			if pos < 0:
+				if self.read_eof:
+					return len(d)
+				return max(start, self.sync_skip)
+			
+			ok = self._check_sync(pos, count)
+			if ok is None:
+				return pos
+			elif ok:
+				if count:
+					self._confirmed = self.bytes_returned + pos
+				return pos
+			pos += 1
+	
+	def _check_crc(self, fr):
+		# Set fr.crc_ok and update the counters; returns False only if the
+		# CRC is known to be wrong.
+		if fr.crc16 is None:
+			ok = None
 		else:
-			return ('frame', fr)
+			try:
+				ok = (fr.calc_crc() == fr.crc16)
+			except NotImplementedError:
+				ok = None
+		
+		fr.crc_ok = ok
+		if ok:
+			self.crc_valid += 1
+		elif ok is None:
+			self.crc_unchecked += 1
+		else:
+			self.crc_invalid += 1
+			return False
+		return True
+	
+	def _reused_side_info(self, head, raw_si):
+		views = self._side_info_views
+		if views is None:
+			views = self._side_info_views = {}
+		
+		key = ((head.version_index != 3), (head.channel_mode == 3))
+		si_obj = views.get(key)
+		if si_obj is None:
+			si_obj = views[key] = side_info.SideInfo(head.version_index,
+					head.channel_mode, raw_si)
+		else:
+			si_obj.raw_data = raw_si
+		return si_obj
+	
+	def _relearn_free(self):
+		# forget an autodetected free-format frame size
+		if self._free_learned:
+			self.base_framesize = -1
+			self._free_learned = False
+		self._free_sizes = []
+	
+	def _free_pattern(self, pos):
+		# Return a regular expression matching the headers of frames with
+		# the same format as the free-format frame at 'pos'.
+		d = self.data
+		return re.compile(re.escape(chr(0xff) + chr(d[pos+1]))
+				+ '[%s-%s]' % (re.escape(chr(d[pos+2] & 0xfc)),
+				re.escape(chr(d[pos+2] | 3))))
+	
+	def _find_free_end(self, offset):
+		# Search for the next frame with the same MPEG version, layer,
+		# protection_bit, bitrate (free format), and samplerate as the frame
+		# at the start of the buffer, no more than max_free_size bytes away.
+		# This doesn't use or change sync_skip.
+		# Returns the position or -1; if not found, the search will resume
+		# from the same point on the next call.
+		d = self.data
+		offset = max(offset, self._free_search - self.bytes_returned)
+		
+		# only a match within max_free_size bytes counts, so the result
+		# doesn't depend on how much data is buffered
+		m = self._free_pattern(0).search(d, offset, self.max_free_size + 3)
+		if m:
+			self._free_search = 0
+			return m.start()
+		
+		# a partial header may be at the end of the buffer
+		self._free_search = self.bytes_returned + max(offset, len(d) - 2)
+		return -1
+	
+	def _learn_free(self, size):
+		# record the size of a free-format frame found by searching
+		sizes = self._free_sizes
+		if sizes and sizes[-1] != size:
+			del sizes[:]
+		sizes.append(size)
+		
+		if len(sizes) >= self.free_confirm and self.base_framesize < 0:
+			self.base_framesize = size
+			self._free_learned = True
+			del sizes[:]
 	
 	# Assume there's a frame at the start of self.data, and return it.
 	# Returns an MP3Frame instance, 'resync', or 'moredata'
@@ -271,19 +586,25 @@ Return value:
 		
 		if sidesz:
 			raw_si = d[headsz:headsz+sidesz]
-			si_obj = side_info.SideInfo(head.version_index,
-					head.channel_mode, raw_si)
+			if self.reuse_side_info:
+				si_obj = self._reused_side_info(head, raw_si)
+			else:
+				si_obj = side_info.SideInfo(head.version_index,
+						head.channel_mode, raw_si)
 		else:
 			raw_si = None
 			si_obj = None
 		
-		if not sz and self.base_framesize:
+		padding = head.padded and head.sample_size
+		if not sz and self.base_framesize > 0:
 			# this is a free-format frame; all such frames need to be the
 			# same size within a file (except for padding), and we have an
 			# expected size
-			sz = self.base_framesize
-			if head.padding:
-				sz += head.sample_size
+			sz = self.base_framesize + padding
+			
+			# the frame is returned as soon as it's complete; if the next
+			# item is garbage, the size will be learned again
+			self._free_check = True
 		
 		if not sz:
 			# this is a free-format frame; we don't know the expected size,
@@ -296,35 +617,30 @@ Return value:
 				# so skip all data until that point
 				offset += max(0, si_obj.part2_3_end)
 			
-			# search for another syncword with the same MPEG version, layer,
-			# protection_bit, bitrate (free format), and samplerate
-			sync_header = (0xff << 24) | (d[1] << 16) | (d[2] << 8)
-			sz = self.resync(offset, sync_header, 0xfffffc00)
+			sz = self._find_free_end(offset)
 			if sz == -1:
-				if len(d) >= 8192:
+				if len(d) >= self.max_free_size + 4:
 					# we should have enough data to locate another syncword;
 					# assume this 'free-format frame' was just garbage
-					self.sync_skip = 0
+					self._free_search = 0
 					return 'resync'
 				elif not self.read_eof:
 					return 'moredata'
 				
 				# we won't be getting more data, so return everything
 				# until EOF -- excluding the id3v1 tag, if present
+				self._free_search = 0
 				sz = len(d)
 				if sz > 128:
 					tagsz = mp3ext.id3v1_size(d[-128:], True)
 					if tagsz > 0:
 						sz -= tagsz
+			elif self.base_framesize < 0:
+				# found a syncword; now that the frame size is known,
+				# store it for future use
+				self._learn_free(sz - padding)
 			
-			# found a syncword; now that the frame size is known,
-			# store it for future use
 			assert sz >= offset
-			if self.base_framesize < 0:
-				base_sz = sz
-				if head.padding:
-					base_sz -= head.sample_size
-				self.base_framesize = base_sz
 		
 		assert sz > 0
 		if len(d) < sz:
@@ -342,6 +658,8 @@ Return value:
 			fr.crc16 = (d[4] << 8) | d[5]
 		else:
 			fr.crc16 = None
+		fr.crc_ok = None
+		fr.body_modified = False
 		
 		fr.resynced = not self.synced
 		fr.frame_number = self.frames_returned
@@ -360,7 +678,9 @@ class FileSyncWrapper(object):
 Return a wrapper that can be used to conveniently access a PhysicalFrameSync
 or LogicalFrameSync instance; data will be automatically fed into this object
 from the specified file as required."""
-
+	
+	__slots__ = ('file', 'sync', 'max_buffer')
+	
 	def __init__(self, sync, file):
 		self.file = file
 		self.sync = sync
@@ -373,7 +693,7 @@ from the specified file as required."""
 Call sync.readitem() and return the result if it's not None.
 Otherwise, feed the sync some data from the file and retry.
 Returns None only at the end of the file."""
-
+		
 		while not self.sync.done:
 			rv = self.sync.readitem()
 			if rv is None:
@@ -424,85 +744,428 @@ Return a generator that repeatedly calls readframe.  This can be used as:
 
 
 
+class StreamSyncWrapper(object):
+	"""StreamSyncWrapper(sync) -> object
+
+Return a wrapper that can be used to access a PhysicalFrameSync or
+LogicalFrameSync instance when data arrives from a non-blocking source
+(a socket, a pipe, or an event loop's stream reader).  Data is pushed in
+with feed() as it arrives, and readitem(), items() and frames() return
+whatever can be parsed without waiting.
+
+The wrapper never blocks or reads anything itself, so a single thread or
+event loop can drive any number of streams.  A caller should stop reading
+from its source while 'wants_data' is False; this is the equivalent of
+FileSyncWrapper's max_buffer limit."""
+	
+	__slots__ = ('sync', 'max_buffer')
+	
+	def __init__(self, sync):
+		self.sync = sync
+		self.max_buffer = 4*1024*1024
+	
+	done = property(lambda s: s.sync.done,
+			doc="True if the EOF was fed and all items have been read.")
+	
+	wants_data = property(
+			lambda s: (not s.sync.read_eof)
+				and len(s.sync.data) < s.max_buffer,
+			doc="True if more data should be fed in.")
+	
+	
+	def feed(self, data):
+		"""feed(data) -> None
+
+Add a string or byte array to the sync buffer.  An empty string is
+treated as the EOF, matching the return value of a read at EOF."""
+		if data:
+			self.sync.fromstring(data)
+		else:
+			self.sync.set_eof()
+	
+	
+	def feed_eof(self):
+		"""feed_eof() -> None
+
+Indicate that the source has no more data."""
+		self.sync.set_eof()
+	
+	
+	def readitem(self):
+		"""readitem()
+
+Call sync.readitem() and return the result.  None is returned when more
+data must be fed in, or when 'done' is True."""
+		
+		rv = self.sync.readitem()
+		if rv is None and not self.sync.read_eof \
+				and len(self.sync.data) >= self.max_buffer:
+			raise errors.MP3ImplementationLimit(
+					'sync buffer reached maximum size')
+		
+		return rv
+	
+	
+	def readframe(self):
+		"""readframe()
+
+Like readitem, but skips anything that's not a frame."""
+		while 1:
+			rv = self.readitem()
+			if not rv:
+				return None
+			elif rv[0] == 'frame':
+				return rv[1]
+	
+	
+	def items(self):
+		"""items() -> generator
+
+Return a generator that yields every item that can be read from the data
+fed in so far.  It stops when more data is needed; e.g.:
+  wrapper.feed(data)
+  for (itemtype, item) in wrapper.items(): ..."""
+		while 1:
+			x = self.readitem()
+			if x is None: break
+			yield x
+	
+	
+	def frames(self):
+		"""frames() -> generator
+
+Like items(), but only yields frames."""
+		while 1:
+			x = self.readframe()
+			if x is None: break
+			yield x
+
+
+
+
+class LogicalBody(object):
+	"""LogicalBody(buf1, start1, len1, buf2, len2, start2=0) -> object
+
+A read-only view of a logical frame body that's split between two buffers:
+'len1' bytes of 'buf1' starting at 'start1' (data from the bit reservoir),
+followed by 'len2' bytes of 'buf2' starting at 'start2' (the frame's own
+body).  It
+supports len(), indexing and slicing (slices are returned as arrays), and
+the data can be copied out with tostring, toarray or copy_into.
+
+Views returned by LogicalFrameAssembler refer to its internal buffer, and
+are only valid until the next frame is assembled."""
+	
+	__slots__ = ('_buf1', '_start1', '_len1', '_buf2', '_start2', '_len2')
+	
+	def __init__(self, buf1, start1, len1, buf2, len2, start2=0):
+		self._buf1 = buf1
+		self._start1 = start1
+		self._len1 = len1
+		self._buf2 = buf2
+		self._start2 = start2
+		self._len2 = len2
+	
+	def __len__(self):
+		return self._len1 + self._len2
+	
+	def __getitem__(self, key):
+		if isinstance(key, slice):
+			return self.toarray()[key]
+		
+		size = self._len1 + self._len2
+		if key < 0:
+			key += size
+		if not (0 <= key < size):
+			raise IndexError('index out of range')
+		
+		if key < self._len1:
+			return self._buf1[self._start1 + key]
+		else:
+			return self._buf2[self._start2 + key - self._len1]
+	
+	def __repr__(self):
+		return 'LogicalBody(%d+%d bytes)' % (self._len1, self._len2)
+	
+	def _buffers(self):
+		ret = []
+		if self._len1:
+			ret.append(buffer(self._buf1, self._start1, self._len1))
+		if self._len2:
+			ret.append(buffer(self._buf2, self._start2, self._len2))
+		return ret
+	
+	def tostring(self):
+		"""tostring() -> str
+
+Return a copy of the data as a string."""
+		return ''.join([ str(b) for b in self._buffers() ])
+	
+	def toarray(self):
+		"""toarray() -> byte array
+
+Return a copy of the data as a byte array."""
+		ret = array.array('B')
+		for b in self._buffers():
+			ret.fromstring(b)
+		return ret
+	
+	def copy_into(self, target, offset=0):
+		"""copy_into(target, offset=0) -> int
+
+Copy the data into a bytearray (or byte array) starting at 'offset', and
+return the number of bytes copied.  The target must already be big enough;
+it won't be resized.  Copying into a bytearray avoids any temporary
+objects."""
+		
+		for b in self._buffers():
+			size = len(b)
+			if offset + size > len(target):
+				raise errors.MP3UsageError('target buffer is too small')
+			
+			if isinstance(target, array.array):
+				b = array.array('B', str(b))
+			target[offset:offset+size] = b
+			offset += size
+		
+		return len(self)
+
+
 class LogicalFrameAssembler(object):
-	__slots__ = ('reservoir', 'last_end', 'ancillary_skipped')
+	"""LogicalFrameAssembler() -> object
+
+Return an object that reconstructs logical frame bodies from a sequence of
+physical frames, by keeping track of the layer 3 bit reservoir.
+
+If return_views is set, frame_in returns LogicalBody views instead of
+arrays.  This avoids copying any data, but each view is only valid until
+the next call to frame_in.
+
+If collect_ancillary is set, the ancillary data found before each frame's
+main data (the bytes counted by ancillary_skipped) is copied and stored in
+'ancillary' as (frame_number, byte array), where frame_number identifies
+the frame whose main data the bytes follow.  'ancillary' is None when there
+are no such bytes.  Call end_ancillary at the end of the stream to get the
+data following the last frame's main data."""
+	
+	__slots__ = ('return_views', 'ancillary_skipped', 'length_errors',
+			'collect_ancillary', 'ancillary',
+			'_ring', '_total', '_fill', '_last_end', '_last_frame',
+			'_pending')
+	
+	# The reservoir is kept in a ring buffer that's twice the required size,
+	# with each byte stored twice (at positions i and i+_capacity), so any
+	# run of up to _capacity recent bytes is contiguous.  Positions are
+	# counted from the start of the stream: _total is the number of body
+	# bytes seen so far, _fill is the number of them that are available in
+	# the reservoir, and _last_end is where the last frame's main data
+	# ended.  The most recent body isn't copied into the ring until the next
+	# frame is processed, so views into the ring stay valid until then.
+	
+	# only the last 511 bytes (255 for MPEG 2/2.5) can be referenced by
+	# main_data_begin, so nothing else is kept
+	_capacity = 511
 	
 	def __init__(self):
-		self.reservoir = array.array('B')
-		self.last_end = 0
+		self.return_views = False
+		self.ancillary_skipped = 0
+		
+		# the number of frames whose main data extended past the end of the
+		# frame (these get a logical_body of None)
+		self.length_errors = 0
+		
+		self.collect_ancillary = False
+		self.ancillary = None
+		self._last_frame = None
+		
+		self._ring = bytearray(2 * self._capacity)
+		self._total = 0
+		self._fill = 0
+		self._last_end = 0
+		self._pending = None
+	
+	def _flush(self):
+		# copy the pending frame body into the ring buffer
+		body = self._pending
+		self._pending = None
+		
+		cap = self._capacity
+		ring = self._ring
+		n = len(body)
+		m = min(n, cap)
+		
+		idx = (self._total - m) % cap
+		data = buffer(body, n - m, m)
+		ring[idx:idx+m] = data
+		if idx + m > cap:
+			# wrapped around; the second half was written to the mirror
+			# region, so copy each half to its other position
+			k = cap - idx
+			ring[0:m-k] = buffer(body, n - m + k, m - k)
+			ring[idx+cap:2*cap] = buffer(body, n - m, k)
+		else:
+			ring[idx+cap:idx+cap+m] = data
+	
+	def _get_reservoir(self):
+		ret = array.array('B')
+		body = self._pending
+		if body is None:
+			pending = 0
+		else:
+			pending = min(len(body), self._fill)
+		
+		ring_len = self._fill - pending
+		if ring_len:
+			start = (self._total - self._fill) % self._capacity
+			ret.fromstring(buffer(self._ring, start, ring_len))
+		if pending:
+			ret.fromstring(buffer(body, len(body) - pending, pending))
+		return ret
+	
+	def _copy_range(self, start, end):
+		# Return a copy of the data between two stream positions, which must
+		# be in the ring buffer or the pending body.  This is called before
+		# the pending body is flushed, so the ring buffer ends where that
+		# body starts.
+		ret = array.array('B')
+		body = self._pending
+		body_start = self._total - (len(body) if body else 0)
+		
+		start = max(start, body_start - self._capacity)
+		if start < body_start:
+			size = min(end, body_start) - start
+			ret.fromstring(buffer(self._ring, start % self._capacity, size))
+		if end > body_start:
+			start = max(start, body_start)
+			ret.fromstring(buffer(body, start - body_start, end - start))
+		return ret
+	
+	def end_ancillary(self):
+		"""end_ancillary() -> (int, byte array) or None
+
+Return the data following the last frame's main data, in the same form as
+'ancillary', and mark it as used.  This is meant to be called at the end of
+a stream, since the data would otherwise be reported with the next frame."""
+		
+		if self._total <= self._last_end:
+			return None
+		
+		ret = (self._last_frame, self._copy_range(self._last_end, self._total))
+		self._last_end = self._total
+		return ret
+	
+	reservoir = property(_get_reservoir,
+			doc="A copy of the data currently in the bit reservoir.")
+	last_end = property(
+			lambda s: s._last_end - (s._total - s._fill),
+			doc="The position in 'reservoir' where the last frame's main"
+				" data ended (negative if that data was discarded).")
 	
 	def frame_in(self, fr):
 		"""frame_in(MP3Frame) -> byte array or None
 
 Update the bit reservoir based on the given frame, and return a byte array
-containing the frame's data.  Returns None if the frame references any data
-that's not available."""
+(or LogicalBody, if return_views is set) containing the frame's data.
+Returns None if the frame references any data that's not available."""
 		
 		raw_body = fr.raw_body
-		unused_reservoir = len(self.reservoir) - self.last_end
-		if fr.header.layer_index != 1:
+		layer3 = (fr.header.layer_index == 1)
+		begin = fr.side_info.main_data_begin if layer3 else 0
+		unused_reservoir = self._total - self._last_end
+		self.ancillary_skipped = unused_reservoir - begin
+		
+		if self.collect_ancillary:
+			self.ancillary = None
+			if self.ancillary_skipped > 0 and begin <= self._fill:
+				self.ancillary = (self._last_frame, self._copy_range(
+						self._last_end, self._total - begin))
+		
+		if self._pending is not None:
+			self._flush()
+		
+		if not layer3:
 			# layer 1/2 frames don't use a bit reservoir
-			self.ancillary_skipped = unused_reservoir
 			if unused_reservoir:
-				self.reservoir = self.reservoir[:0]
-				self.last_end = 0
+				self._fill = 0
+				self._last_end = self._total
 			
+			if self.return_views:
+				return LogicalBody(raw_body, 0, 0, raw_body, len(raw_body))
 			return raw_body
 		
-		begin = fr.side_info.main_data_begin
-		self.ancillary_skipped = unused_reservoir - begin
-		
 		main_len = fr.side_info.part2_3_bytes
-		if begin > len(self.reservoir):
+		end = main_len - begin
+		if begin > self._fill:
 			data = None  # invalid main_data_begin
+		elif end > len(raw_body):
+			self.length_errors += 1
+			data = None  # invalid length
 		else:
-			end = main_len - begin
-			if end > len(raw_body):
-				print '!! end=%d   mainlen=%d begin=%d  rblen=%d'%(
-						end,main_len, begin,len(raw_body))
-				data = None  # invalid length
-			elif end < 0:
-				assert begin > 0
-				data = self.reservoir[-begin:end]
-			elif begin > 0:
-				data = self.reservoir[-begin:]
-				data += raw_body[:end]
+			start = (self._total - begin) % self._capacity
+			if end < 0:
+				(len1, len2) = (main_len, 0)
 			else:
-				data = raw_body[:end]
-		
-		# store the data; we need to keep at least 511 bytes in the reservoir
-		if (len(raw_body) >= 511) or not self.reservoir:
-			self.reservoir = raw_body[:]
-		else:
-			if (len(self.reservoir) + len(raw_body)) > 4096:
-				keep = max(1, 511 - len(raw_body))
-				self.reservoir = self.reservoir[-keep:]
-			self.reservoir += raw_body
-		
-		if data is None:
-			self.last_end -= len(raw_body)
-		else:
-			assert len(data) == main_len
+				(len1, len2) = (begin, end)
 			
-			unused_bytes = len(data) - end
-			self.last_end = len(raw_body) - unused_bytes
+			if self.return_views:
+				data = LogicalBody(self._ring, start, len1, raw_body, len2)
+			elif len1:
+				data = array.array('B')
+				data.fromstring(buffer(self._ring, start, len1))
+				if len2:
+					data.fromstring(buffer(raw_body, 0, len2))
+			else:
+				data = raw_body[:len2]
+			self._last_end = self._total + end
+			self._last_frame = getattr(fr, 'frame_number', None)
+		
+		if raw_body:
+			self._pending = raw_body
+			self._total += len(raw_body)
+			self._fill = min(self._fill + len(raw_body), self._capacity)
 		
 		return data
 
 
 class LogicalFrameSync(PhysicalFrameSync):
-	__slots__ = ('assembler')
+	__slots__ = ('assembler', '_ancillary')
 	
 	def __init__(self):
 		PhysicalFrameSync.__init__(self)
+		
+		# set assembler.return_views to get each logical_body as a
+		# LogicalBody view (valid until the next frame is read), and
+		# assembler.collect_ancillary to enable read_ancillary
 		self.assembler = LogicalFrameAssembler()
+		self._ancillary = []
 	
 	def readitem(self):
 		rv = PhysicalFrameSync.readitem(self)
 		if rv and rv[0] == 'frame':
+			asm = self.assembler
 			fr = rv[1]
-			fr.logical_body = self.assembler.frame_in(fr)
-			fr.ancillary_skipped = self.assembler.ancillary_skipped
+			fr.logical_body = asm.frame_in(fr)
+			fr.ancillary_skipped = asm.ancillary_skipped
+			if asm.ancillary is not None:
+				self._ancillary.append(asm.ancillary)
 			return ('frame', fr)
 		else:
 			return rv
+	
+	def read_ancillary(self):
+		"""read_ancillary() -> list
+
+Remove and return the ancillary data collected so far, as a list of
+(frame_number, byte array) tuples in stream order.  Data is only collected
+if assembler.collect_ancillary is set; the data following a frame's main
+data is available once the next frame has been read (or all data has been
+processed)."""
+		
+		if self.done and self.assembler.collect_ancillary:
+			tail = self.assembler.end_ancillary()
+			if tail:
+				self._ancillary.append(tail)
+		
+		ret = self._ancillary
+		self._ancillary = []
+		return ret
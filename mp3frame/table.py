@@ -0,0 +1,252 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Columnar storage of per-frame header fields, for statistics over whole
+files (bitrate histograms, duration, quality checks)."""
+
+from __future__ import division, absolute_import
+import array
+from . import errors
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+class FrameTable(object):
+	"""FrameTable(frames=None) -> object
+
+Creates a table with one row per frame, adding the given frames if any.
+Each column is a typed array (see 'columns'), so a row takes 22 bytes.
+Columns:
+  byte_position - the frame's byte_position
+  size - the frame size in bytes
+  bitrate - the header bitrate in bits per second; for free-format frames,
+            the rate implied by the frame size and samplerate
+  samplerate - samples per second
+  samples - samples per frame
+  channel_mode - the header's channel_mode field
+  padded - the header's padding bit
+
+column() returns a column as a NumPy array (sharing the same memory) if
+NumPy is installed; the aggregate functions are vectorized in that case."""
+	
+	columns = (
+		('byte_position', 'l'),
+		('size', 'I'),
+		('bitrate', 'I'),
+		('samplerate', 'H'),
+		('samples', 'H'),
+		('channel_mode', 'B'),
+		('padded', 'B'),
+	)
+	
+	__slots__ = tuple([ name for (name, typecode) in columns ])
+	
+	def __init__(self, frames=None):
+		for (name, typecode) in self.columns:
+			setattr(self, name, array.array(typecode))
+		
+		if frames is not None:
+			self.extend(frames)
+	
+	def __len__(self):
+		return len(self.byte_position)
+	
+	def add(self, fr):
+		"""add(MP3Frame) -> None
+
+Append a row for the given frame."""
+		
+		head = fr.header
+		size = len(fr)
+		bitrate = head.bitrate
+		if not bitrate:
+			# a free-format frame
+			bitrate = 8 * size * head.samplerate // head.samples_per_frame
+		
+		self.byte_position.append(fr.byte_position)
+		self.size.append(size)
+		self.bitrate.append(bitrate)
+		self.samplerate.append(head.samplerate)
+		self.samples.append(head.samples_per_frame)
+		self.channel_mode.append(head.channel_mode)
+		self.padded.append(head.padded)
+	
+	def extend(self, frames):
+		"""extend(frames) -> None
+
+Append a row for each frame in an iterable, such as the generator returned
+by FileSyncWrapper.frames()."""
+		add = self.add
+		for fr in frames:
+			add(fr)
+	
+	def column(self, name):
+		"""column(name) -> array
+
+Return the named column: a NumPy array if NumPy is installed, or the
+underlying array.array otherwise.  The NumPy array shares memory with the
+table, and is only valid until more rows are added."""
+		
+		col = getattr(self, name)
+		if numpy is None:
+			return col
+		
+		return numpy.frombuffer(col, dtype=col.typecode)
+	
+	
+	### aggregates
+	
+	def durations(self):
+		"""durations() -> sequence
+
+Return the duration of each frame, in seconds."""
+		if numpy is not None:
+			return (self.column('samples').astype(numpy.float64)
+					/ self.column('samplerate'))
+		
+		return [ (n / sr) for (n, sr) in zip(self.samples, self.samplerate) ]
+	
+	def total_duration(self):
+		"""total_duration() -> float
+
+Return the duration of all frames, in seconds."""
+		return float(sum(self.durations()))
+	
+	def average_bitrate(self):
+		"""average_bitrate() -> float or None
+
+Return the time-weighted average of the bitrates, in bits per second; or
+None if the table is empty."""
+		
+		if not len(self):
+			return None
+		
+		durs = self.durations()
+		if numpy is not None:
+			return float(numpy.dot(self.column('bitrate'), durs) / durs.sum())
+		
+		total = 0
+		for (br, dur) in zip(self.bitrate, durs):
+			total += br * dur
+		return total / sum(durs)
+	
+	def min_bitrate(self):
+		"""min_bitrate() -> int or None
+
+Return the lowest bitrate, in bits per second."""
+		return min(self.bitrate) if len(self) else None
+	
+	def max_bitrate(self):
+		"""max_bitrate() -> int or None
+
+Return the highest bitrate, in bits per second."""
+		return max(self.bitrate) if len(self) else None
+	
+	def bitrate_windows(self, seconds):
+		"""bitrate_windows(seconds) -> list of (float, float)
+
+Split the stream into windows of the given length and return the average
+bitrate of each, as (start_time, bitrate) tuples.  Each frame is counted in
+the window that contains its start."""
+		
+		if seconds <= 0:
+			raise ValueError('window length must be positive')
+		if not len(self):
+			return []
+		
+		durs = self.durations()
+		if numpy is not None:
+			starts = numpy.cumsum(durs) - durs
+			bins = (starts // seconds).astype(numpy.int64)
+			weighted = numpy.bincount(bins,
+					weights=self.column('bitrate') * durs)
+			total = numpy.bincount(bins, weights=durs)
+			return [ (i * seconds, float(weighted[i] / total[i]))
+					for i in range(len(total)) if total[i] ]
+		
+		weighted = {}
+		total = {}
+		t = 0.0
+		for (br, dur) in zip(self.bitrate, durs):
+			b = int(t // seconds)
+			weighted[b] = weighted.get(b, 0) + br * dur
+			total[b] = total.get(b, 0) + dur
+			t += dur
+		
+		return [ (b * seconds, weighted[b] / total[b])
+				for b in sorted(total) ]
+	
+	def mode_changes(self):
+		"""mode_changes() -> list of (int, int, int)
+
+Return a (frame_index, old_mode, new_mode) tuple for each frame whose
+channel_mode differs from the previous frame's."""
+		
+		if numpy is not None:
+			modes = self.column('channel_mode')
+			idx = numpy.flatnonzero(modes[1:] != modes[:-1]) + 1
+			return [ (i, int(modes[i-1]), int(modes[i]))
+					for i in idx.tolist() ]
+		
+		modes = self.channel_mode
+		return [ (i, modes[i-1], modes[i]) for i in range(1, len(modes))
+				if modes[i] != modes[i-1] ]
+	
+	
+	### export
+	
+	def write_csv(self, file):
+		"""write_csv(file) -> None
+
+Write the table to a file object as CSV, with a header line."""
+		
+		names = [ name for (name, typecode) in self.columns ]
+		file.write(','.join(names) + '\n')
+		
+		cols = [ getattr(self, name) for name in names ]
+		for row in zip(*cols):
+			file.write('%d,%d,%d,%d,%d,%d,%d\n' % row)
+	
+	def to_numpy(self):
+		"""to_numpy() -> numpy array
+
+Return a copy of the table as a NumPy structured array."""
+		
+		if numpy is None:
+			raise errors.MP3UsageError('NumPy is not installed')
+		
+		dtype = [ (name, typecode) for (name, typecode) in self.columns ]
+		ret = numpy.empty(len(self), dtype=dtype)
+		for (name, typecode) in self.columns:
+			ret[name] = self.column(name)
+		return ret
+	
+	def save_npy(self, file):
+		"""save_npy(file) -> None
+
+Save the table (as a structured array) in NumPy's .npy format; 'file' is a
+filename or a file object."""
+		data = self.to_numpy()
+		numpy.save(file, data)
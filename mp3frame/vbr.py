@@ -0,0 +1,170 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Helpers for creating Xing VBR header frames (see frames.XingHeader)."""
+
+from __future__ import division, absolute_import
+from . import frames
+
+
+def new_xing_header(frame_count=0, byte_count=0, cbr_mode=False):
+	"""new_xing_header(frame_count=0, byte_count=0, cbr_mode=False) -> object
+
+Return a XingHeader with a frame count, byte count and an empty seek table
+(the fields can be filled in after the frame is created, since they don't
+affect its size)."""
+	
+	xing = frames.XingHeader()
+	xing.cbr_mode = cbr_mode
+	xing.frame_count = frame_count
+	xing.byte_count = byte_count
+	xing.seek_table = [0] * 100
+	xing.quality = None
+	xing.extended_data = None
+	return xing
+
+
+def make_xing_frame(template_header, xing, bitrate=None):
+	"""make_xing_frame(template_header, xing, bitrate=None) -> MP3Frame
+
+Return a layer 3 frame containing a XingHeader.  The frame header is a copy
+of 'template_header' (usually the header of the file's first music frame)
+without CRC protection.  The bitrate is the one closest to 'bitrate' (the
+file's average bitrate, in bits per second) if that's given, but it's
+increased if necessary to fit the Xing data."""
+	
+	head = frames.FrameHeader(template_header.raw_data)
+	for name in ('version_index', 'layer_index', 'samplerate_index',
+			'channel_mode', 'mode_extension', 'copy_control', 'original',
+			'emphasis'):
+		setattr(head, name, getattr(template_header, name))
+	head.protection_bit = 1  # disable CRC
+	head.padded = 0
+	head.private = 0
+	
+	# try each bitrate, attempting to match the average
+	best = None
+	for idx in range(1, 15):
+		head.bitrate_index = idx
+		if bitrate is None:
+			break
+		
+		diff = abs(bitrate - head.bitrate)
+		if best is None or diff < best[1]:
+			best = (idx, diff)
+	if best is not None:
+		head.bitrate_index = best[0]
+	
+	# make sure the data will fit in the frame
+	datasize = 4 + head.side_info_size + xing.calc_size()
+	while head.frame_size < datasize:
+		if head.bitrate_index == 14:
+			raise ValueError('Xing data too large for a frame')
+		head.bitrate_index += 1
+	head.encode()
+	
+	frame = frames.MP3Frame()
+	frame.header = head
+	frame.init()
+	xing.encode(frame)
+	return frame
+
+
+def make_toc(frame_positions, frame_count, byte_count):
+	"""make_toc(frame_positions, frame_count, byte_count) -> list
+
+Return a Xing seek table: 100 values giving the position (scaled to 0-255)
+of the frame at each percentage of the file.  'frame_positions' is indexed
+by frame number; only 100 entries are accessed."""
+	
+	toc = []
+	for i in range(100):
+		pos = frame_positions[i * frame_count // 100]
+		toc.append( min(255, pos * 256 // byte_count) )
+	return toc
+
+
+class TOCBuilder(object):
+	"""TOCBuilder(max_samples=400) -> object
+
+Collect frame positions for a Xing seek table while a file is written,
+using memory that doesn't depend on the number of frames.  Only the
+position of every 'step'th frame is kept; whenever more than max_samples
+positions are stored, every other one is discarded and the step doubles.
+The seek table is accurate to within 'step' frames.
+
+Attributes:
+  frame_count - the number of frames added
+  step - the number of frames between stored positions"""
+	
+	def __init__(self, max_samples=400):
+		self.max_samples = max_samples
+		self.frame_count = 0
+		self.step = 1
+		self._samples = []
+	
+	def add(self, pos):
+		"""add(pos) -> None
+
+Add the next frame, which starts at the given output position."""
+		if self.frame_count % self.step == 0:
+			self._samples.append(pos)
+			if len(self._samples) > self.max_samples:
+				self._decimate()
+		self.frame_count += 1
+	
+	def add_frames(self, positions, start, stop, offset):
+		"""add_frames(positions, start, stop, offset) -> None
+
+Add several frames at once: frames 'start' up to 'stop' of a frame index
+(see fastscan.find_frames), whose output positions are the index positions
+plus 'offset'."""
+		
+		while start < stop:
+			# the first frame to be sampled
+			first = start + (-self.frame_count % self.step)
+			if first >= stop:
+				self.frame_count += stop - start
+				return
+			
+			# sample frames until the list is full
+			room = self.max_samples + 1 - len(self._samples)
+			end = min(stop, first + room * self.step)
+			self._samples.extend([ positions[i] + offset
+					for i in xrange(first, end, self.step) ])
+			self.frame_count += end - start
+			start = end
+			if len(self._samples) > self.max_samples:
+				self._decimate()
+	
+	def _decimate(self):
+		del self._samples[1::2]
+		self.step *= 2
+	
+	def toc(self, byte_count):
+		"""toc(byte_count) -> list
+
+Return the seek table for the frames added so far (see make_toc)."""
+		return make_toc(self, self.frame_count, byte_count)
+	
+	def __getitem__(self, n):
+		return self._samples[n // self.step]
@@ -0,0 +1,254 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""\
+Buffered output of frames, tags and other data.  A FrameWriter encodes
+frames directly into one large buffer (see MP3Frame.encode_into) and writes
+it out when it fills, instead of making one small write per item."""
+
+from __future__ import division, absolute_import
+from . import errors
+import os
+import tempfile
+
+
+# room kept at the end of the buffer, so any standard frame can be encoded
+# without checking its size first (larger free-format frames are handled
+# separately)
+_frame_room = 8192
+
+
+class FrameWriter(object):
+	"""FrameWriter(file, buffer_size=262144, atomic=False) -> object
+
+Return a writer for the given file object or filename.  Items are copied
+into a buffer, which is written to the file when it holds buffer_size
+bytes, and by flush and close.
+
+If a filename is given and 'atomic' is set, the output goes to a temporary
+file in the same directory, which replaces the named file when close is
+called (abort discards it instead); readers of the file will never see it
+partially written.  Otherwise, the file is opened immediately.
+
+Attributes:
+  position - the number of bytes written so far, including buffered data
+  frames_written - the number of frames written"""
+	
+	def __init__(self, file, buffer_size=262144, atomic=False):
+		self.filename = None
+		self._temp_name = None
+		if isinstance(file, basestring):
+			self.filename = file
+			if atomic:
+				(dirname, basename) = os.path.split(os.path.abspath(file))
+				(fd, self._temp_name) = tempfile.mkstemp(
+						prefix='.' + basename + '.', dir=dirname)
+				file = os.fdopen(fd, 'wb')
+			else:
+				file = open(file, 'wb')
+			self._owned = True
+		elif atomic:
+			raise errors.MP3UsageError(
+					"atomic output requires a filename")
+		else:
+			self._owned = False
+		
+		self.file = file
+		self.buffer_size = buffer_size
+		self.position = 0
+		self.frames_written = 0
+		self._buf = bytearray(buffer_size + _frame_room)
+		self._fill = 0
+		self._limit = buffer_size
+	
+	def write_frame(self, frame):
+		"""write_frame(MP3Frame) -> int
+
+Encode a frame into the buffer (see MP3Frame.encode_into), and return its
+position in the output."""
+		
+		if self._fill >= self._limit:
+			self.flush()
+		
+		pos = self.position
+		try:
+			size = frame.encode_into(self._buf, self._fill)
+		except errors.MP3UsageError:
+			if len(frame) <= len(self._buf) - self._fill:
+				raise
+			
+			# too big for the buffer; encode it separately
+			self._write_direct(frame.encode())
+		else:
+			self._fill += size
+			self.position += size
+		
+		self.frames_written += 1
+		return pos
+	
+	def write(self, data):
+		"""write(data) -> int
+
+Write a string or byte array (such as a garbage item), and return its
+position in the output."""
+		
+		pos = self.position
+		size = len(data)
+		if size > self.buffer_size:
+			self._write_direct(data)
+			return pos
+		
+		if self._fill + size > len(self._buf):
+			self.flush()
+		
+		self._buf[self._fill:self._fill+size] = buffer(data)
+		self._fill += size
+		self.position += size
+		if self._fill >= self._limit:
+			self.flush()
+		return pos
+	
+	def write_tag(self, tag):
+		"""write_tag(CommentTag) -> int
+
+Write a tag, and return its position in the output."""
+		return self.write(tag.raw_data)
+	
+	def write_item(self, itemtype, item):
+		"""write_item(itemtype, item) -> int
+
+Write an item as returned by the sync wrappers' items() generators, and
+return its position in the output."""
+		
+		if itemtype in ('frame', 'badframe'):
+			return self.write_frame(item)
+		elif itemtype == 'tag':
+			return self.write_tag(item)
+		else:
+			return self.write(item)
+	
+	def copy_from(self, file, offset, count):
+		"""copy_from(file, offset, count) -> int
+
+Copy 'count' bytes starting at 'offset' in another file to the output, and
+return their position in the output.  The data is read in large blocks into
+the writer's buffer, without creating a string for each block.  The source
+file's position is undefined afterwards."""
+		
+		pos = self.position
+		self.flush()
+		
+		# read blocks into the (now empty) buffer
+		file.seek(offset)
+		view = memoryview(self._buf)
+		done = 0
+		while done < count:
+			n = file.readinto(view[:min(count - done, len(view))])
+			if not n:
+				raise IOError("unexpected end of file")
+			self.file.write(buffer(self._buf, 0, n))
+			done += n
+		
+		self.position += count
+		return pos
+	
+	def overwrite(self, position, data):
+		"""overwrite(position, data) -> None
+
+Replace data that was already written at the given output position (for
+example, a header frame that's filled in once the rest of the file has been
+written).  The file must be seekable, and the data can't extend past the
+current position."""
+		
+		if position < 0 or position + len(data) > self.position:
+			raise errors.MP3UsageError('can only overwrite existing data')
+		
+		self.flush()
+		self.file.seek(position)
+		self.file.write(buffer(data))
+		self.file.seek(0, 2)
+	
+	def _write_direct(self, data):
+		# write something large without copying it into the buffer
+		self.flush()
+		self.file.write(buffer(data))
+		self.position += len(data)
+	
+	def flush(self):
+		"""flush() -> None
+
+Write all buffered data to the file."""
+		if self._fill:
+			self.file.write(buffer(self._buf, 0, self._fill))
+			self._fill = 0
+	
+	def close(self):
+		"""close() -> None
+
+Flush the buffer, and close the file if it was opened by the writer.  For
+atomic output, the temporary file is synced to disk and renamed to the target
+filename; the permissions of the file being replaced are kept."""
+		
+		self.flush()
+		if not self._owned:
+			self.file.flush()
+			return
+		
+		temp_name = self._temp_name
+		if temp_name:
+			# the data must be on disk before the rename, or a crash could
+			# leave an empty or partial file in place of the original
+			self.file.flush()
+			os.fsync(self.file.fileno())
+		self.file.close()
+		if temp_name:
+			self._temp_name = None
+			try:
+				mode = os.stat(self.filename).st_mode & 0777
+			except OSError:
+				# a new file; use the permissions open() would have used
+				umask = os.umask(0)
+				os.umask(umask)
+				mode = 0666 & ~umask
+			os.chmod(temp_name, mode)
+			os.rename(temp_name, self.filename)
+	
+	def abort(self):
+		"""abort() -> None
+
+Discard the buffered data; for atomic output, also discard the temporary
+file and leave the target file unchanged."""
+		
+		self._fill = 0
+		if self._owned:
+			self.file.close()
+		if self._temp_name:
+			os.remove(self._temp_name)
+			self._temp_name = None
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+		else:
+			self.abort()
@@ -0,0 +1,94 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""\
+Synthetic MPEG audio streams for the tests."""
+
+from __future__ import division
+import mp3frame.frames, mp3frame.sync
+import array
+import random
+
+
+def make_stream(nframes, seed=1, free_size=None, protect=False,
+		channel_mode=1):
+	"""make_stream(nframes, seed=1, free_size=None, protect=False,
+            channel_mode=1) -> str
+
+Return a layer 3 stream of random frames (each with a valid side info
+section and main_data_begin of 0).  If 'free_size' is given, the frames are
+free-format with that size (plus a padding byte when padded); otherwise
+they have random bitrates."""
+	
+	rnd = random.Random(seed)
+	out = array.array('B')
+	for i in range(nframes):
+		h = mp3frame.frames.FrameHeader()
+		h.layer_index = 1
+		h.protection_bit = int(not protect)
+		h.channel_mode = channel_mode
+		h.padded = rnd.randint(0, 1)
+		if free_size is None:
+			h.bitrate_index = rnd.randint(1, 14)
+			size = h.frame_size
+		else:
+			h.bitrate_index = 0
+			size = free_size + h.padded
+		h.encode()
+		
+		fr = mp3frame.frames.MP3Frame()
+		fr.header = h
+		fr.init()
+		n = size - h.body_offset
+		fr.side_info.channels[0].granules[0].part2_3_length = 8 * min(n, 200)
+		fr.raw_body = array.array('B',
+				[ rnd.randrange(256) for j in range(n) ])
+		fr.crc16 = None
+		out.extend(fr.encode())
+	return out.tostring()
+
+
+def frame_items(data, chunk_size, sync=None):
+	"""frame_items(data, chunk_size, sync=None) -> list
+
+Feed 'data' into a PhysicalFrameSync (or the given sync) in chunks of
+'chunk_size' bytes, and return the items as (type, position, size)."""
+	
+	if sync is None:
+		sync = mp3frame.sync.PhysicalFrameSync()
+	ret = []
+	pos = 0
+	offset = 0
+	while not sync.done:
+		rv = sync.readitem()
+		if rv is None:
+			if offset < len(data):
+				sync.fromstring(data[offset:offset+chunk_size])
+				offset += chunk_size
+			else:
+				sync.set_eof()
+			continue
+		
+		size = len(rv[1])
+		ret.append( (rv[0], pos, size) )
+		pos += size
+	return ret
@@ -0,0 +1,97 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import ancillary, errors, sync
+import mp3data
+import array
+import unittest
+
+
+def read_frames(data):
+	s = sync.PhysicalFrameSync()
+	s.fromstring(data)
+	s.set_eof()
+	ret = []
+	while not s.done:
+		(itemtype, item) = s.readitem()
+		ret.append(item)
+	return ret
+
+
+def encode(frames):
+	return ''.join([ fr.encode().tostring() for fr in frames ])
+
+
+class AncillaryTest(unittest.TestCase):
+	
+	def setUp(self):
+		# each frame's main data is at the start of its body, followed by
+		# ancillary data
+		self.frames = read_frames(mp3data.make_stream(6))
+		self.sizes = [ len(fr.raw_body) for fr in self.frames ]
+		self.main = [ fr.side_info.part2_3_bytes for fr in self.frames ]
+		# frame 3 starts its main data 50 bytes before its body, and ends it
+		# 100 bytes earlier
+		self.frames[3].side_info.main_data_begin = 50
+		self.frames[3].side_info.channels[0].granules[0].part2_3_length -= \
+				8 * 50
+		self.main[3] -= 100
+	
+	def test_spans(self):
+		caps = [ n - m for (n, m) in zip(self.sizes, self.main) ]
+		caps[2] -= 50
+		self.assertEqual(ancillary.ancillary_capacity(self.frames),
+				caps[:-1] + [0])
+		self.assertEqual(ancillary.ancillary_capacity(self.frames, True),
+				caps)
+		
+		# the space after frame 2 isn't free unless frame 3 is included
+		self.assertEqual(ancillary.ancillary_capacity(self.frames[:3]),
+				caps[:2] + [0])
+		self.assertRaises(errors.MP3UsageError, ancillary.write_ancillary,
+				self.frames[:3], 2, 'x')
+	
+	def test_write(self):
+		for fr in self.frames:
+			fr.encode()
+		main = self.frames[3].raw_body[:self.main[3]]
+		reservoir = self.frames[2].raw_body[-50:]
+		
+		ancillary.write_ancillary(self.frames, 2, 'hello', fill=0x55)
+		self.assertEqual([ fr.body_modified for fr in self.frames ],
+				[False, False, True, False, False, False])
+		self.assertEqual(self.frames[3].raw_body[:self.main[3]], main)
+		self.assertEqual(self.frames[2].raw_body[-50:], reservoir)
+		
+		s = sync.LogicalFrameSync()
+		s.assembler.collect_ancillary = True
+		s.fromstring(encode(self.frames))
+		s.set_eof()
+		while not s.done:
+			s.readitem()
+		found = dict(s.read_ancillary())
+		n = self.sizes[2] - self.main[2] - 50
+		self.assertEqual(found[2].tostring(), 'hello' + '\x55' * (n - 5))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,97 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import bitfields
+import array
+import random
+import unittest
+
+
+def get_bits(raw, offset, bits):
+	# a bit at a time, for comparison
+	val = 0
+	for i in range(offset, offset + bits):
+		val = (val << 1) | ((raw[i // 8] >> (7 - i % 8)) & 1)
+	return val
+
+
+class Fields(object):
+	pass
+
+
+class BitFieldTest(unittest.TestCase):
+	
+	def test_fields(self):
+		# every offset within a byte, and sizes spanning up to 6 bytes
+		rnd = random.Random(7)
+		for offset in range(0, 16):
+			for bits in range(0, 41):
+				prop = bitfields.make_property('raw', offset, bits)
+				obj = Fields()
+				obj.raw = array.array('B',
+						[ rnd.randrange(256) for i in range(8) ])
+				self.assertEqual(prop.fget(obj), get_bits(obj.raw, offset,
+						bits))
+				
+				before = obj.raw.tolist()
+				val = rnd.randrange(1 << (bits + 3))
+				prop.fset(obj, val)
+				self.assertEqual(prop.fget(obj), val & ((1 << bits) - 1))
+				# the bits outside the field are unchanged
+				for i in range(64):
+					if not offset <= i < offset + bits:
+						self.assertEqual(get_bits(obj.raw, i, 1),
+								get_bits(array.array('B', before), i, 1))
+	
+	def test_read_fields(self):
+		class Q(object):
+			a = bitfields.make_property('raw', 0, 3)
+			b = bitfields.make_property('raw', 3, 11)
+			c = bitfields.make_property('raw', 3+11, 32)
+			d = bitfields.make_property('raw', 46, 0)
+			e = property(lambda s: 1)
+			f = bitfields.make_property('other', 0, 1)
+		
+		q = Q()
+		q.raw = array.array('B', '\xaf\x83\x99\x99\x99\x99')
+		q.other = array.array('B', '\x80')
+		self.assertEqual(bitfields.read_fields(q, ('c', 'b', 'a', 'd')),
+				(q.c, q.b, q.a, 0))
+		self.assertEqual(bitfields.read_fields(q, ()), ())
+		self.assertRaises(ValueError, bitfields.read_fields, q, ('a', 'e'))
+		self.assertRaises(ValueError, bitfields.read_fields, q, ('a', 'f'))
+		self.assertRaises(AttributeError, bitfields.read_fields, q, ('x',))
+	
+	def test_dotted_path(self):
+		class R(object):
+			x = bitfields.make_property('q.raw', 8, 8)
+		r = R()
+		r.q = Fields()
+		r.q.raw = array.array('B', '\0\0')
+		r.x = 0x1ff
+		self.assertEqual(r.q.raw.tolist(), [0, 0xff])
+		self.assertRaises(ValueError, bitfields.make_property, 'q..raw', 0, 1)
+		self.assertRaises(ValueError, bitfields.make_property, 'raw', -1, 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
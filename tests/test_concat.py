@@ -0,0 +1,105 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import concat, cut, errors, fastscan, frames, vbr
+import mp3data
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ConcatTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.out = os.path.join(self.dir, 'out.mp3')
+	
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+	
+	def write(self, name, data):
+		name = os.path.join(self.dir, name)
+		f = open(name, 'wb')
+		f.write(data)
+		f.close()
+		return name
+	
+	def read_xing(self, data):
+		(positions, sizes) = fastscan.find_frames(data)
+		fr = cut.read_frames(data, positions, sizes, 0, 1)[0]
+		(tag, offset) = fr.identify_vbr_header()
+		return (frames.XingHeader(fr, offset), len(positions))
+	
+	def test_concat(self):
+		a = mp3data.make_stream(10)
+		(positions, sizes) = fastscan.find_frames(a)
+		first = cut.read_frames(a, positions, sizes, 0, 1)[0]
+		xfr = vbr.make_xing_frame(first.header, vbr.new_xing_header(10))
+		b = mp3data.make_stream(8, seed=2)
+		names = [
+			self.write('a.mp3', xfr.encode().tostring() + a),
+			self.write('b.mp3', 'junk' + b + 'TAG' + 'x' * 125),
+			self.write('empty.mp3', ''),
+		]
+		
+		size = concat.concat_files(names, self.out)
+		data = open(self.out, 'rb').read()
+		self.assertEqual(size, len(data))
+		(xing, nframes) = self.read_xing(data)
+		self.assertEqual(nframes, 19)
+		self.assertEqual(xing.frame_count, 18)
+		self.assertEqual(xing.byte_count, len(data))
+		self.assertEqual(data[-len(a + b):], a + b)
+		
+		# without a Xing header
+		concat.concat_files(names, self.out, xing=False)
+		self.assertEqual(open(self.out, 'rb').read(), a + b)
+	
+	def test_mismatch(self):
+		stereo = self.write('stereo.mp3', mp3data.make_stream(5))
+		mono = self.write('mono.mp3', mp3data.make_stream(5, channel_mode=3))
+		# the mode changes after the first frame
+		mixed = self.write('mixed.mp3', mp3data.make_stream(6) +
+				mp3data.make_stream(4, channel_mode=3))
+		
+		for names in ([stereo, mono], [mixed], [stereo, mixed]):
+			self.assertRaises(errors.MP3UsageError, concat.concat_files,
+					names, self.out)
+			self.assertFalse(os.path.exists(self.out))
+			self.assertEqual(len(os.listdir(self.dir)), 3)
+		
+		c = concat.Concatenator(self.out)
+		c.add_file(stereo)
+		try:
+			c.add_file(mixed)
+		except errors.MP3UsageError, e:
+			self.assertTrue('frame 6' in str(e))
+		else:
+			self.fail('no error for a mode change')
+		c.close()
+		self.assertEqual(self.read_xing(open(self.out, 'rb').read())[0]
+				.frame_count, 5)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,88 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import crc, sync
+import mp3data
+import array
+import random
+import unittest
+
+
+def slow_crc(data, start=0xffff):
+	for ch in bytearray(data):
+		start = crc.crc16_bits(ch, 8, start)
+	return start
+
+
+class CrcTest(unittest.TestCase):
+	
+	def setUp(self):
+		rnd = random.Random(3)
+		# several blocks of each length, so NumPy handles them as a matrix
+		self.blocks = [ ''.join([ chr(rnd.randrange(256)) for i in range(n) ])
+				for n in range(40) for j in range(3) ]
+		self.expected = [ slow_crc(b) for b in self.blocks ]
+	
+	def test_crc16(self):
+		for (b, expected) in zip(self.blocks, self.expected):
+			self.assertEqual(crc.crc16(b), expected)
+			self.assertEqual(crc.crc16(bytearray(b)), expected)
+			self.assertEqual(crc.crc16(array.array('B', b)), expected)
+		self.assertEqual(crc.crc16('abcdefghij', 0x1234),
+				slow_crc('abcdefghij', 0x1234))
+	
+	def test_crc16_many(self):
+		self.assertEqual(crc.crc16_many(self.blocks), self.expected)
+		self.assertEqual(crc.crc16_many(self.blocks, 0),
+				[ slow_crc(b, 0) for b in self.blocks ])
+		self.assertEqual(crc.crc16_many(self.blocks[:5]), self.expected[:5])
+		
+		# without NumPy
+		numpy = crc.numpy
+		crc.numpy = None
+		try:
+			self.assertEqual(crc.crc16_many(self.blocks), self.expected)
+		finally:
+			crc.numpy = numpy
+	
+	def test_check_frames(self):
+		data = bytearray(mp3data.make_stream(20, protect=True) +
+				mp3data.make_stream(5))
+		# damage the side info of frame 3
+		s = sync.PhysicalFrameSync()
+		s.fromstring(str(data))
+		s.set_eof()
+		pos = 0
+		for i in range(3):
+			pos += len(s.readitem()[1])
+		data[pos + 8] ^= 1
+		
+		s = sync.PhysicalFrameSync()
+		s.fromstring(str(data))
+		s.set_eof()
+		frames = [ item for (itemtype, item) in iter(s.readitem, None) ]
+		self.assertEqual(crc.check_frames(frames),
+				[True] * 3 + [False] + [True] * 16 + [None] * 5)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,50 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import division
+from mp3frame import cut, fastscan
+import mp3data
+import unittest
+
+
+class ReadFramesTest(unittest.TestCase):
+	
+	def check(self, data):
+		(positions, sizes) = fastscan.find_frames(data)
+		frs = cut.read_frames(data, positions, sizes, 0, len(positions))
+		self.assertEqual(len(frs), len(positions))
+		for (fr, pos, size) in zip(frs, positions, sizes):
+			self.assertEqual(fr.byte_position, pos)
+			self.assertEqual(fr.encode().tostring(), data[pos:pos+size])
+	
+	def test_frames(self):
+		self.check(mp3data.make_stream(20))
+	
+	def test_free_format(self):
+		# the frames' ends can't be found from the next header, since
+		# each frame is fed in alone
+		self.check(mp3data.make_stream(20, free_size=600))
+		self.check(mp3data.make_stream(20, free_size=600, protect=True))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import division
+from mp3frame import fastscan
+import mp3data
+import unittest
+
+
+class FindFramesTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.data = mp3data.make_stream(50)
+		(self.positions, self.sizes) = fastscan.find_frames(self.data)
+		self.assertEqual(len(self.positions), 50)
+	
+	def test_trailing_bytes(self):
+		# a few bytes after the last frame are too short for a header
+		for tail in ('a', 'ab', 'abc'):
+			data = self.data + tail
+			for use_numpy in (True, False):
+				(positions, sizes) = fastscan.find_frames(data, use_numpy)
+				self.assertEqual(list(positions), list(self.positions))
+				self.assertEqual(list(sizes), list(self.sizes))
+	
+	def test_first_and_last_frames(self):
+		data = self.data + 'ab'
+		for count in (0, 1, 10, 100):
+			(positions, sizes) = fastscan.find_first_frames(data, count)
+			self.assertEqual(list(positions), list(self.positions[:count]))
+			
+			(positions, sizes) = fastscan.find_last_frames(data, count)
+			first = max(0, len(self.positions) - count)
+			self.assertEqual(list(positions), list(self.positions[first:]))
+			self.assertEqual(list(sizes), list(self.sizes[first:]))
+
+
+if __name__ == '__main__':
+	unittest.main()
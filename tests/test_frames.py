@@ -0,0 +1,109 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import errors, sync
+import mp3data
+import unittest
+
+
+def read_frames(data):
+	s = sync.PhysicalFrameSync()
+	s.fromstring(data)
+	s.set_eof()
+	return [ item for (itemtype, item) in iter(s.readitem, None) ]
+
+
+def encode_into(fr, offset=3):
+	buf = bytearray(offset + len(fr) + 5)
+	size = fr.encode_into(buf, offset)
+	return str(buf[offset:offset+size])
+
+
+class EncodeIntoTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.data = mp3data.make_stream(10, protect=True)
+		self.frames = read_frames(self.data)
+	
+	def test_unmodified(self):
+		out = []
+		for fr in self.frames:
+			self.assertFalse(fr.header.modified)
+			self.assertFalse(fr.side_info.modified)
+			self.assertFalse(fr.body_modified)
+			out.append(encode_into(fr))
+		self.assertEqual(''.join(out), self.data)
+	
+	def test_modified(self):
+		fr = self.frames[2]
+		crc = fr.crc16
+		fr.header.copy_control = 1 - fr.header.copy_control
+		self.assertTrue(fr.header.modified)
+		fr.header.copy_control = 1 - fr.header.copy_control
+		self.assertFalse(fr.header.modified)
+		
+		fr.header.original = 1
+		self.assertTrue(fr.header.modified)
+		data = encode_into(fr)
+		self.assertFalse(fr.header.modified)
+		self.assertNotEqual(fr.crc16, crc)
+		self.assertEqual(data, fr.encode().tostring())
+		self.assertEqual(read_frames(data)[0].header.original, 1)
+		
+		crc = fr.crc16
+		fr.side_info.channels[0].granules[1].global_gain = 99
+		self.assertTrue(fr.side_info.modified)
+		data = encode_into(fr, 0)
+		self.assertFalse(fr.side_info.modified)
+		self.assertNotEqual(fr.crc16, crc)
+		self.assertEqual(data, fr.encode().tostring())
+		
+		# the CRC is checked when the frame is read back
+		s = sync.PhysicalFrameSync()
+		s.verify_crc = True
+		s.fromstring(data)
+		s.set_eof()
+		self.assertEqual(s.readitem()[1].crc_ok, True)
+	
+	def test_body(self):
+		fr = self.frames[4]
+		fr.raw_body[-1] ^= 0xff
+		fr.body_modified = True
+		self.assertEqual(encode_into(fr), fr.encode().tostring())
+		self.assertFalse(fr.body_modified)
+		
+		# a body too short for the side info is rejected once it's marked
+		# as modified
+		del fr.raw_body[fr.side_info.part2_3_bytes - 1:]
+		fr.body_modified = True
+		self.assertRaises(errors.MP3UsageError, encode_into, fr)
+	
+	def test_buffer_size(self):
+		fr = self.frames[0]
+		buf = bytearray(len(fr) + 1)
+		self.assertRaises(errors.MP3UsageError, fr.encode_into, buf, 2)
+		self.assertEqual(fr.encode_into(buf, 1), len(fr))
+		self.assertEqual(str(buf[1:]), self.data[:len(fr)])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,125 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import errors, fastscan, id3
+import mp3data
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TextTest(unittest.TestCase):
+	
+	def test_text(self):
+		for version in (3, 4):
+			for text in (u'plain', u'caf\xe9', u'\u65e5\u672c', u''):
+				(frame_id, data) = id3.text_frame('TIT2', text, version)
+				self.assertEqual(frame_id, 'TIT2')
+				self.assertEqual(id3.frame_text(data), text)
+		self.assertEqual(id3.text_frame('TIT2', u'\u65e5', 4)[1][0], '\3')
+		self.assertEqual(id3.text_frame('TIT2', u'\u65e5', 3)[1][0], '\1')
+		
+		self.assertEqual(id3.frame_text(''), u'')
+		self.assertEqual(id3.frame_text('\0a\0b\0'), u'a\0b')
+		self.assertRaises(errors.MP3DataError, id3.frame_text, '\4abc')
+
+
+class TagTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.name = os.path.join(self.dir, 'a.mp3')
+		self.audio = mp3data.make_stream(10)
+		self.frames = [
+			id3.text_frame('TIT2', u'Title'),
+			id3.text_frame('TPE1', u'Artist \xe9'),
+			('PRIV', 'owner\0' + '\xff' * 20),
+		]
+	
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+	
+	def write(self, data):
+		f = open(self.name, 'wb')
+		f.write(data)
+		f.close()
+	
+	def read(self):
+		f = open(self.name, 'rb')
+		try:
+			return f.read()
+		finally:
+			f.close()
+	
+	def test_encode(self):
+		for version in (3, 4):
+			tag = id3.encode_tag(self.frames, version, padding=100)
+			self.assertEqual(id3.tag_size(tag[:10]), len(tag))
+			self.assertEqual(id3.decode_tag(tag + self.audio),
+					(version, self.frames))
+			# big enough that version 4 sizes need more than 7 bits
+			big = [('APIC', 'x' * 300)]
+			self.assertEqual(id3.decode_tag(id3.encode_tag(big, version)),
+					(version, big))
+		
+		self.assertEqual(len(id3.encode_tag(self.frames, size=200)), 200)
+		self.assertRaises(errors.MP3UsageError, id3.encode_tag, self.frames,
+				size=50)
+		self.assertRaises(errors.MP3UsageError, id3.encode_tag,
+				[('TIT', 'x')])
+		self.assertEqual(id3.decode_tag(self.audio), None)
+		self.assertRaises(errors.MP3DataError, id3.decode_tag,
+				id3.encode_tag(self.frames)[:50])
+	
+	def test_write(self):
+		# adding a tag rewrites the file, with padding for later changes
+		self.write(self.audio)
+		self.assertEqual(id3.read_tag(self.name), None)
+		self.assertFalse(id3.write_tag(self.name, self.frames, padding=500))
+		data = self.read()
+		size = id3.tag_size(data[:10])
+		self.assertEqual(data[size:], self.audio)
+		self.assertEqual(id3.read_tag(self.name), (4, self.frames))
+		
+		# a smaller or slightly larger tag fits in the padding
+		for frames in (self.frames[:1],
+				self.frames + [id3.text_frame('TALB', u'x' * 300)]):
+			self.assertTrue(id3.write_tag(self.name, frames))
+			data = self.read()
+			self.assertEqual(id3.tag_size(data[:10]), size)
+			self.assertEqual(data[size:], self.audio)
+			self.assertEqual(id3.read_tag(self.name), (4, frames))
+		
+		# a larger one doesn't
+		frames = [id3.text_frame('TALB', u'x' * 1000)]
+		self.assertFalse(id3.write_tag(self.name, frames, version=3,
+				padding=10))
+		data = self.read()
+		self.assertEqual(id3.tag_size(data[:10]), 10 + 10 + 1001 + 10)
+		self.assertEqual(id3.read_tag(self.name), (3, frames))
+		self.assertEqual(data[id3.tag_size(data[:10]):], self.audio)
+		self.assertEqual(len(fastscan.find_frames(data)[0]), 10)
+
+
+if __name__ == '__main__':
+	unittest.main()
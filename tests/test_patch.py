@@ -0,0 +1,145 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import errors, patch, sync
+import mp3data
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def set_gain(fr):
+	fr.side_info.channels[0].granules[0].global_gain = 100
+
+
+class PatchTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.name = os.path.join(self.dir, 'a.mp3')
+		self.data = mp3data.make_stream(10, protect=True)
+		f = open(self.name, 'wb')
+		f.write(self.data)
+		f.close()
+		
+		self.patched = bytearray(self.data)
+		self.changes = list(patch.diff_frames(self.data, set_gain))
+		for (offset, old, new) in self.changes:
+			self.patched[offset:offset+len(new)] = new
+		self.patched = str(self.patched)
+	
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+	
+	def read(self, name=None):
+		f = open(name or self.name, 'rb')
+		try:
+			return f.read()
+		finally:
+			f.close()
+	
+	def check_patched(self, data):
+		s = sync.PhysicalFrameSync()
+		s.verify_crc = True
+		s.fromstring(data)
+		s.set_eof()
+		while s.readitem():
+			pass
+		self.assertEqual(s.crc_invalid, 0)
+		self.assertEqual(s.crc_valid, 10)
+	
+	def test_diff_frames(self):
+		self.assertEqual(len(self.changes), 10)
+		self.assertNotEqual(self.patched, self.data)
+		self.check_patched(self.patched)
+	
+	def test_patch_file(self):
+		synced = []
+		fsync_dir = patch._fsync_dir
+		def record(name):
+			synced.append(os.path.exists(name))
+			fsync_dir(name)
+		patch._fsync_dir = record
+		try:
+			result = patch.patch_file(self.name, set_gain)
+		finally:
+			patch._fsync_dir = fsync_dir
+		
+		self.assertEqual(result,
+				(10, sum([ len(x[2]) for x in self.changes ])))
+		self.assertEqual(self.read(), self.patched)
+		self.assertFalse(os.path.exists(patch.journal_name(self.name)))
+		# the directory is synced once the journal exists, and again once
+		# it's gone
+		self.assertEqual(synced, [True, False])
+		
+		# a second run has nothing to do
+		self.assertEqual(patch.patch_file(self.name, set_gain), (0, 0))
+	
+	def test_patch_copy(self):
+		out = os.path.join(self.dir, 'b.mp3')
+		(count, size) = patch.patch_copy(self.name, out, set_gain)
+		self.assertEqual((count, size), (10, len(self.data)))
+		self.assertEqual(self.read(out), self.patched)
+		self.assertEqual(self.read(), self.data)
+	
+	def test_interrupted(self):
+		# the patch stops after the journal is written and one change is
+		# made
+		pwrite = patch._pwrite
+		def fail(fd, data, offset):
+			if self.read() != self.data:
+				raise KeyboardInterrupt
+			return pwrite(fd, data, offset)
+		patch._pwrite = fail
+		try:
+			self.assertRaises(KeyboardInterrupt, patch.patch_file, self.name,
+					set_gain)
+		finally:
+			patch._pwrite = pwrite
+		
+		jname = patch.journal_name(self.name)
+		self.assertTrue(os.path.exists(jname))
+		self.assertNotEqual(self.read(), self.data)
+		self.assertRaises(errors.MP3UsageError, patch.patch_file, self.name,
+				set_gain)
+		
+		self.assertTrue(patch.recover(self.name))
+		self.assertEqual(self.read(), self.data)
+		self.assertFalse(os.path.exists(jname))
+		self.assertFalse(patch.recover(self.name))
+	
+	def test_incomplete_journal(self):
+		# a journal without its trailer was interrupted before the file was
+		# changed
+		jname = patch.journal_name(self.name)
+		f = open(jname, 'wb')
+		f.write(patch._journal_magic + patch._entry.pack(4, 2) + 'ab')
+		f.close()
+		self.assertFalse(patch.recover(self.name))
+		self.assertFalse(os.path.exists(jname))
+		self.assertEqual(self.read(), self.data)
+
+
+if __name__ == '__main__':
+	unittest.main()
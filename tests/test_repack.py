@@ -0,0 +1,119 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import cut, fastscan, frames, repack, sync
+import mp3data
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def logical_bodies(data):
+	s = sync.LogicalFrameSync()
+	s.fromstring(data)
+	s.set_eof()
+	ret = []
+	for (itemtype, item) in iter(s.readitem, None):
+		if itemtype == 'frame' and not item.identify_vbr_header():
+			ret.append( (item.side_info.part2_3_bytes,
+					item.logical_body.tostring()) )
+	return ret
+
+
+class RepackTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.name = os.path.join(self.dir, 'a.mp3')
+		self.out = os.path.join(self.dir, 'b.mp3')
+	
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+	
+	def write(self, data):
+		f = open(self.name, 'wb')
+		f.write(data)
+		f.close()
+	
+	def read(self, name):
+		f = open(name, 'rb')
+		try:
+			return f.read()
+		finally:
+			f.close()
+	
+	def test_repack(self):
+		# the frames have up to 200 bytes of main data, followed by unused
+		# space, so they can be packed into much less
+		data = mp3data.make_stream(100, seed=4)
+		self.write(data)
+		size = repack.repack_file(self.name, self.out)
+		out = self.read(self.out)
+		self.assertEqual(size, len(out))
+		self.assertTrue(size < len(data) * 0.75)
+		self.assertEqual(repack.compare_files(self.name, self.out), None)
+		self.assertEqual(logical_bodies(out), logical_bodies(data))
+		
+		(positions, sizes) = fastscan.find_frames(out)
+		self.assertEqual(len(positions), 101)
+		fr = cut.read_frames(out, positions, sizes, 0, 1)[0]
+		xing = frames.XingHeader(fr, fr.identify_vbr_header()[1])
+		self.assertEqual(xing.frame_count, 100)
+		self.assertEqual(xing.byte_count, size)
+		
+		# the output uses the bit reservoir, and repacking it again
+		# changes nothing
+		self.assertTrue([ x for x in cut.read_frames(out, positions, sizes,
+				1, 101) if x.side_info.main_data_begin ])
+		again = os.path.join(self.dir, 'c.mp3')
+		self.assertEqual(repack.repack_file(self.out, again), size)
+		self.assertEqual(self.read(again), out)
+		
+		# a short lookahead still works, if less well
+		repack.repack_file(self.name, again, lookahead=1, xing=False)
+		self.assertEqual(repack.compare_files(self.name, again), None)
+		self.assertEqual(len(fastscan.find_frames(self.read(again))[0]), 100)
+	
+	def test_garbage(self):
+		a = mp3data.make_stream(10, seed=5)
+		b = mp3data.make_stream(10, seed=6)
+		junk = 'junk' * 10
+		self.write(junk + a + junk + b + junk)
+		
+		repack.repack_file(self.name, self.out, xing=False)
+		out = self.read(self.out)
+		self.assertEqual(repack.compare_files(self.name, self.out), None)
+		(positions, sizes) = fastscan.find_frames(out)
+		self.assertEqual(len(positions), 20)
+		self.assertEqual(out[:positions[0]], junk)
+		self.assertEqual(out[positions[9]+sizes[9]:positions[10]], junk)
+		self.assertEqual(out[positions[19]+sizes[19]:], junk)
+		
+		repack.repack_file(self.name, self.out, keep_garbage=False)
+		out = self.read(self.out)
+		self.assertFalse(junk in out)
+		self.assertEqual(repack.compare_files(self.name, self.out), None)
+
+
+if __name__ == '__main__':
+	unittest.main()
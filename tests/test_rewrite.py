@@ -0,0 +1,115 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import errors, fastscan, rewrite, sync
+import mp3data
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class RewriteTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.name = os.path.join(self.dir, 'a.mp3')
+		self.data = mp3data.make_stream(10) + 'junk' + mp3data.make_stream(5)
+		f = open(self.name, 'wb')
+		f.write(self.data)
+		f.close()
+		(self.positions, self.sizes) = fastscan.find_frames(self.data)
+		self.assertEqual(len(self.positions), 15)
+		
+		s = sync.PhysicalFrameSync()
+		s.fromstring(mp3data.make_stream(1, seed=9))
+		s.set_eof()
+		self.frame = s.readitem()[1]
+	
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+	
+	def span(self, start, stop):
+		p = self.positions
+		return self.data[p[start]:p[stop]]
+	
+	def edits(self):
+		edits = rewrite.EditList(self.positions, self.sizes)
+		# added out of order
+		edits.replace(12, 'new12')
+		edits.insert(0, self.frame)
+		edits.delete(3, 5)
+		edits.insert(15, 'end')
+		edits.insert(0, 'second')
+		edits.delete(9, 11)  # includes the garbage
+		edits.insert_at(self.positions[6] + 1, 'x')
+		return edits
+	
+	def expected(self):
+		p = self.positions
+		frame = self.frame.encode().tostring()
+		return (frame + 'second' + self.span(0, 3) + self.span(5, 6) +
+				self.data[p[6]] + 'x' + self.data[p[6]+1:p[9]] +
+				self.span(11, 12) + 'new12' + self.data[p[13]:] + 'end')
+	
+	def test_plan(self):
+		steps = self.edits().plan(len(self.data))
+		self.assertEqual([ step[0] for step in steps ], ['item', 'item',
+				'copy', 'copy', 'item', 'copy', 'copy', 'item', 'copy',
+				'item'])
+		self.assertEqual(steps[3], ('copy', self.positions[5],
+				self.positions[6] + 1))
+	
+	def test_rewrite(self):
+		out = os.path.join(self.dir, 'b.mp3')
+		size = rewrite.rewrite(self.name, out, self.edits())
+		expected = self.expected()
+		self.assertEqual(size, len(expected))
+		self.assertEqual(open(out, 'rb').read(), expected)
+		
+		# in place, and to a file object
+		rewrite.rewrite(self.name, self.name, self.edits())
+		self.assertEqual(open(self.name, 'rb').read(), expected)
+		f = tempfile.TemporaryFile()
+		src = open(out, 'rb')
+		rewrite.rewrite(src, f, rewrite.EditList([], []))
+		src.close()
+		f.seek(0)
+		self.assertEqual(f.read(), expected)
+	
+	def test_errors(self):
+		edits = rewrite.EditList(self.positions, self.sizes)
+		edits.delete(2, 5)
+		edits.replace(4, 'x')
+		self.assertRaises(errors.MP3UsageError, rewrite.rewrite, self.name,
+				os.path.join(self.dir, 'b.mp3'), edits)
+		self.assertEqual(os.listdir(self.dir), ['a.mp3'])
+		
+		edits = rewrite.EditList(self.positions, self.sizes)
+		edits.delete_bytes(10, len(self.data) + 1)
+		self.assertRaises(errors.MP3UsageError, edits.plan, len(self.data))
+		self.assertRaises(errors.MP3UsageError, edits.delete_bytes, 5, 5)
+		self.assertRaises(ValueError, rewrite.EditList, [0], [])
+
+
+if __name__ == '__main__':
+	unittest.main()
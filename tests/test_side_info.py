@@ -0,0 +1,127 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import errors, mp3bits, side_info, side_info_batch
+import array
+import random
+import unittest
+
+
+# (version_index, channel_mode) for each side info layout
+layouts = ((3, 0), (3, 3), (2, 1), (2, 3))
+
+
+def random_blocks(version_index, channel_mode, count, seed=1):
+	rnd = random.Random(seed)
+	size = mp3bits.side_info_size(version_index, channel_mode)
+	return [ array.array('B', [ rnd.randrange(256) for i in range(size) ])
+			for j in range(count) ]
+
+
+def expected_fields(version_index, channel_mode, blocks):
+	# the values decode() should return, in flat order, read through
+	# SideInfo objects
+	ret = {}
+	for name in side_info_batch.frame_fields:
+		ret[name] = []
+	for (name, count) in side_info_batch.granule_fields:
+		ret[name] = []
+	
+	for b in blocks:
+		si = side_info.SideInfo(version_index, channel_mode, b)
+		for name in side_info_batch.frame_fields:
+			ret[name].append(getattr(si, name))
+		for g in range(len(si.channels[0].granules)):
+			for ch in si.channels:
+				gran = ch.granules[g]
+				for (name, count) in side_info_batch.granule_fields:
+					try:
+						val = getattr(gran, name)
+					except (AttributeError, errors.MP3UsageError):
+						val = 0 if count == 1 else (0,) * count
+					if count == 1:
+						ret[name].append(val)
+					else:
+						# table_select has 2 values when blocksplit_flag
+						# is set
+						ret[name].extend(tuple(val) + (0,) * (count-len(val)))
+	return ret
+
+
+def flat(fields):
+	ret = {}
+	for (name, values) in fields.items():
+		if hasattr(values, 'ravel'):
+			values = values.ravel().tolist()
+		ret[name] = list(values)
+	return ret
+
+
+class DecodeTest(unittest.TestCase):
+	
+	def check_decode(self):
+		for (version_index, channel_mode) in layouts:
+			blocks = random_blocks(version_index, channel_mode, 50)
+			expected = expected_fields(version_index, channel_mode, blocks)
+			result = side_info_batch.decode(version_index, channel_mode,
+					blocks)
+			self.assertEqual(flat(result), expected)
+			
+			# the same blocks as strings, in a file
+			data = []
+			positions = []
+			pos = 0
+			for (i, b) in enumerate(blocks):
+				protected = i % 3 == 0
+				head = array.array('B', [0xff, 0xe2 | (version_index << 3)
+						| (not protected), 0x90, channel_mode << 6])
+				data.append(head.tostring() + '\0\0' * protected +
+						b.tostring() + 'x' * i)
+				positions.append(pos)
+				pos += len(data[-1])
+			result = side_info_batch.decode_frames(''.join(data), positions)
+			self.assertEqual(flat(result), expected)
+	
+	def test_decode(self):
+		self.check_decode()
+	
+	def test_decode_python(self):
+		numpy = side_info_batch.numpy
+		side_info_batch.numpy = None
+		try:
+			self.check_decode()
+		finally:
+			side_info_batch.numpy = numpy
+	
+	def test_errors(self):
+		blocks = random_blocks(3, 0, 2)
+		self.assertRaises(errors.MP3UsageError, side_info_batch.decode,
+				3, 3, blocks)
+		# mono and stereo frames can't be mixed
+		data = '\xff\xfb\x90\x00' + blocks[0][:17].tostring() + \
+				'\xff\xfb\x90\xc0' + blocks[1][:17].tostring()
+		self.assertRaises(errors.MP3UsageError,
+				side_info_batch.decode_frames, data, [0, 21])
+
+
+if __name__ == '__main__':
+	unittest.main()
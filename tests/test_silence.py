@@ -0,0 +1,89 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import side_info_batch, silence, sync, vbr
+import mp3data
+import unittest
+
+
+def make_data(pattern, xing=False):
+	# a stream with a silent frame for each '.' in 'pattern', and a loud
+	# frame for each '#'
+	s = sync.PhysicalFrameSync()
+	s.fromstring(mp3data.make_stream(len(pattern)))
+	s.set_eof()
+	out = []
+	for ch in pattern:
+		fr = s.readitem()[1]
+		for chan in fr.side_info.channels:
+			for gran in chan.granules:
+				gran.part2_3_length = 0
+				gran.big_values = (ch == '#') and 100
+		out.append(fr.encode().tostring())
+		if xing and len(out) == 1:
+			xfr = vbr.make_xing_frame(fr.header, vbr.new_xing_header())
+			out.insert(0, xfr.encode().tostring())
+	return ''.join(out)
+
+
+class SilenceTest(unittest.TestCase):
+	
+	frame = 1152 / 44100
+	
+	def check(self, data):
+		ranges = silence.find_silence(data, min_duration=3 * self.frame)
+		self.assertEqual(len(ranges), 2)
+		for ((start, end), (expected_start, expected_end)) in zip(ranges,
+				[(2, 6), (9, 14)]):
+			self.assertAlmostEqual(start, expected_start * self.frame)
+			self.assertAlmostEqual(end, expected_end * self.frame)
+	
+	def test_find_silence(self):
+		pattern = '##....###.....'
+		data = make_data(pattern)
+		self.check(data)
+		self.check(bytearray(data))
+		
+		# times are measured from the first frame after a VBR header
+		xdata = make_data(pattern, xing=True)
+		self.assertTrue(len(xdata) > len(data))
+		self.check(xdata)
+		self.check(bytearray(xdata))
+		
+		# one granule of silence
+		ranges = silence.find_silence(make_data('#.#'), min_duration=0)
+		self.assertEqual(len(ranges), 1)
+		self.assertAlmostEqual(ranges[0][0], self.frame)
+		
+		self.assertEqual(silence.find_silence(''), [])
+	
+	def test_python(self):
+		numpy = silence.numpy
+		silence.numpy = side_info_batch.numpy = None
+		try:
+			self.test_find_silence()
+		finally:
+			silence.numpy = side_info_batch.numpy = numpy
+
+
+if __name__ == '__main__':
+	unittest.main()
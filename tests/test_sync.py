@@ -0,0 +1,269 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from __future__ import division
+from mp3frame import errors, frames, sync
+import mp3data
+import array
+import errno
+import random
+import socket
+import unittest
+
+
+def merge_garbage(items):
+	# garbage can be reported in pieces depending on how much data is
+	# buffered, so adjacent garbage items are joined
+	ret = []
+	for item in items:
+		if ret and item[0] == ret[-1][0] == 'garbage':
+			ret[-1] = ('garbage', ret[-1][1], ret[-1][2] + item[2])
+		else:
+			ret.append(item)
+	return ret
+
+
+class FreeFormatTest(unittest.TestCase):
+	
+	def test_chunk_sizes(self):
+		# a stray free-format header, followed by more than max_free_size
+		# bytes before the next one, must be garbage however the data is
+		# fed in
+		rnd = random.Random(5)
+		def junk(n):
+			return ''.join([ chr(rnd.randrange(255)) for i in range(n) ])
+		
+		stream = mp3data.make_stream(20, seed=2, free_size=600)
+		data = (stream + junk(500) + stream[:4] + junk(19000) +
+				mp3data.make_stream(20, seed=3, free_size=600))
+		
+		expected = merge_garbage(mp3data.frame_items(data, len(data)))
+		self.assertEqual(len([ x for x in expected if x[0] == 'frame' ]), 40)
+		for chunk_size in (333, 4096, 100000):
+			items = merge_garbage(mp3data.frame_items(data, chunk_size))
+			self.assertEqual(items, expected)
+
+
+
+class CrcPolicyTest(unittest.TestCase):
+	
+	def test_invalid_policy(self):
+		# an invalid policy is rejected when it's set, not when the first
+		# bad frame turns up
+		s = sync.PhysicalFrameSync()
+		for policy in sync.crc_policies:
+			s.crc_policy = policy
+			self.assertEqual(s.crc_policy, policy)
+		self.assertRaises(errors.MP3UsageError, setattr, s, 'crc_policy',
+				'Drop')
+		self.assertEqual(s.crc_policy, 'quarantine')
+
+
+
+def reservoir_frames(count, seed=1):
+	# layer 3 frames (only the fields the assembler uses) with random body
+	# sizes and main data positions; a few have an invalid main_data_begin
+	# or part2_3_length
+	rnd = random.Random(seed)
+	ret = []
+	total = 0
+	for i in range(count):
+		fr = frames.MP3Frame()
+		fr.header = frames.FrameHeader()
+		fr.header.version_index = 3
+		fr.header.layer_index = 1
+		fr.header.channel_mode = 3
+		fr.init()
+		n = rnd.choice([0, rnd.randrange(1, 100), rnd.randrange(100, 700)])
+		fr.raw_body = array.array('B', [ rnd.randrange(256) for j in range(n) ])
+		
+		avail = min(total, 511)
+		if rnd.random() < 0.05:
+			begin = min(avail + 1, 511)
+		else:
+			begin = rnd.randint(0, avail)
+		if rnd.random() < 0.05:
+			main_len = begin + n + 1
+		else:
+			main_len = rnd.randint(0, begin + n)
+		si = fr.side_info
+		si.main_data_begin = begin
+		si.channels[0].granules[0].part2_3_length = 8 * (main_len // 2)
+		si.channels[0].granules[1].part2_3_length = 8 * (main_len - main_len//2)
+		
+		fr.frame_number = i
+		ret.append(fr)
+		total += n
+	return ret
+
+
+class ListReservoir(object):
+	# The bit reservoir as a plain list of every body byte, for comparison
+	# with LogicalFrameAssembler.
+	
+	def __init__(self):
+		self.stream = []
+		self.last_end = 0
+		self.last_frame = None
+		self.last_size = 0
+	
+	def frame_in(self, fr):
+		# returns (data, ancillary_skipped, ancillary)
+		body = fr.raw_body.tolist()
+		total = len(self.stream)
+		begin = fr.side_info.main_data_begin
+		main_len = fr.side_info.part2_3_bytes
+		skipped = total - self.last_end - begin
+		
+		# only the last body and the 511 bytes before it are kept, so any
+		# ancillary data before that is lost
+		ancillary = None
+		if skipped > 0 and begin <= min(total, 511):
+			start = max(self.last_end, total - self.last_size - 511)
+			ancillary = (self.last_frame, self.stream[start:total-begin])
+		
+		data = None
+		if begin <= min(total, 511) and main_len - begin <= len(body):
+			data = (self.stream + body)[total-begin:total-begin+main_len]
+			self.last_end = total - begin + main_len
+			self.last_frame = fr.frame_number
+		
+		self.stream += body
+		if body:
+			self.last_size = len(body)
+		return (data, skipped, ancillary)
+
+
+class AssemblerTest(unittest.TestCase):
+	
+	def check(self, return_views):
+		frs = reservoir_frames(400)
+		self.assertTrue(sum([ len(fr.raw_body) for fr in frs ]) > 20 * 511)
+		ref = ListReservoir()
+		asm = sync.LogicalFrameAssembler()
+		asm.return_views = return_views
+		asm.collect_ancillary = True
+		
+		invalid = 0
+		for fr in frs:
+			(data, skipped, ancillary) = ref.frame_in(fr)
+			result = asm.frame_in(fr)
+			if result is not None:
+				result = list(bytearray(result))
+			self.assertEqual(result, data)
+			self.assertEqual(asm.ancillary_skipped, skipped)
+			
+			if asm.ancillary is not None:
+				self.assertEqual((asm.ancillary[0],
+						asm.ancillary[1].tolist()), ancillary)
+			else:
+				self.assertEqual(ancillary, None)
+			invalid += (data is None)
+		
+		self.assertTrue(10 < invalid < 50)
+		(frame_number, tail) = asm.end_ancillary()
+		self.assertEqual(frame_number, ref.last_frame)
+		self.assertEqual(tail.tolist(), ref.stream[ref.last_end:][-len(tail):])
+	
+	def test_arrays(self):
+		self.check(False)
+	
+	def test_views(self):
+		self.check(True)
+
+
+class StreamSyncWrapperTest(unittest.TestCase):
+	
+	def read_all(self, data, wrapper, chunk_size):
+		# send the data through a socket pair, and read it back in partial
+		# chunks, as an event loop would
+		(src, dst) = socket.socketpair()
+		try:
+			src.sendall(data)
+			src.shutdown(socket.SHUT_WR)
+			dst.setblocking(False)
+			return self.read_socket(dst, wrapper, chunk_size)
+		finally:
+			src.close()
+			dst.close()
+	
+	def read_socket(self, sock, wrapper, chunk_size):
+		ret = []
+		pos = 0
+		max_fill = 0
+		while not wrapper.done:
+			for (itemtype, item) in wrapper.items():
+				ret.append( (itemtype, pos, len(item)) )
+				pos += len(item)
+			if not wrapper.wants_data:
+				continue
+			try:
+				d = sock.recv(chunk_size)
+			except socket.error, e:
+				if e.args[0] != errno.EAGAIN:
+					raise
+				continue
+			wrapper.feed(d)
+			max_fill = max(max_fill, len(wrapper.sync.data))
+		return (ret, max_fill)
+	
+	def test_items(self):
+		data = (mp3data.make_stream(30) + 'junk' +
+				mp3data.make_stream(10, free_size=500))
+		expected = mp3data.frame_items(data, len(data))
+		for chunk_size in (1, 97, 4096):
+			w = sync.StreamSyncWrapper(sync.PhysicalFrameSync())
+			(items, max_fill) = self.read_all(data, w, chunk_size)
+			self.assertEqual(items, expected)
+	
+	def test_backpressure(self):
+		# no data is fed while the buffer is full, so it never grows past
+		# max_buffer plus one chunk
+		data = mp3data.make_stream(30)
+		w = sync.StreamSyncWrapper(sync.PhysicalFrameSync())
+		w.max_buffer = 1000
+		w.feed(data[:1500])
+		self.assertFalse(w.wants_data)
+		w.readitem()
+		self.assertTrue(w.wants_data)
+		
+		w = sync.StreamSyncWrapper(sync.PhysicalFrameSync())
+		w.max_buffer = 1000
+		(items, max_fill) = self.read_all(data, w, 700)
+		self.assertEqual(items, mp3data.frame_items(data, len(data)))
+		self.assertTrue(max_fill < 1700)
+		
+		w.feed_eof()
+		self.assertFalse(w.wants_data)
+	
+	def test_limit(self):
+		# a free-format frame whose end isn't found within max_buffer bytes
+		data = mp3data.make_stream(1, free_size=500)[:4] + '\0' * 5000
+		w = sync.StreamSyncWrapper(sync.PhysicalFrameSync())
+		w.max_buffer = 1000
+		self.assertRaises(errors.MP3ImplementationLimit, self.read_all, data,
+				w, 300)
+		self.assertEqual(len(w.sync.data), 1200)
+
+
+if __name__ == '__main__':
+	unittest.main()
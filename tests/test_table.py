@@ -0,0 +1,112 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import sync, table
+import mp3data
+import StringIO
+import unittest
+
+
+def read_frames(data):
+	s = sync.PhysicalFrameSync()
+	s.fromstring(data)
+	s.set_eof()
+	return [ item for (itemtype, item) in iter(s.readitem, None) ]
+
+
+class FrameTableTest(unittest.TestCase):
+	
+	def setUp(self):
+		stream = mp3data.make_stream(30)
+		self.frames = read_frames(stream)
+		self.free = read_frames(mp3data.make_stream(10, free_size=600))
+		for (i, fr) in enumerate(self.free):
+			fr.byte_position += len(stream)
+		
+		# a mode change at frame 20
+		for fr in self.frames[20:]:
+			fr.header.channel_mode = 3
+	
+	def check(self):
+		frs = self.frames + self.free
+		t = table.FrameTable(frs)
+		self.assertEqual(len(t), 40)
+		
+		self.assertEqual(list(t.column('byte_position')),
+				[ fr.byte_position for fr in frs ])
+		self.assertEqual(list(t.column('size')), [ len(fr) for fr in frs ])
+		self.assertEqual(list(t.column('samplerate')),
+				[ fr.header.samplerate for fr in frs ])
+		self.assertEqual(list(t.column('samples')),
+				[ fr.header.samples_per_frame for fr in frs ])
+		self.assertEqual(list(t.column('padded')),
+				[ fr.header.padded for fr in frs ])
+		self.assertEqual(list(t.column('bitrate')[:30]),
+				[ fr.header.bitrate for fr in self.frames ])
+		
+		# free-format frames get the bitrate implied by their size
+		for (fr, br) in zip(self.free, t.column('bitrate')[30:]):
+			self.assertEqual(br, 8 * len(fr) * 44100 // 1152)
+		self.assertTrue(t.min_bitrate() > 0)
+		self.assertEqual(t.min_bitrate(), min(t.bitrate))
+		self.assertEqual(t.max_bitrate(), max(t.bitrate))
+		
+		dur = 1152 / 44100
+		self.assertAlmostEqual(t.total_duration(), 40 * dur)
+		self.assertAlmostEqual(t.average_bitrate(), sum(t.bitrate) / 40)
+		
+		windows = t.bitrate_windows(10 * dur - 1e-9)
+		self.assertEqual(len(windows), 4)
+		for (i, (start, br)) in enumerate(windows):
+			self.assertAlmostEqual(start, i * (10 * dur - 1e-9))
+			self.assertAlmostEqual(br, sum(t.bitrate[10*i:10*i+10]) / 10)
+		
+		self.assertEqual(t.mode_changes(), [(20, 1, 3), (30, 3, 1)])
+		
+		f = StringIO.StringIO()
+		t.write_csv(f)
+		lines = f.getvalue().splitlines()
+		self.assertEqual(len(lines), 41)
+		self.assertEqual(lines[0].split(','),
+				[ name for (name, typecode) in t.columns ])
+		
+		empty = table.FrameTable()
+		self.assertEqual(empty.average_bitrate(), None)
+		self.assertEqual(empty.min_bitrate(), None)
+		self.assertEqual(empty.bitrate_windows(1), [])
+	
+	def test_numpy(self):
+		self.check()
+		self.assertEqual(table.FrameTable(self.frames).to_numpy()['size']
+				.tolist(), [ len(fr) for fr in self.frames ])
+	
+	def test_python(self):
+		numpy = table.numpy
+		table.numpy = None
+		try:
+			self.check()
+		finally:
+			table.numpy = numpy
+
+
+if __name__ == '__main__':
+	unittest.main()
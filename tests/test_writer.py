@@ -0,0 +1,83 @@
+# Copyright (c) 2008 Michael Gold
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from __future__ import division
+from mp3frame import writer
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class AtomicWriteTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.calls = []
+		self.fsync = os.fsync
+		self.rename = os.rename
+		def fsync(fd):
+			self.calls.append( ('fsync', os.fstat(fd).st_size) )
+			self.fsync(fd)
+		def rename(src, dst):
+			self.calls.append( ('rename', dst) )
+			self.rename(src, dst)
+		os.fsync = fsync
+		os.rename = rename
+	
+	def tearDown(self):
+		os.fsync = self.fsync
+		os.rename = self.rename
+		shutil.rmtree(self.dir)
+	
+	def test_sync_before_rename(self):
+		name = os.path.join(self.dir, 'out.mp3')
+		w = writer.FrameWriter(name, atomic=True)
+		w.write('x' * 1000)
+		w.close()
+		self.assertEqual(self.calls, [('fsync', 1000), ('rename', name)])
+		self.assertEqual(open(name, 'rb').read(), 'x' * 1000)
+
+
+
+class CopyTest(unittest.TestCase):
+	
+	def test_copy_from(self):
+		# spans longer than the buffer are copied in several blocks
+		source = tempfile.TemporaryFile()
+		data = ''.join([ chr(i % 251) for i in range(50000) ])
+		source.write(data)
+		out = tempfile.TemporaryFile()
+		w = writer.FrameWriter(out, buffer_size=1000)
+		self.assertEqual(w.write('head'), 0)
+		self.assertEqual(w.copy_from(source, 123, 20000), 4)
+		self.assertEqual(w.write('mid'), 20004)
+		self.assertEqual(w.copy_from(source, 49990, 10), 20007)
+		w.close()
+		self.assertEqual(w.position, 20017)
+		out.seek(0)
+		self.assertEqual(out.read(),
+				'head' + data[123:20123] + 'mid' + data[49990:])
+		self.assertRaises(IOError, w.copy_from, source, 49990, 11)
+
+
+if __name__ == '__main__':
+	unittest.main()